@@ -0,0 +1,85 @@
+"""
+Admin-only API routes for the Redfin Median Price API.
+
+Every route requires the X-Admin-Token header to match ADMIN_TOKEN. The routes
+do not exist (404) unless ADMIN_TOKEN is set.
+"""
+
+import os
+import hmac
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app import profiling
+from app.admission import scrape_admission
+from app.circuit_breaker import circuit_breakers
+
+load_dotenv()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject requests without the admin token, hiding the routes when no token is configured."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def require_profiling():
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile/cpu", response_class=PlainTextResponse, dependencies=[Depends(require_profiling)])
+async def profile_cpu(
+    requests: Optional[int] = Query(None, ge=1, description="Stop after this many requests have completed"),
+    seconds: float = Query(30, gt=0, description="Stop after this many seconds"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$", description="Sort order of the stats"),
+    limit: int = Query(50, ge=1, le=1000, description="Number of functions to report"),
+):
+    """
+    Run cProfile on this worker over the next requests or a time window and return
+    the sorted stats.
+    """
+    try:
+        return await profiling.profile_cpu(requests, seconds, sort=sort, limit=limit)
+    except profiling.ProfileInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/profile/memory", dependencies=[Depends(require_profiling)])
+async def profile_memory(
+    seconds: float = Query(30, gt=0, description="Time between the two snapshots"),
+    limit: int = Query(25, ge=1, le=1000, description="Number of source lines to report"),
+):
+    """
+    Trace allocations on this worker for a time window and return the source lines
+    whose memory grew the most.
+    """
+    try:
+        return {"top_allocations": await profiling.profile_memory(seconds, limit=limit)}
+    except profiling.ProfileInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """
+    Report the state of the upstream circuit breaker of every Redfin host contacted so far.
+    """
+    return {host: breaker.snapshot() for host, breaker in circuit_breakers.items()}
+
+
+@router.get("/scrape-admission")
+async def get_scrape_admission():
+    """
+    Report the scrape concurrency limit of this worker, the scrapes running and waiting.
+    """
+    return scrape_admission.snapshot()
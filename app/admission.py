@@ -0,0 +1,150 @@
+"""
+Admission control for scrapes of Redfin.
+
+At most SCRAPE_CONCURRENCY_LIMIT scrapes run at once in each process. Further
+scrapes wait in a first-in, first-out queue of at most SCRAPE_QUEUE_MAX_SIZE.
+When the queue is full, or a scrape has waited SCRAPE_QUEUE_TIMEOUT_SECONDS,
+it is shed instead of piling more sessions and HTML onto a busy process.
+"""
+
+import os
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional
+from dotenv import load_dotenv
+
+from app.deadline import time_remaining
+from app.metrics import Counter, Gauge, Histogram
+
+load_dotenv()
+
+# Scrapes allowed to run at the same time in this process (0 disables admission control)
+SCRAPE_CONCURRENCY_LIMIT = int(os.getenv("SCRAPE_CONCURRENCY_LIMIT", "8"))
+# Scrapes allowed to wait for a slot; any more are rejected at once
+SCRAPE_QUEUE_MAX_SIZE = int(os.getenv("SCRAPE_QUEUE_MAX_SIZE", "32"))
+# Longest a scrape waits for a slot before it is rejected
+SCRAPE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_QUEUE_TIMEOUT_SECONDS", "10"))
+# Retry-After sent to clients whose scrape was rejected
+SCRAPE_REJECT_RETRY_AFTER_SECONDS = int(os.getenv("SCRAPE_REJECT_RETRY_AFTER_SECONDS", "5"))
+
+SCRAPE_QUEUE_DEPTH = Gauge(
+    "redfin_scrape_queue_depth",
+    "Scrapes waiting for a free slot in this process.",
+)
+SCRAPE_QUEUE_WAIT_SECONDS = Histogram(
+    "redfin_scrape_queue_wait_seconds",
+    "Time scrapes waited for a free slot, including those that were rejected.",
+)
+SCRAPE_ADMISSIONS = Counter(
+    "redfin_scrape_admissions_total",
+    "Scrapes by admission outcome (admitted, queue_full or timeout).",
+    ["result"],
+)
+
+
+class ScrapeRejectedError(Exception):
+    """A scrape was shed because the process is at its scrape capacity."""
+
+    def __init__(self, reason: str, retry_after: int = SCRAPE_REJECT_RETRY_AFTER_SECONDS):
+        super().__init__(f"Scrape rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """A concurrency limit with a bounded FIFO wait queue."""
+
+    def __init__(
+        self,
+        limit: int = SCRAPE_CONCURRENCY_LIMIT,
+        max_queue: int = SCRAPE_QUEUE_MAX_SIZE,
+        queue_timeout: float = SCRAPE_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, deadline: Optional[float] = None):
+        """
+        Take a slot, waiting in the queue if none is free. Raises ScrapeRejectedError
+        if the queue is full or no slot frees up in time.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            SCRAPE_ADMISSIONS.inc(result="admitted")
+            SCRAPE_QUEUE_WAIT_SECONDS.observe(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            SCRAPE_ADMISSIONS.inc(result="queue_full")
+            raise ScrapeRejectedError("queue_full")
+
+        timeout = self.queue_timeout
+        remaining = time_remaining(deadline)
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        SCRAPE_QUEUE_DEPTH.set(len(self._waiters))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended, so pass it on
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            SCRAPE_ADMISSIONS.inc(result="timeout")
+            raise ScrapeRejectedError("timeout")
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            SCRAPE_QUEUE_DEPTH.set(len(self._waiters))
+            SCRAPE_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+        SCRAPE_ADMISSIONS.inc(result="admitted")
+
+    def release(self):
+        """Free a slot, handing it straight to the longest waiting scrape if there is one."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                SCRAPE_QUEUE_DEPTH.set(len(self._waiters))
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block; does nothing when the limit is 0."""
+        if self.limit <= 0:
+            yield
+            return
+        await self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        """Describe the controller for the admin API."""
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+        }
+
+
+# Shared by every scrape in this process
+scrape_admission = AdmissionController()
@@ -0,0 +1,58 @@
+"""
+In-memory caching for the Redfin Median Price API.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    A bounded in-memory cache with per-entry time-to-live and LRU eviction.
+
+    Entries older than ttl_seconds are treated as missing. When the cache is full,
+    the least recently used entry is evicted to make room for a new one.
+    A max_size or ttl_seconds of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store value under key, evicting the least recently used entries if full."""
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Remove key from the cache if present."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,187 @@
+"""
+Circuit breakers for requests made to Redfin.
+
+When too many recent requests to a host fail with 403, 429, 5xx or a network
+error, the breaker opens and requests to that host fail fast instead of piling
+up in retries and backoff. After a cool-down a single probe request is let
+through; its outcome closes the breaker again or keeps it open.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.metrics import Gauge
+
+load_dotenv()
+
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+# Outcomes within this many seconds decide whether the breaker opens
+CIRCUIT_BREAKER_WINDOW_SECONDS = float(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", "60"))
+# The breaker never opens on fewer outcomes than this in the window
+CIRCUIT_BREAKER_MIN_REQUESTS = int(os.getenv("CIRCUIT_BREAKER_MIN_REQUESTS", "10"))
+# Fraction of failed requests in the window that opens the breaker
+CIRCUIT_BREAKER_ERROR_RATE = float(os.getenv("CIRCUIT_BREAKER_ERROR_RATE", "0.5"))
+# How long the breaker stays open before letting a probe request through
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CIRCUIT_STATE = Gauge(
+    "redfin_circuit_breaker_state",
+    "Upstream circuit breaker state per host (0 closed, 1 half-open, 2 open).",
+    ["host"],
+)
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def is_failure_status(status_code: int) -> bool:
+    """Whether a response status means the upstream is refusing or failing requests."""
+    return status_code in (403, 429) or status_code >= 500
+
+
+class CircuitOpenError(Exception):
+    """A scrape could not finish because a Redfin host's circuit breaker is refusing requests."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Circuit breaker open for {host}")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """A closed/open/half-open breaker driven by the error rate over a sliding window."""
+
+    def __init__(
+        self,
+        name: str = "",
+        window_seconds: float = CIRCUIT_BREAKER_WINDOW_SECONDS,
+        min_requests: int = CIRCUIT_BREAKER_MIN_REQUESTS,
+        error_rate: float = CIRCUIT_BREAKER_ERROR_RATE,
+        open_seconds: float = CIRCUIT_BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        # (time, failed) for each outcome within the window
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], host=self.name)
+
+    def _trim(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _cooled_down(self, now: float) -> bool:
+        return now - self.opened_at >= self.open_seconds
+
+    def _probe_pending(self, now: float) -> bool:
+        # A probe that never reported back (e.g. it was cancelled) stops blocking after open_seconds
+        return self._probe_in_flight and now - self._probe_started < self.open_seconds
+
+    def is_open(self) -> bool:
+        """Whether requests are currently being refused, without using up a probe."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            return not self._cooled_down(now)
+        return self.state == HALF_OPEN and self._probe_pending(now)
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.open_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now. In half-open state only one probe is allowed."""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN:
+            if not self._cooled_down(now):
+                return False
+            self._set_state(HALF_OPEN)
+        if self._probe_pending(now):
+            return False
+        self._probe_in_flight = True
+        self._probe_started = now
+        return True
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            self._outcomes.clear()
+            self._failures = 0
+            self._set_state(CLOSED)
+            return
+        self._record(False)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            self._open()
+            return
+        self._record(True)
+
+    def record_abandoned(self):
+        """Forget a request whose outcome says nothing about the upstream, freeing a half-open probe."""
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        self._trim(now)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_requests
+            and self._failures / len(self._outcomes) >= self.error_rate
+        ):
+            self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def snapshot(self) -> dict:
+        """Describe the breaker for the admin API."""
+        self._trim(time.monotonic())
+        total = len(self._outcomes)
+        return {
+            "state": self.state,
+            "requests_in_window": total,
+            "failures_in_window": self._failures,
+            "error_rate": round(self._failures / total, 3) if total else 0.0,
+            "retry_after_seconds": round(self.retry_after(), 1),
+        }
+
+
+# One breaker per upstream host, shared by every request in this process
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(host: str) -> Optional[CircuitBreaker]:
+    """Return the breaker for an upstream host, or None if circuit breaking is disabled."""
+    if not CIRCUIT_BREAKER_ENABLED:
+        return None
+    breaker = circuit_breakers.get(host)
+    if breaker is None:
+        breaker = CircuitBreaker(host)
+        circuit_breakers[host] = breaker
+    return breaker
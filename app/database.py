@@ -3,15 +3,70 @@ Database connection and operations for the Redfin Median Price API.
 """
 
 import os
+import logging
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # MongoDB configuration
 MONGODB_URL = os.getenv("MONGODB_URL")
 DB_NAME = os.getenv("DB_NAME")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+JOBS_COLLECTION_NAME = os.getenv("JOBS_COLLECTION_NAME", "scrape_jobs")
+# Finished scrape jobs are removed by MongoDB after this many seconds
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+CITY_INDEX = [("state", 1), ("city", 1)]
+# MongoDB error codes for a missing index, an index that exists with other options, and duplicate keys
+INDEX_NOT_FOUND = 27
+INDEX_OPTIONS_CONFLICT = 85
+DUPLICATE_KEY = 11000
+
+
+async def ensure_city_index(collection):
+    """
+    Create the unique (state, city) index that scrape leases and upserts rely on to
+    keep one document per city. Safe for every worker to run at startup: if a
+    non-unique index left by an earlier version exists, it is kept and a warning
+    asks for the one-off migration instead.
+    """
+    try:
+        await collection.create_index(CITY_INDEX, unique=True)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        logger.warning(
+            "The (state, city) index is not unique; run `python -m app.database migrate-indexes` once"
+        )
+
+
+async def migrate_city_index(collection) -> bool:
+    """
+    One-off migration replacing a non-unique (state, city) index with the unique one.
+    Tolerates another run racing it. Returns False, keeping a non-unique index, if
+    duplicate city documents prevent the unique index.
+    """
+    try:
+        await collection.drop_index(CITY_INDEX)
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND:
+            raise
+    try:
+        await collection.create_index(CITY_INDEX, unique=True)
+    except OperationFailure as e:
+        if e.code == INDEX_OPTIONS_CONFLICT:
+            # Another run recreated the index first
+            return True
+        if e.code != DUPLICATE_KEY:
+            raise
+        logger.error("Duplicate city documents prevent a unique (state, city) index: %s", e)
+        await collection.create_index(CITY_INDEX)
+        return False
+    return True
 
 
 async def connect_to_mongo():
@@ -20,18 +75,53 @@ async def connect_to_mongo():
         client = AsyncIOMotorClient(MONGODB_URL)
         db = client[DB_NAME]
         collection = db[COLLECTION_NAME]
-        await collection.create_index([("state", 1), ("city", 1)])
-        print("Connected to MongoDB")
+        await ensure_city_index(collection)
+        # Removes city documents without prices once their lease or negative cache entry expires
+        await collection.create_index("stub_expires_at", expireAfterSeconds=0)
+        logger.info("Connected to MongoDB")
         return client, collection
     except Exception as e:
-        print("MongoDB_URL:", MONGODB_URL)
-        print(f"Failed to connect to MongoDB: {e}")
+        logger.error("Failed to connect to MongoDB at %s: %s", MONGODB_URL, e)
         return None, None
-        
+
+
+async def connect_jobs_collection(client):
+    """Initialize the scrape job queue collection on an open MongoDB connection."""
+    if client is None:
+        return None
+    try:
+        jobs = client[DB_NAME][JOBS_COLLECTION_NAME]
+        await jobs.create_index([("status", 1), ("created_at", 1)])
+        await jobs.create_index([("state", 1), ("city", 1), ("status", 1)])
+        await jobs.create_index("finished_at", expireAfterSeconds=JOB_RETENTION_SECONDS)
+        return jobs
+    except Exception as e:
+        logger.error("Failed to initialize the jobs collection: %s", e)
+        return None
+
 
 async def close_mongo_connection(client):
     """Close the MongoDB connection."""
     if client:
         client.close()
-        print("MongoDB connection closed")
-        
\ No newline at end of file
+        logger.info("MongoDB connection closed")
+        
+
+async def migrate_indexes() -> bool:
+    """Run the one-off index migrations against the configured database."""
+    client = AsyncIOMotorClient(MONGODB_URL)
+    try:
+        return await migrate_city_index(client[DB_NAME][COLLECTION_NAME])
+    finally:
+        client.close()
+
+
+# Run the one-off index migration: python -m app.database migrate-indexes
+if __name__ == "__main__":
+    import sys
+    import asyncio
+
+    if sys.argv[1:] != ["migrate-indexes"]:
+        sys.exit("Usage: python -m app.database migrate-indexes")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(0 if asyncio.run(migrate_indexes()) else 1)
@@ -0,0 +1,52 @@
+"""
+Per-request deadlines for the Redfin Median Price API.
+
+A deadline is an absolute time.monotonic() value passed down the scrape
+pipeline. Upstream attempts, rate limiter waits and retry backoff are skipped
+once they can no longer finish before it.
+"""
+
+import os
+import time
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Overall time budget for a /median-prices request (0 disables the deadline)
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "30"))
+# Upper bound on the budget a client may ask for with the X-Request-Timeout header
+REQUEST_TIMEOUT_MAX_SECONDS = float(os.getenv("REQUEST_TIMEOUT_MAX_SECONDS", "120"))
+# Lower bound on it, so a client cannot make every upstream attempt time out
+REQUEST_TIMEOUT_MIN_SECONDS = float(os.getenv("REQUEST_TIMEOUT_MIN_SECONDS", "2"))
+
+
+def request_deadline(timeout_seconds: Optional[float] = None) -> Optional[float]:
+    """
+    Return the deadline for a request starting now, using the client's requested
+    timeout if given, clamped to the allowed range, or None if requests are not
+    time-limited.
+    """
+    timeout = REQUEST_TIMEOUT_SECONDS
+    if timeout_seconds is not None and timeout_seconds > 0:
+        timeout = min(max(timeout_seconds, REQUEST_TIMEOUT_MIN_SECONDS), REQUEST_TIMEOUT_MAX_SECONDS)
+    if timeout <= 0:
+        return None
+    return time.monotonic() + timeout
+
+
+def time_remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before the deadline, or None if there is no deadline."""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def deadline_expired(deadline: Optional[float]) -> bool:
+    """Whether the deadline has passed."""
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def fits_before(deadline: Optional[float], seconds: float) -> bool:
+    """Whether something taking seconds can finish before the deadline."""
+    return deadline is None or time.monotonic() + seconds < deadline
@@ -0,0 +1,102 @@
+"""
+Pooled, long-lived HTTP clients for scraping Redfin.
+"""
+
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+from dotenv import load_dotenv
+from httpx import AsyncClient, Limits
+
+from app.utils import create_http_client
+
+load_dotenv()
+
+# Number of client identities (user agent and cookie) kept open
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+# Connection limits applied to each client
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "10"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "5"))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60"))
+# Replace a client with a fresh identity once it is this old (0 disables rotation)
+HTTP_POOL_ROTATE_SECONDS = float(os.getenv("HTTP_POOL_ROTATE_SECONDS", "900"))
+
+
+class _PooledClient:
+    """A client in the pool together with its age and active lease count."""
+
+    def __init__(self, client: AsyncClient):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.leases = 0
+        self.retired = False
+
+
+class HTTPClientPool:
+    """
+    A fixed set of long-lived AsyncClient instances, each with its own identity.
+
+    Clients are leased round-robin and may be shared by concurrent scrapes, so
+    connections and TLS sessions are reused across requests. A client older than
+    rotate_seconds is replaced with a new identity on its next lease, and closed
+    once the scrapes still using it have finished.
+    """
+
+    def __init__(
+        self,
+        size: int = HTTP_POOL_SIZE,
+        max_connections: int = HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_POOL_KEEPALIVE_EXPIRY,
+        rotate_seconds: float = HTTP_POOL_ROTATE_SECONDS,
+    ):
+        self.size = max(size, 1)
+        self.limits = Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.rotate_seconds = rotate_seconds
+        self._clients: List[_PooledClient] = []
+        self._next = 0
+
+    async def start(self):
+        """Open every client in the pool."""
+        self._clients = [
+            _PooledClient(await create_http_client(limits=self.limits)) for _ in range(self.size)
+        ]
+
+    async def close(self):
+        """Close every client in the pool."""
+        clients, self._clients = self._clients, []
+        for pooled in clients:
+            await pooled.client.aclose()
+
+    async def _rotate(self, index: int):
+        """Replace the client at index with a fresh identity, closing the old one when idle."""
+        old = self._clients[index]
+        self._clients[index] = _PooledClient(await create_http_client(limits=self.limits))
+        old.retired = True
+        if old.leases == 0:
+            await old.client.aclose()
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[AsyncClient]:
+        """Lease the next client in the pool for the duration of a scrape."""
+        if not self._clients:
+            await self.start()
+        index = self._next % len(self._clients)
+        self._next += 1
+        pooled = self._clients[index]
+        if self.rotate_seconds and time.monotonic() - pooled.created_at >= self.rotate_seconds:
+            await self._rotate(index)
+            pooled = self._clients[index]
+
+        pooled.leases += 1
+        try:
+            yield pooled.client
+        finally:
+            pooled.leases -= 1
+            if pooled.retired and pooled.leases == 0:
+                await pooled.client.aclose()
@@ -0,0 +1,191 @@
+"""
+MongoDB-backed scrape job queue for the Redfin Median Price API.
+
+Cold cities can be scraped asynchronously: the request enqueues a job and returns
+immediately, and a pool of workers drains the queue. Because the queue lives in
+MongoDB, jobs survive restarts and are shared by every application instance.
+"""
+
+import os
+import uuid
+import socket
+import logging
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.services import fetch_and_cache_prices
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of job workers started in each application process
+SCRAPE_JOB_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", "2"))
+# How long an idle worker waits before checking the queue again
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+# A running job not finished within this long is assumed abandoned and claimed again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Jobs are marked failed after this many attempts
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+async def enqueue_scrape_job(jobs, state: str, city: str) -> dict:
+    """
+    Queue a scrape for a location and return the job document.
+    If a job for the same location is already queued or running, that job is returned.
+    """
+    now = datetime.utcnow()
+    return await jobs.find_one_and_update(
+        {"state": state, "city": city, "status": {"$in": [JOB_QUEUED, JOB_RUNNING]}},
+        {
+            "$setOnInsert": {
+                "_id": uuid.uuid4().hex,
+                "status": JOB_QUEUED,
+                "attempts": 0,
+                "created_at": now,
+                "updated_at": now,
+            }
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def get_job(jobs, job_id: str) -> Optional[dict]:
+    """Get a job document by its ID."""
+    return await jobs.find_one({"_id": job_id})
+
+
+async def claim_next_job(jobs, worker_id: str) -> Optional[dict]:
+    """
+    Atomically claim the oldest queued job, or a running job whose lease has expired
+    because its worker died. Returns None if there is nothing to do.
+    """
+    now = datetime.utcnow()
+    return await jobs.find_one_and_update(
+        {
+            "$or": [
+                # A job requeued after a 503 or 504 waits until available_at
+                {"status": JOB_QUEUED, "available_at": {"$not": {"$gt": now}}},
+                {"status": JOB_RUNNING, "lease_expires_at": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": JOB_RUNNING,
+                "worker_id": worker_id,
+                "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def finish_job(jobs, job_id: str, status: str, **fields):
+    """Record the final status of a job along with its result or error."""
+    now = datetime.utcnow()
+    await jobs.update_one(
+        {"_id": job_id},
+        {
+            "$set": {"status": status, "updated_at": now, "finished_at": now, **fields},
+            "$unset": {"lease_expires_at": ""},
+        },
+    )
+
+
+async def requeue_job(jobs, job_id: str, error: str, delay: float = 0):
+    """Put a job back on the queue after a transient failure, to be retried after delay seconds."""
+    now = datetime.utcnow()
+    await jobs.update_one(
+        {"_id": job_id},
+        {
+            "$set": {
+                "status": JOB_QUEUED,
+                "updated_at": now,
+                "available_at": now + timedelta(seconds=delay),
+                "last_error": error,
+            },
+            "$unset": {"lease_expires_at": ""},
+        },
+    )
+
+
+async def run_job(jobs, collection, job: dict, http_pool=None):
+    """Scrape the location of a claimed job and record the outcome."""
+    if job.get("attempts", 0) > JOB_MAX_ATTEMPTS:
+        await finish_job(jobs, job["_id"], JOB_FAILED, status_code=500, error="Too many attempts")
+        return
+    try:
+        prices = await fetch_and_cache_prices(collection, job["state"], job["city"], http_pool=http_pool)
+        await finish_job(jobs, job["_id"], JOB_SUCCEEDED, data=prices)
+    except HTTPException as e:
+        # Redfin having no data for the location is final; overload (503) and timeouts (504) are not
+        if e.status_code == 404 or job.get("attempts", 0) >= JOB_MAX_ATTEMPTS:
+            await finish_job(jobs, job["_id"], JOB_FAILED, status_code=e.status_code, error=e.detail)
+        else:
+            retry_after = (e.headers or {}).get("Retry-After", "0")
+            await requeue_job(jobs, job["_id"], str(e.detail), delay=float(retry_after))
+    except Exception as e:
+        logger.warning("Scrape job %s failed: %s", job["_id"], e)
+        if job.get("attempts", 0) >= JOB_MAX_ATTEMPTS:
+            await finish_job(jobs, job["_id"], JOB_FAILED, status_code=500, error=str(e))
+        else:
+            await requeue_job(jobs, job["_id"], str(e))
+
+
+async def job_worker(jobs, collection, worker_id: str, http_pool=None):
+    """Claim and run jobs forever until cancelled."""
+    while True:
+        try:
+            job = await claim_next_job(jobs, worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Job worker %s failed to claim a job: %s", worker_id, e)
+            job = None
+
+        if job is None:
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+            continue
+        try:
+            await run_job(jobs, collection, job, http_pool=http_pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The job's lease expires and another worker picks it up again
+            logger.error("Job worker %s failed to run job %s: %s", worker_id, job.get("_id"), e)
+
+
+def start_job_workers(jobs, collection, http_pool=None, count: int = SCRAPE_JOB_WORKERS) -> List[asyncio.Task]:
+    """Start the job workers for this process."""
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    return [
+        asyncio.create_task(job_worker(jobs, collection, f"{prefix}:{index}", http_pool=http_pool))
+        for index in range(count)
+    ]
+
+
+def job_response(job: dict) -> dict:
+    """Build the public representation of a job document."""
+    response = {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "state": job["state"],
+        "city": job["city"],
+    }
+    for field in ("data", "status_code", "error"):
+        if field in job:
+            response[field] = job[field]
+    return response
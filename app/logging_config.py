@@ -0,0 +1,173 @@
+"""
+Logging setup for the Redfin Median Price API.
+
+Log calls only put the record on a queue; a listener thread formats the records
+as JSON lines and writes them to stdout, so coroutines never block on output.
+Records carry the ID of the request they were logged from, and repetitive
+upstream retry messages are sampled.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import logging
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module overrides, e.g. "app.utils=WARNING,app.jobs=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "json" for one JSON object per line, or "text" for human-readable lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Each distinct retry message is logged at most this many times per interval
+LOG_RETRY_SAMPLE_BURST = int(os.getenv("LOG_RETRY_SAMPLE_BURST", "5"))
+LOG_RETRY_SAMPLE_INTERVAL_SECONDS = float(os.getenv("LOG_RETRY_SAMPLE_INTERVAL_SECONDS", "60"))
+
+# Logger used for upstream retry messages, which are sampled
+RETRY_LOGGER_NAME = "app.upstream_retries"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the ID of the current request to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let each distinct message template through at most burst times per interval.
+    The next record let through reports how many were dropped in the meantime.
+    """
+
+    def __init__(self, burst: int, interval_seconds: float):
+        super().__init__()
+        self.burst = burst
+        self.interval_seconds = interval_seconds
+        # Message template -> (window start, records seen in the window)
+        self._windows: Dict[str, Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        key = str(record.msg)
+        started, seen = self._windows.get(key, (now, 0))
+        if now - started >= self.interval_seconds:
+            if seen > self.burst:
+                record.suppressed = seen - self.burst
+            started, seen = now, 0
+        self._windows[key] = (started, seen + 1)
+        return seen < self.burst
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including extra= fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """A QueueHandler that keeps extra= fields and the request ID on queued records."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def parse_log_levels(value: str) -> Dict[str, str]:
+    """Parse "module=LEVEL,module=LEVEL" into a dict."""
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_retry_filter: Optional[SamplingFilter] = None
+
+
+def setup_logging():
+    """Route all logging through a queue to a JSON writer thread. Safe to call twice."""
+    global _listener, _queue_handler, _retry_filter
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = _QueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in parse_log_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _retry_filter = SamplingFilter(LOG_RETRY_SAMPLE_BURST, LOG_RETRY_SAMPLE_INTERVAL_SECONDS)
+    logging.getLogger(RETRY_LOGGER_NAME).addFilter(_retry_filter)
+
+
+def shutdown_logging():
+    """Flush queued records and remove the queue handler."""
+    global _listener, _queue_handler, _retry_filter
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    logging.getLogger(RETRY_LOGGER_NAME).removeFilter(_retry_filter)
+    _listener.stop()
+    _listener = _queue_handler = _retry_filter = None
+
+
+async def request_id_middleware(request, call_next):
+    """Tag the request with an ID, taken from X-Request-ID if given, and echo it back."""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
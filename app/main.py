@@ -3,14 +3,25 @@ Main entry point for the Redfin Median Price API.
 """
 
 import os
+import asyncio
 from dotenv import load_dotenv
 
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import uvicorn
 
-from app.database import connect_to_mongo, close_mongo_connection
+from app.database import connect_to_mongo, connect_jobs_collection, close_mongo_connection
 from app.routes import router
+from app.admin import router as admin_router
+from app.services import load_city_codes
+from app.http_pool import HTTPClientPool
+from app.parse_executor import shutdown_parse_executor
+from app import scheduler
+from app import services
+from app import timing
+from app import profiling
+from app.logging_config import request_id_middleware, setup_logging, shutdown_logging
+from app.jobs import start_job_workers
 
 load_dotenv()
 
@@ -23,12 +34,33 @@ API_VERSION = os.getenv("API_VERSION")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    setup_logging()
     client, collection = await connect_to_mongo()
     app.state.mongo_client = client
     app.state.mongo_collection = collection
+    if collection is not None:
+        await load_city_codes(collection)
+    http_pool = HTTPClientPool()
+    await http_pool.start()
+    app.state.http_pool = http_pool
+    jobs = await connect_jobs_collection(client)
+    app.state.jobs_collection = jobs
+    job_tasks = []
+    if jobs is not None and collection is not None:
+        job_tasks = start_job_workers(jobs, collection, http_pool=http_pool)
+    refresh_task = None
+    if services.REFRESH_AHEAD_ENABLED and collection is not None:
+        refresh_task = asyncio.create_task(scheduler.refresh_ahead_loop(collection, http_pool=http_pool))
     yield
     # Shutdown
+    background_tasks = job_tasks + ([refresh_task] if refresh_task else [])
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await http_pool.close()
+    shutdown_parse_executor()
     await close_mongo_connection(app.state.mongo_client)
+    shutdown_logging()
 
 # Create FastAPI app with lifespan
 app = FastAPI(
@@ -38,8 +70,20 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Time /median-prices requests for Server-Timing and the slow request log
+if timing.request_timing_enabled():
+    app.middleware("http")(timing.request_timing_middleware)
+
+# Count requests towards on-demand CPU profiles
+if profiling.PROFILING_ENABLED:
+    app.middleware("http")(profiling.profiling_middleware)
+
+# Tag every request with an ID for its log records; added last so it runs first
+app.middleware("http")(request_id_middleware)
+
 # Include routers
 app.include_router(router)
+app.include_router(admin_router)
 
 # Run the app with uvicorn
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Dict, List, Optional
 
 
 class APIInfo(BaseModel):
@@ -20,3 +20,41 @@ class APIInfo(BaseModel):
             ]
         }
     }
+
+
+class CityLocation(BaseModel):
+    """Model for a single city lookup."""
+
+    state: str = Field(..., min_length=2, max_length=2, description="State abbreviation (e.g. TX)")
+    city: str = Field(..., min_length=1, description="City name (e.g. Austin)")
+
+
+class BatchMedianPricesRequest(BaseModel):
+    """Model for a batch median price lookup."""
+
+    cities: List[CityLocation] = Field(..., min_length=1)
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "cities": [
+                        {"state": "TX", "city": "Austin"},
+                        {"state": "CA", "city": "San Francisco"}
+                    ]
+                }
+            ]
+        }
+    }
+
+
+class ScrapeJob(BaseModel):
+    """Model for the status of an asynchronous scrape job."""
+
+    job_id: str = Field(...)
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    state: str = Field(...)
+    city: str = Field(...)
+    data: Optional[Dict[str, float]] = Field(None, description="Median prices once the job has succeeded")
+    status_code: Optional[int] = Field(None, description="HTTP status of a failed job")
+    error: Optional[str] = Field(None)
@@ -0,0 +1,55 @@
+"""
+Executor for the CPU-bound HTML parsing stage of the scraper.
+
+Parsing a housing market page is synchronous work; running it on the event loop
+stalls every other request handled by the same worker. The parse stage is run
+in a thread pool by default, or in a process pool that only receives the raw
+page text and returns the small price dict.
+"""
+
+import os
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "thread", "process", or "none" to parse on the event loop
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread").lower()
+PARSE_EXECUTOR_WORKERS = int(os.getenv("PARSE_EXECUTOR_WORKERS", "2"))
+
+_executor: Optional[Executor] = None
+
+
+def create_parse_executor(kind: str = PARSE_EXECUTOR, workers: int = PARSE_EXECUTOR_WORKERS) -> Optional[Executor]:
+    """Create the executor for the given kind, or None to parse inline."""
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return None
+
+
+def get_parse_executor() -> Optional[Executor]:
+    """Return the shared parse executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = create_parse_executor()
+    return _executor
+
+
+async def run_in_parse_executor(func: Callable, *args) -> Any:
+    """Run func(*args) on the parse executor, or inline if parsing on the event loop."""
+    executor = get_parse_executor()
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def shutdown_parse_executor():
+    """Shut down the shared parse executor, if one was created."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,126 @@
+"""
+On-demand CPU and memory profiling of a running worker.
+
+Nothing here runs unless an admin starts a profile: the request counting
+middleware is only installed when PROFILING_ENABLED is set, and tracemalloc is
+only tracing for the duration of a memory profile.
+"""
+
+import io
+import os
+import asyncio
+import cProfile
+import pstats
+import tracemalloc
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Longest window a single profile may run for
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "300"))
+# Stack frames kept per allocation while a memory profile runs
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "1"))
+
+CPU_SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+class ProfileInProgressError(Exception):
+    """Raised when a profile is requested while another one is still running."""
+
+
+class CPUProfileSession:
+    """A cProfile run that ends after a number of requests or when its window closes."""
+
+    def __init__(self, max_requests: Optional[int] = None):
+        self.profiler = cProfile.Profile()
+        self.max_requests = max_requests
+        self.requests = 0
+        self.finished = asyncio.Event()
+
+    def request_finished(self):
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            self.finished.set()
+
+    def report(self, sort: str = "cumulative", limit: int = 50) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+active_cpu_profile: Optional[CPUProfileSession] = None
+_memory_profile_running = False
+
+
+async def profile_cpu(
+    max_requests: Optional[int], seconds: float, sort: str = "cumulative", limit: int = 50
+) -> str:
+    """
+    Profile the event loop thread until max_requests requests have completed or
+    seconds have passed, whichever comes first, and return the sorted stats.
+    """
+    global active_cpu_profile
+    if active_cpu_profile is not None:
+        raise ProfileInProgressError("A CPU profile is already running")
+
+    session = CPUProfileSession(max_requests)
+    active_cpu_profile = session
+    session.profiler.enable()
+    try:
+        await asyncio.wait_for(session.finished.wait(), timeout=min(seconds, PROFILING_MAX_SECONDS))
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        session.profiler.disable()
+        active_cpu_profile = None
+    return f"Profiled {session.requests} requests\n" + session.report(sort, limit)
+
+
+async def profile_memory(seconds: float, limit: int = 25) -> List[dict]:
+    """
+    Compare tracemalloc snapshots taken seconds apart and return the source lines
+    whose allocations grew the most.
+    """
+    global _memory_profile_running
+    if _memory_profile_running:
+        raise ProfileInProgressError("A memory profile is already running")
+
+    _memory_profile_running = True
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(min(seconds, PROFILING_MAX_SECONDS))
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _memory_profile_running = False
+
+    ignored = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]
+    differences = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "lineno")
+    return [
+        {
+            "location": str(difference.traceback),
+            "size_diff_kb": round(difference.size_diff / 1024, 1),
+            "size_kb": round(difference.size / 1024, 1),
+            "count_diff": difference.count_diff,
+        }
+        for difference in differences[:limit]
+    ]
+
+
+async def profiling_middleware(request, call_next):
+    """Count completed requests towards a running CPU profile."""
+    response = await call_next(request)
+    session = active_cpu_profile
+    if session is not None and not request.url.path.startswith("/admin"):
+        session.request_finished()
+    return response
@@ -0,0 +1,78 @@
+"""
+Upstream rate limiting for requests made to Redfin.
+"""
+
+import os
+import time
+import random
+import asyncio
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Sustained requests per second allowed to each upstream host
+UPSTREAM_RATE_PER_SECOND = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "1"))
+# Requests that may go out back to back before the rate applies
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "2"))
+# Random extra delay added to requests that have to wait, so they do not arrive in lockstep
+UPSTREAM_JITTER_SECONDS = float(os.getenv("UPSTREAM_JITTER_SECONDS", "0.5"))
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket that smooths bursts to a steady request rate.
+
+    Each acquire takes one token. While tokens are available the caller proceeds
+    immediately; otherwise it sleeps until its token is due, plus a little jitter.
+    Tokens are reserved before sleeping, so concurrent callers queue up in order
+    without needing a lock.
+    """
+
+    def __init__(self, rate: float, burst: int, jitter: float = 0.0):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.jitter = jitter
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate + random.uniform(0, self.jitter)
+
+    async def acquire(self, deadline: Optional[float] = None) -> bool:
+        """
+        Wait until the caller is allowed to send a request. Returns False without
+        waiting, and gives the token back, if the wait would run past deadline.
+        """
+        delay = self.reserve()
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            self._tokens += 1
+            return False
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+
+# One bucket per upstream host, shared by every request in this process
+rate_limiters: Dict[str, TokenBucket] = {}
+
+
+def get_rate_limiter(host: str) -> TokenBucket:
+    """Return the shared token bucket for an upstream host, creating it on first use."""
+    limiter = rate_limiters.get(host)
+    if limiter is None:
+        limiter = TokenBucket(UPSTREAM_RATE_PER_SECOND, UPSTREAM_BURST, UPSTREAM_JITTER_SECONDS)
+        rate_limiters[host] = limiter
+    return limiter
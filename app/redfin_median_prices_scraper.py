@@ -1,11 +1,17 @@
 import os
+import logging
 from dotenv import load_dotenv
-import asyncio
 import json
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
 import re
-from httpx import AsyncClient
-import random
+import time
+from httpx import AsyncClient, Response
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from app.http_pool import HTTPClientPool
+from app.metrics import SCRAPES_IN_FLIGHT
+from app.timing import record_stage, stage_timer
+from app.parse_executor import run_in_parse_executor
 from app.utils import (
     create_http_client,
     make_request_with_retry,
@@ -17,21 +23,88 @@ from app.utils import (
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 city_url = os.getenv("CITY_URL")
 median_price_url = os.getenv("MEDIAN_PRICE_URL")
 
-async def get_city_code(client: AsyncClient, state: str, city: str) -> Optional[str]:
+class LocationNotFoundError(Exception):
+    """Redfin answered, but has nothing for the location; retrying will not help."""
+
+    reason = "not_found"
+
+
+class CityNotFoundError(LocationNotFoundError):
+    """The autocomplete API does not know the city."""
+
+    reason = "city_not_found"
+
+
+class MedianDataNotFoundError(LocationNotFoundError):
+    """The housing market page has no median sale price data."""
+
+    reason = "no_median_data"
+
+
+# Redfin city codes by (state, city); a city's code effectively never changes
+city_code_cache: Dict[Tuple[str, str], str] = {}
+
+
+def remember_city_code(state: str, city: str, city_code: str):
+    """Store a resolved Redfin city code so later scrapes skip the autocomplete lookup."""
+    city_code_cache[(state, city)] = city_code
+
+
+def get_known_city_code(state: str, city: str) -> Optional[str]:
+    """Return the previously resolved Redfin city code for a location, if any."""
+    return city_code_cache.get((state, city))
+
+def open_upstream_circuit() -> Optional[CircuitBreaker]:
+    """Return the circuit breaker of a Redfin host that is refusing requests, if any."""
+    for url in (city_url, median_price_url):
+        breaker = get_circuit_breaker(urlparse(url or "").netloc)
+        if breaker is not None and breaker.is_open():
+            return breaker
+    return None
+
+
+def raise_if_upstream_circuit_open():
+    """
+    Raise CircuitOpenError if a Redfin host's breaker is refusing requests, so a scrape
+    that failed because the breaker opened is not mistaken for a missing location.
+    """
+    breaker = open_upstream_circuit()
+    if breaker is not None:
+        raise CircuitOpenError(breaker.name, breaker.retry_after())
+
+
+def parse_housing_market_page_timed(html: str) -> Tuple[Dict[str, int], float, float]:
+    """
+    Extract the monthly median sale prices from a housing market page, along with the
+    seconds spent extracting the price script and parsing the prices, so the caller
+    can record them. Runs on the parse executor, so it takes only the page text.
+    """
+    started = time.perf_counter()
+    scripts = extract_scripts_from_page(html)
+    extracted = time.perf_counter()
+    median_prices = parse_median_prices(scripts)
+    return median_prices, extracted - started, time.perf_counter() - extracted
+
+
+async def get_city_code(
+    client: AsyncClient, state: str, city: str, deadline: Optional[float] = None
+) -> Optional[str]:
     """
     Fetches the city code from Redfin's autocomplete API.
+    Returns None if the lookup failed, and raises CityNotFoundError if Redfin has no such city.
     """
-    await asyncio.sleep(random.uniform(1, 3))
-    
     location = f"{city}, {state}"
     url = city_url.format(city=city, state=state)
     params =  params = build_city_code_params(location)
 
     try:
-        response = await make_request_with_retry(client, 'get', url, params=params)
+        with stage_timer("autocomplete"):
+            response = await make_request_with_retry(client, 'get', url, deadline=deadline, params=params)
         if not response:
             return None
             
@@ -44,51 +117,103 @@ async def get_city_code(client: AsyncClient, state: str, city: str) -> Optional[
                 match = re.search(r'/city/(\d+)/', url_path)
                 if match:
                     return match.group(1)
-        return None
+        raise CityNotFoundError(f"Could not find city code for {city}, {state}")
+    except CityNotFoundError:
+        raise
     except Exception as e:
-        print(f"Error getting city code: {e}")
+        logger.warning("Error getting city code: %s", e)
         return None
 
 
-async def get_median_sale_prices_data(state: str, city: str) -> Optional[Dict[str, int]]:
+async def get_median_sale_prices_data(
+    state: str, city: str, http_pool: Optional[HTTPClientPool] = None, deadline: Optional[float] = None
+) -> Optional[Dict[str, int]]:
     """
-    Fetches the city code from Redfin's autocomplete API.
+    Fetches the 3-year median sale prices for a city from its Redfin housing market page.
+    The autocomplete lookup is skipped when the city code is already known.
+    Uses a client leased from http_pool when given, otherwise a one-off client.
+    Returns None if the scrape failed or could not finish before deadline, raises
+    a LocationNotFoundError if Redfin has no data for the location, and a
+    CircuitOpenError if it failed because Redfin's circuit breaker is open.
     """
-    try:
-        client = await create_http_client()
+    with SCRAPES_IN_FLIGHT.track_in_progress():
+        if http_pool is not None:
+            async with http_pool.lease() as client:
+                return await scrape_median_sale_prices(client, state, city, deadline)
 
         try:
-            city_code = await get_city_code(client, state, city)
-            if not city_code:
-                print(f"Could not find city code for {city}, {state}")
-                return None
+            client = await create_http_client()
+        except Exception as e:
+            logger.error("Error creating HTTP client: %s", e)
+            return None
 
-            await asyncio.sleep(random.uniform(2, 5))
+        try:
+            return await scrape_median_sale_prices(client, state, city, deadline)
+        finally:
+            await client.aclose()
 
-            url = median_price_url.format(city_code=city_code, state=state, city=city)
-            response = await make_request_with_retry(client, 'get', url)
-            if not response:
-                print(f"Failed to get data for {city}, {state}")
-                return None
 
-            scripts = extract_scripts_from_page(response.text)
-            median_prices = parse_median_prices(scripts)
+async def fetch_housing_market_page(
+    client: AsyncClient, state: str, city: str, city_code: str, deadline: Optional[float] = None
+) -> Optional[Response]:
+    """
+    Fetch the housing market page of a city. A 404 response is returned rather than
+    None, so callers can tell an unknown city code from a failed request.
+    """
+    url = median_price_url.format(city_code=city_code, state=state, city=city)
+    with stage_timer("page_fetch"):
+        return await make_request_with_retry(client, 'get', url, deadline=deadline, accept_statuses=(404,))
 
-            if not median_prices:
-                print(f"No median price data found for {city}, {state}")
-                return None
 
-            return filter_last_3_years(median_prices)
+async def scrape_median_sale_prices(
+    client: AsyncClient, state: str, city: str, deadline: Optional[float] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Scrapes the 3-year median sale prices for a city using the given client.
+    """
+    try:
+        city_code = get_known_city_code(state, city)
+        response = None
+        if city_code:
+            response = await fetch_housing_market_page(client, state, city, city_code, deadline)
+            if response is not None and response.status_code == 404:
+                # Redfin no longer knows the stored code, so resolve the city again
+                logger.info("Stored city code %s for %s, %s is outdated", city_code, city, state)
+                city_code_cache.pop((state, city), None)
+                city_code = None
+        if not city_code:
+            city_code = await get_city_code(client, state, city, deadline=deadline)
+            if not city_code:
+                raise_if_upstream_circuit_open()
+                logger.warning("City code lookup failed for %s, %s", city, state)
+                return None
+            remember_city_code(state, city, city_code)
+            response = await fetch_housing_market_page(client, state, city, city_code, deadline)
 
-        except Exception as e:
-            print(f"Unexpected error in get_median_sale_prices_data: {e}")
-            import traceback
-            traceback.print_exc()
+        if not response:
+            raise_if_upstream_circuit_open()
+            logger.warning("Failed to get data for %s, %s", city, state)
             return None
-
-        finally:
-            await client.aclose()
-
+        if response.status_code == 404:
+            raise MedianDataNotFoundError(f"No housing market page found for {city}, {state}")
+
+        median_prices, extract_seconds, parse_seconds = await run_in_parse_executor(
+            parse_housing_market_page_timed, response.text
+        )
+        record_stage("extract", extract_seconds)
+        record_stage("parse", parse_seconds)
+
+        if not median_prices:
+            raise MedianDataNotFoundError(f"No median price data found for {city}, {state}")
+
+        return filter_last_3_years(median_prices)
+
+    except LocationNotFoundError as e:
+        logger.info("%s", e)
+        raise
+    except CircuitOpenError as e:
+        logger.warning("Scrape of %s, %s stopped: %s", city, state, e)
+        raise
     except Exception as e:
-        print(f"Error creating HTTP client: {e}")
+        logger.exception("Unexpected error in get_median_sale_prices_data: %s", e)
         return None
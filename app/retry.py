@@ -0,0 +1,156 @@
+"""
+Retry policy for requests made to Redfin.
+
+The policy decides which failures are worth retrying, how long to wait before
+the next attempt (honouring Retry-After), and whether the process-wide retry
+budget still allows a retry, so retries cannot multiply the load on an upstream
+that is already struggling.
+"""
+
+import os
+import time
+import random
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Deque, FrozenSet, Optional, Tuple, Type
+from dotenv import load_dotenv
+from httpx import RequestError, Response
+
+load_dotenv()
+
+# Attempts per request, including the first
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+# Response statuses worth retrying; anything else that is not 2xx fails immediately
+RETRY_STATUSES = os.getenv("RETRY_STATUSES", "408,425,429,500,502,503,504")
+# Backoff before retry n is RETRY_BACKOFF_BASE_SECONDS * 2**(n-1) plus up to RETRY_JITTER_SECONDS
+RETRY_BACKOFF_BASE_SECONDS = float(os.getenv("RETRY_BACKOFF_BASE_SECONDS", "2"))
+RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("RETRY_BACKOFF_MAX_SECONDS", "30"))
+RETRY_JITTER_SECONDS = float(os.getenv("RETRY_JITTER_SECONDS", "1"))
+# Longest Retry-After the server may ask for before the request is given up instead
+RETRY_AFTER_MAX_SECONDS = float(os.getenv("RETRY_AFTER_MAX_SECONDS", "60"))
+# Retries allowed per request over the budget window, plus a small reserve per second
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+RETRY_BUDGET_WINDOW_SECONDS = float(os.getenv("RETRY_BUDGET_WINDOW_SECONDS", "10"))
+
+
+def parse_statuses(value: str) -> FrozenSet[int]:
+    """Parse a comma separated list of status codes."""
+    return frozenset(int(status) for status in value.split(",") if status.strip())
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convert a Retry-After header (seconds or an HTTP date) into seconds from now."""
+    if not isinstance(value, str) or not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of recent requests across the whole process.
+
+    Over a sliding window, retries may not exceed ratio times the number of
+    requests, plus min_per_second times the window length so that a quiet
+    process can still retry.
+    """
+
+    def __init__(
+        self,
+        ratio: float = RETRY_BUDGET_RATIO,
+        min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+        window_seconds: float = RETRY_BUDGET_WINDOW_SECONDS,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window_seconds:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Take a retry from the budget, returning False if none is left."""
+        now = time.monotonic()
+        self._trim(now)
+        allowed = self.ratio * len(self._requests) + self.min_per_second * self.window_seconds
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(now)
+        return True
+
+    def clear(self):
+        self._requests.clear()
+        self._retries.clear()
+
+
+class RetryPolicy:
+    """Which failures to retry, how often, how long to wait, and within what budget."""
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        retry_statuses: FrozenSet[int] = parse_statuses(RETRY_STATUSES),
+        retry_exceptions: Tuple[Type[BaseException], ...] = (RequestError,),
+        backoff_base: float = RETRY_BACKOFF_BASE_SECONDS,
+        backoff_max: float = RETRY_BACKOFF_MAX_SECONDS,
+        jitter: float = RETRY_JITTER_SECONDS,
+        retry_after_max: float = RETRY_AFTER_MAX_SECONDS,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_statuses = retry_statuses
+        self.retry_exceptions = retry_exceptions
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_after_max = retry_after_max
+        self.budget = budget
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.retry_statuses
+
+    def is_retryable_exception(self, error: BaseException) -> bool:
+        return isinstance(error, self.retry_exceptions)
+
+    def backoff(self, attempt: int, response: Optional[Response] = None) -> Optional[float]:
+        """
+        Seconds to wait after the given failed attempt (1 for the first). A Retry-After
+        header takes precedence; returns None if it asks for longer than retry_after_max.
+        """
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.retry_after_max else None
+        delay = min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max)
+        return delay + random.uniform(0, self.jitter)
+
+    def record_request(self):
+        if self.budget is not None:
+            self.budget.record_request()
+
+    def try_spend_retry(self) -> bool:
+        return self.budget is None or self.budget.try_spend()
+
+
+# Shared by every upstream request in this process, so the budget is process-wide
+default_retry_policy = RetryPolicy(budget=RetryBudget())
@@ -2,11 +2,29 @@
 API routes for the Redfin Median Price API.
 """
 
-from fastapi import APIRouter, Query, Request
-from typing import Dict
+import json
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Dict, Optional
 
-from app.models import APIInfo
-from app.services import standardize_location, get_fresh_cached_data, fetch_and_cache_prices
+from app.models import APIInfo, BatchMedianPricesRequest, ScrapeJob
+from app.jobs import enqueue_scrape_job, get_job, job_response
+from app import services
+from app.metrics import CACHE_LOOKUPS, CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from app.timing import stage_timer
+from app.deadline import request_deadline
+from app.services import (
+    standardize_location,
+    get_fresh_cached_data,
+    get_stale_cached_data,
+    is_refresh_in_flight,
+    refresh_city_prices,
+    record_cache_miss,
+    record_city_request,
+    fetch_and_cache_prices,
+    stream_batch_prices,
+    stream_export,
+)
 
 router = APIRouter()
 
@@ -18,7 +36,11 @@ async def root():
         "name": "Redfin Median Price API",
         "description": "API to fetch 3-year median sale prices for a city",
         "endpoints": {
-            "/median-prices": "GET median prices for a city (parameters: state, city)"
+            "/median-prices": "GET median prices for a city (parameters: state, city)",
+            "/median-prices/batch": "POST median prices for many cities, streamed as NDJSON",
+            "/jobs/{job_id}": "GET the status of an asynchronous scrape job",
+            "/export": "GET every cached city as NDJSON or CSV (parameters: format, state, updated_since)",
+            "/metrics": "GET Prometheus metrics"
         }
     }
 
@@ -26,18 +48,135 @@ async def root():
 @router.get("/median-prices", response_model=Dict[str, float])
 async def get_median_prices(
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     state: str = Query(..., min_length=2, max_length=2, description="State abbreviation (e.g. TX)"),
-    city: str = Query(..., min_length=1, description="City name (e.g. Austin)")
+    city: str = Query(..., min_length=1, description="City name (e.g. Austin)"),
+    prefer: Optional[str] = Header(None, description="Send 'respond-async' to queue a scrape instead of waiting"),
+    x_request_timeout: Optional[float] = Header(None, gt=0, description="Seconds to wait for a scrape before giving up"),
     ):
     """
     Endpoint to retrieve median sale prices for a given city and state.
     Returns cached data if fresh; otherwise fetches, caches, and returns new data.
+    With stale-while-revalidate enabled, expired data is returned immediately with an
+    X-Cache-Status: stale header while a refresh runs in the background.
+    With a 'Prefer: respond-async' header, a cache miss queues a scrape job and
+    returns 202 Accepted with the job ID to poll at /jobs/{job_id}.
+    A scrape that cannot finish within the X-Request-Timeout header, or
+    REQUEST_TIMEOUT_SECONDS, returns stale data if there is any, or 504.
     """
+    deadline = request_deadline(x_request_timeout)
     state, city = standardize_location(state, city)
     collection = request.app.state.mongo_collection
+    http_pool = getattr(request.app.state, "http_pool", None)
+    record_city_request(state, city)
 
-    cached_prices = await get_fresh_cached_data(collection, state, city)
+    with stage_timer("cache_lookup"):
+        cached_prices = await get_fresh_cached_data(collection, state, city)
     if cached_prices:
+        CACHE_LOOKUPS.inc(result="hit")
+        response.headers["X-Cache-Status"] = "hit"
         return cached_prices
 
-    return await fetch_and_cache_prices(collection, state, city)
\ No newline at end of file
+    if services.STALE_WHILE_REVALIDATE:
+        with stage_timer("cache_lookup"):
+            stale_data = await get_stale_cached_data(collection, state, city)
+        if stale_data:
+            CACHE_LOOKUPS.inc(result="stale")
+            if not is_refresh_in_flight(state, city):
+                background_tasks.add_task(
+                    refresh_city_prices, collection, state, city, http_pool=http_pool
+                )
+            response.headers["X-Cache-Status"] = "stale"
+            response.headers["X-Last-Updated"] = str(stale_data.get("last_updated", ""))
+            return stale_data["data"]
+
+    record_cache_miss(state, city)
+    jobs = getattr(request.app.state, "jobs_collection", None)
+    if prefer and "respond-async" in prefer.lower() and jobs is not None:
+        job = await enqueue_scrape_job(jobs, state, city)
+        status_url = f"/jobs/{job['_id']}"
+        return JSONResponse(
+            status_code=202,
+            content={**job_response(job), "status_url": status_url},
+            headers={"Location": status_url, "X-Cache-Status": "miss"},
+        )
+
+    response.headers["X-Cache-Status"] = "miss"
+    return await fetch_and_cache_prices(collection, state, city, http_pool=http_pool, deadline=deadline)
+
+
+@router.post("/median-prices/batch")
+async def get_median_prices_batch(request: Request, body: BatchMedianPricesRequest):
+    """
+    Endpoint to retrieve median sale prices for many cities in one call.
+    Streams one JSON object per line as each city completes, with a per-city status.
+    """
+    if len(body.cities) > services.BATCH_MAX_CITIES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch may contain at most {services.BATCH_MAX_CITIES} cities"
+        )
+    collection = request.app.state.mongo_collection
+    http_pool = getattr(request.app.state, "http_pool", None)
+    locations = [standardize_location(location.state, location.city) for location in body.cities]
+    for state, city in locations:
+        record_city_request(state, city)
+
+    async def ndjson_lines():
+        async for item in stream_batch_prices(collection, locations, http_pool=http_pool):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@router.get("/jobs/{job_id}", response_model=ScrapeJob, response_model_exclude_none=True)
+async def get_scrape_job(request: Request, job_id: str):
+    """
+    Endpoint to poll the status of an asynchronous scrape job.
+    """
+    jobs = getattr(request.app.state, "jobs_collection", None)
+    job = await get_job(jobs, job_id) if jobs is not None else None
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job_response(job)
+
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@router.get("/export")
+async def export_prices(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    state: Optional[str] = Query(None, min_length=2, max_length=2, description="Only export this state"),
+    updated_since: Optional[str] = Query(
+        None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="Only export cities updated on or after this date (YYYY-MM-DD)"
+    ),
+    batch_size: int = Query(services.EXPORT_BATCH_SIZE, ge=1, le=10000, description="Documents per MongoDB round trip"),
+):
+    """
+    Endpoint to stream every cached city, for bulk copies of the dataset.
+    """
+    collection = request.app.state.mongo_collection
+    lines = stream_export(
+        collection,
+        export_format=format,
+        state=state.upper() if state else None,
+        updated_since=updated_since,
+        batch_size=batch_size,
+    )
+    return StreamingResponse(
+        lines,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=median-prices.{format}"},
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Endpoint exposing request, cache, upstream and per-stage latency metrics
+    in the Prometheus text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
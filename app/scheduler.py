@@ -0,0 +1,88 @@
+"""
+Refresh-ahead scheduler for the Redfin Median Price API.
+
+Re-scrapes popular cities shortly before their cached data expires so that
+requests for hot cities rarely have to wait on Redfin.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.services import CACHE_MAX_AGE_DAYS, flush_request_counts, refresh_city_prices
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How often the scheduler wakes up to pick cities to refresh
+REFRESH_AHEAD_INTERVAL_SECONDS = float(os.getenv("REFRESH_AHEAD_INTERVAL_SECONDS", "300"))
+# Maximum number of cities refreshed per interval
+REFRESH_AHEAD_BATCH_SIZE = int(os.getenv("REFRESH_AHEAD_BATCH_SIZE", "10"))
+# Refresh cities this many days before they stop being fresh
+REFRESH_AHEAD_WINDOW_DAYS = int(os.getenv("REFRESH_AHEAD_WINDOW_DAYS", "1"))
+# Cities requested fewer times than this since their last refresh are left to expire
+REFRESH_AHEAD_MIN_REQUESTS = int(os.getenv("REFRESH_AHEAD_MIN_REQUESTS", "1"))
+
+
+def refresh_cutoff_date(now: Optional[datetime] = None) -> str:
+    """
+    Return the last_updated date at or before which a city is due for a refresh-ahead.
+    """
+    now = now or datetime.now()
+    days = max(CACHE_MAX_AGE_DAYS - REFRESH_AHEAD_WINDOW_DAYS, 0)
+    return (now - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+async def find_refresh_candidates(collection, limit: int) -> List[Tuple[str, str]]:
+    """
+    Find the most requested cities that are about to expire, most popular first.
+    """
+    cursor = collection.find(
+        {
+            "last_updated": {"$lte": refresh_cutoff_date()},
+            "request_count": {"$gte": REFRESH_AHEAD_MIN_REQUESTS},
+        },
+        {"_id": 0, "state": 1, "city": 1},
+    ).sort("request_count", -1).limit(limit)
+    return [(doc["state"], doc["city"]) async for doc in cursor]
+
+
+async def run_refresh_cycle(collection, interval_seconds: float = 0, http_pool=None) -> int:
+    """
+    Run one scheduler cycle: persist request counts, then refresh up to
+    REFRESH_AHEAD_BATCH_SIZE due cities, spreading them evenly over interval_seconds.
+    Returns the number of cities refreshed.
+    """
+    await flush_request_counts(collection)
+    candidates = await find_refresh_candidates(collection, REFRESH_AHEAD_BATCH_SIZE)
+    if not candidates:
+        return 0
+
+    spacing = interval_seconds / len(candidates)
+    for state, city in candidates:
+        await refresh_city_prices(collection, state, city, http_pool=http_pool)
+        if spacing:
+            await asyncio.sleep(spacing)
+    return len(candidates)
+
+
+async def refresh_ahead_loop(collection, http_pool=None):
+    """Run refresh cycles forever until cancelled."""
+    while True:
+        started = asyncio.get_running_loop().time()
+        try:
+            refreshed = await run_refresh_cycle(
+                collection, REFRESH_AHEAD_INTERVAL_SECONDS, http_pool=http_pool
+            )
+            if refreshed:
+                logger.info("Refresh-ahead refreshed %d cities", refreshed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Refresh-ahead cycle failed: %s", e)
+        elapsed = asyncio.get_running_loop().time() - started
+        await asyncio.sleep(max(REFRESH_AHEAD_INTERVAL_SECONDS - elapsed, 0))
@@ -0,0 +1,150 @@
+"""
+Cross-worker scrape leases for the Redfin Median Price API.
+
+SingleFlight only coalesces scrapes within one process. Before scraping a city,
+a worker takes a lease stored on the city document in MongoDB, so only one
+worker across every process and container scrapes it at a time. The others
+serve what is stored or wait for the holder to finish. A lease expires after
+SCRAPE_LEASE_SECONDS, so a worker that dies mid-scrape cannot block the city.
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.deadline import fits_before, time_remaining
+from app.metrics import Counter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_LEASE_ENABLED = os.getenv("SCRAPE_LEASE_ENABLED", "true").lower() == "true"
+# How long a lease is held before other workers may take it over; longer than the slowest scrape
+SCRAPE_LEASE_SECONDS = float(os.getenv("SCRAPE_LEASE_SECONDS", "120"))
+# How long a worker with nothing to serve waits for another worker's scrape, and how often it checks
+SCRAPE_LEASE_WAIT_SECONDS = float(os.getenv("SCRAPE_LEASE_WAIT_SECONDS", "30"))
+SCRAPE_LEASE_POLL_SECONDS = float(os.getenv("SCRAPE_LEASE_POLL_SECONDS", "0.5"))
+
+# Identifies this process in lease documents, for debugging
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+SCRAPE_LEASES = Counter(
+    "redfin_scrape_leases_total",
+    "Attempts to take a scrape lease, by result (acquired or held by another worker).",
+    ["result"],
+)
+
+
+def stub_expiry(expires_at: datetime) -> dict:
+    """
+    Pipeline expression for stub_expires_at: a city document without prices, left by
+    a lease or a negative cache entry, is deleted by the TTL index once expires_at
+    has passed. Documents with prices are kept.
+    """
+    return {"$cond": [
+        {"$eq": [{"$type": "$data"}, "missing"]},
+        {"$max": ["$stub_expires_at", expires_at]},
+        "$$REMOVE",
+    ]}
+
+
+def lease_active(cached_data: Optional[dict]) -> bool:
+    """Check if a city document carries a scrape lease that has not expired."""
+    if not cached_data:
+        return False
+    expires_at = (cached_data.get("scrape_lease") or {}).get("expires_at")
+    return isinstance(expires_at, datetime) and expires_at > datetime.utcnow()
+
+
+async def acquire_scrape_lease(collection, state: str, city: str) -> Optional[dict]:
+    """
+    Atomically take the scrape lease on a city document, creating the document if
+    needed. Returns the leased document as stored, so the caller can see whether
+    another worker refreshed the city just before, or None if another worker holds
+    an unexpired lease or created the document first.
+    """
+    now = datetime.utcnow()
+    owner = f"{WORKER_ID}:{uuid.uuid4().hex}"
+    lease = {"owner": owner, "expires_at": now + timedelta(seconds=SCRAPE_LEASE_SECONDS)}
+    # A pipeline update keeps the check and the write in one operation, and still upserts.
+    # The unique (state, city) index lets only one of several concurrent upserts insert.
+    try:
+        document = await collection.find_one_and_update(
+            {"state": state, "city": city},
+            [{"$set": {
+                "scrape_lease": {
+                    "$cond": [{"$gt": ["$scrape_lease.expires_at", now]}, "$scrape_lease", {"$literal": lease}]
+                },
+                "stub_expires_at": stub_expiry(lease["expires_at"]),
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        document = None
+    if isinstance(document, dict) and (document.get("scrape_lease") or {}).get("owner") == owner:
+        SCRAPE_LEASES.inc(result="acquired")
+        return document
+    SCRAPE_LEASES.inc(result="held")
+    return None
+
+
+async def release_scrape_lease(collection, state: str, city: str, owner: str):
+    """Release a lease, unless it already expired and was taken over by another worker."""
+    try:
+        await collection.update_one(
+            {"state": state, "city": city, "scrape_lease.owner": owner},
+            {"$unset": {"scrape_lease": ""}},
+        )
+    except Exception as e:
+        # The lease expires on its own
+        logger.warning("Failed to release the scrape lease for %s, %s: %s", city, state, e)
+
+
+@asynccontextmanager
+async def scrape_lease(collection, state: str, city: str) -> AsyncIterator[Optional[dict]]:
+    """
+    Hold the scrape lease of a city for the duration of the block. Yields the leased
+    city document, or None if the lease is held by another worker. With leases
+    disabled a bare document is yielded, so the caller always scrapes.
+    """
+    if not SCRAPE_LEASE_ENABLED:
+        yield {"state": state, "city": city}
+        return
+    document = await acquire_scrape_lease(collection, state, city)
+    try:
+        yield document
+    finally:
+        if document is not None:
+            await release_scrape_lease(collection, state, city, document["scrape_lease"]["owner"])
+
+
+async def wait_for_scrape_lease(
+    collection, state: str, city: str, deadline: Optional[float] = None
+) -> Optional[dict]:
+    """
+    Poll the city document until its scrape lease is released or expires, for at most
+    SCRAPE_LEASE_WAIT_SECONDS or until the deadline. Returns the last document read.
+    """
+    wait = SCRAPE_LEASE_WAIT_SECONDS
+    remaining = time_remaining(deadline)
+    if remaining is not None:
+        wait = min(wait, remaining)
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + wait
+    while True:
+        cached_data = await collection.find_one({"state": state, "city": city})
+        if not lease_active(cached_data):
+            return cached_data
+        if loop.time() + SCRAPE_LEASE_POLL_SECONDS > give_up_at or not fits_before(deadline, SCRAPE_LEASE_POLL_SECONDS):
+            return cached_data
+        await asyncio.sleep(SCRAPE_LEASE_POLL_SECONDS)
@@ -1,12 +1,132 @@
-from datetime import datetime
-from typing import Dict, Optional
+import os
+import io
+import csv
+import json
+import asyncio
+import logging
+from collections import Counter
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from fastapi import HTTPException
-from app.redfin_median_prices_scraper import get_median_sale_prices_data
+from pymongo import UpdateOne
+from app.admission import ScrapeRejectedError, scrape_admission
+from app.cache import TTLCache
+from app.circuit_breaker import CircuitOpenError
+from app.deadline import deadline_expired, time_remaining
+from app.metrics import CACHE_LOOKUPS
+from app.timing import stage_timer
+from app.redfin_median_prices_scraper import (
+    LocationNotFoundError,
+    get_median_sale_prices_data,
+    open_upstream_circuit,
+    get_known_city_code,
+    remember_city_code,
+)
+from app.scrape_lease import (
+    lease_active,
+    scrape_lease,
+    stub_expiry,
+    wait_for_scrape_lease,
+    SCRAPE_LEASE_POLL_SECONDS,
+)
+from app.singleflight import SingleFlight
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of days a scraped city stays fresh
+CACHE_MAX_AGE_DAYS = int(os.getenv("CACHE_MAX_AGE_DAYS", "7"))
+
+# In-process L1 cache of city documents, consulted before MongoDB
+L1_CACHE_MAX_SIZE = int(os.getenv("L1_CACHE_MAX_SIZE", "1024"))
+L1_CACHE_TTL_SECONDS = float(os.getenv("L1_CACHE_TTL_SECONDS", "60"))
+
+city_cache = TTLCache(L1_CACHE_MAX_SIZE, L1_CACHE_TTL_SECONDS)
+
+# How long a location Redfin has no data for is answered with 404 without scraping
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "3600"))
+
+# Serve expired city data immediately and refresh it in the background
+STALE_WHILE_REVALIDATE = os.getenv("STALE_WHILE_REVALIDATE", "false").lower() == "true"
+
+# Batch lookups: maximum cities per request and concurrent scrapes per request
+BATCH_MAX_CITIES = int(os.getenv("BATCH_MAX_CITIES", "500"))
+BATCH_SCRAPE_CONCURRENCY = int(os.getenv("BATCH_SCRAPE_CONCURRENCY", "4"))
+
+# Documents fetched from MongoDB per round trip when exporting
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+# Coalesces concurrent scrapes of the same (state, city) within this process
+scrape_flights = SingleFlight()
+
+# Background refresh tasks, referenced here so they are not garbage collected mid-run
+background_refreshes: set = set()
+
+# Request counts only feed the refresh-ahead scheduler, so they are kept only while it runs
+REFRESH_AHEAD_ENABLED = os.getenv("REFRESH_AHEAD_ENABLED", "false").lower() == "true"
+# Most cities buffered between flushes; requests for further cities are not counted
+REQUEST_COUNT_BUFFER_MAX_SIZE = int(os.getenv("REQUEST_COUNT_BUFFER_MAX_SIZE", "10000"))
+
+# Requests per city not yet written to MongoDB, flushed in bulk by the scheduler
+pending_request_counts: Counter = Counter()
 
 
 async def get_cached_data(collection, state: str, city: str):
-    """Get cached data for a city if it exists."""
-    return await collection.find_one({"state": state, "city": city})
+    """Get cached data for a city if it exists, serving hot cities from the L1 cache."""
+    cached_data = city_cache.get((state, city))
+    if cached_data is not None:
+        return cached_data
+    with stage_timer("mongo_read"):
+        cached_data = await collection.find_one({"state": state, "city": city})
+    if cached_data is not None:
+        city_cache.set((state, city), cached_data)
+        if cached_data.get("city_code"):
+            remember_city_code(state, city, cached_data["city_code"])
+    return cached_data
+
+
+async def load_city_codes(collection) -> int:
+    """
+    Load every stored Redfin city code into memory so refreshes can skip the
+    autocomplete lookup. Returns the number of codes loaded.
+    """
+    loaded = 0
+    try:
+        cursor = collection.find(
+            {"city_code": {"$exists": True}},
+            {"_id": 0, "state": 1, "city": 1, "city_code": 1}
+        )
+        async for cached_data in cursor:
+            remember_city_code(cached_data["state"], cached_data["city"], cached_data["city_code"])
+            loaded += 1
+    except Exception as e:
+        logger.error("Failed to load city codes: %s", e)
+    return loaded
+
+
+async def get_cached_data_many(collection, locations: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], dict]:
+    """
+    Get cached data for many cities at once, keyed by (state, city).
+    Cities missing from the L1 cache are fetched from MongoDB in a single query.
+    """
+    found = {}
+    missing = []
+    for state, city in locations:
+        cached_data = city_cache.get((state, city))
+        if cached_data is not None:
+            found[(state, city)] = cached_data
+        else:
+            missing.append({"state": state, "city": city})
+
+    if missing:
+        with stage_timer("mongo_read"):
+            async for cached_data in collection.find({"$or": missing}):
+                key = (cached_data["state"], cached_data["city"])
+                found[key] = cached_data
+                city_cache.set(key, cached_data)
+    return found
 
 
 async def update_city_data(collection, state: str, city: str, prices: dict):
@@ -15,14 +135,88 @@ async def update_city_data(collection, state: str, city: str, prices: dict):
         "state": state,
         "city": city,
         "last_updated": datetime.now().strftime("%Y-%m-%d"),
-        "data": prices
+        "data": prices,
+        "request_count": 0
     }
-    await collection.update_one(
-        {"state": state, "city": city},
-        {"$set": document},
-        upsert=True
-    )
-    
+    city_code = get_known_city_code(state, city)
+    if city_code:
+        document["city_code"] = city_code
+    with stage_timer("mongo_upsert"):
+        await collection.update_one(
+            {"state": state, "city": city},
+            {"$set": document, "$unset": {"not_found_reason": "", "not_found_until": "", "stub_expires_at": ""}},
+            upsert=True
+        )
+    city_cache.set((state, city), document)
+
+
+async def remember_not_found(collection, state: str, city: str, reason: str):
+    """
+    Record that Redfin has no data for a location, so requests for it are answered
+    with 404 until NEGATIVE_CACHE_TTL_SECONDS have passed. Stored prices are kept;
+    a document without prices is deleted by MongoDB once the entry expires.
+    """
+    fields = {
+        "not_found_reason": reason,
+        "not_found_until": datetime.utcnow() + timedelta(seconds=NEGATIVE_CACHE_TTL_SECONDS),
+    }
+    with stage_timer("mongo_upsert"):
+        await collection.update_one(
+            {"state": state, "city": city},
+            [{"$set": {**fields, "stub_expires_at": stub_expiry(fields["not_found_until"])}}],
+            upsert=True
+        )
+    cached_data = city_cache.get((state, city)) or {"state": state, "city": city}
+    city_cache.set((state, city), {**cached_data, **fields})
+
+
+def is_negatively_cached(cached_data: Optional[dict]) -> bool:
+    """Check if a cached city document records a recent "not found" outcome."""
+    if not cached_data:
+        return False
+    not_found_until = cached_data.get("not_found_until")
+    return isinstance(not_found_until, datetime) and not_found_until > datetime.utcnow()
+
+
+def record_cache_miss(state: str, city: str, cached_data: Optional[dict] = None):
+    """
+    Count a lookup that found no fresh prices, as negative if the location is negatively
+    cached and as a miss otherwise. Without cached_data, the document the lookup just
+    read into the L1 cache is checked.
+    """
+    if cached_data is None:
+        cached_data = city_cache.get((state, city))
+    CACHE_LOOKUPS.inc(result="negative" if is_negatively_cached(cached_data) else "miss")
+
+
+def record_city_request(state: str, city: str):
+    """
+    Count a request for a city so popular cities can be refreshed ahead of expiry.
+    Nothing is counted while the scheduler is disabled, since nothing would flush it.
+    """
+    if not REFRESH_AHEAD_ENABLED:
+        return
+    key = (state, city)
+    if key in pending_request_counts or len(pending_request_counts) < REQUEST_COUNT_BUFFER_MAX_SIZE:
+        pending_request_counts[key] += 1
+
+
+async def flush_request_counts(collection) -> int:
+    """
+    Add the buffered request counts to the city documents in a single bulk write.
+    Returns the number of cities updated.
+    """
+    if not pending_request_counts:
+        return 0
+    counts = dict(pending_request_counts)
+    pending_request_counts.clear()
+    operations = [
+        UpdateOne({"state": state, "city": city}, {"$inc": {"request_count": count}})
+        for (state, city), count in counts.items()
+    ]
+    await collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
 
 def standardize_location(state: str, city: str) -> tuple[str, str]:
     """
@@ -31,7 +225,7 @@ def standardize_location(state: str, city: str) -> tuple[str, str]:
     return state.upper(), city.title()
 
 
-def is_cache_fresh(last_updated_str: str, max_age_days: int = 7) -> bool:
+def is_cache_fresh(last_updated_str: str, max_age_days: int = CACHE_MAX_AGE_DAYS) -> bool:
     """
     Check if the cached data is still fresh based on the last updated date.
     """
@@ -39,27 +233,313 @@ def is_cache_fresh(last_updated_str: str, max_age_days: int = 7) -> bool:
     return (datetime.now() - last_updated).days < max_age_days
 
 
+def is_document_fresh(cached_data: Optional[dict]) -> bool:
+    """Check if a cached city document exists and was updated recently enough."""
+    return bool(cached_data) and "last_updated" in cached_data and is_cache_fresh(cached_data["last_updated"])
+
+
 async def get_fresh_cached_data(collection, state: str, city: str) -> Optional[Dict[str, float]]:
     """
     Retrieve fresh cached data for the given state and city if available and not stale.
     """
     cached_data = await get_cached_data(collection, state, city)
-    if cached_data and "last_updated" in cached_data and is_cache_fresh(cached_data["last_updated"]):
+    if is_document_fresh(cached_data):
         return cached_data.get("data")
     return None
 
 
-async def fetch_and_cache_prices(collection,state: str, city: str) -> Dict[str, float]:
+async def get_stale_cached_data(collection, state: str, city: str) -> Optional[dict]:
+    """
+    Retrieve the cached document for the given state and city regardless of its age.
+    Returns None if no prices have ever been stored for the location.
+    """
+    cached_data = await get_cached_data(collection, state, city)
+    if cached_data and "data" in cached_data:
+        return cached_data
+    return None
+
+
+def is_refresh_in_flight(state: str, city: str) -> bool:
+    """Check if a scrape for the given location is already running in this process."""
+    return scrape_flights.in_flight((state, city))
+
+
+async def refresh_city_prices(collection, state: str, city: str, http_pool=None):
+    """
+    Refresh the cached prices for a location in the background, swallowing failures
+    since there is no caller waiting on the result.
+    """
+    try:
+        await fetch_and_cache_prices(collection, state, city, http_pool=http_pool)
+    except HTTPException as e:
+        logger.warning("Background refresh failed for %s, %s: %s", city, state, e.detail)
+
+
+def schedule_background_refresh(collection, state: str, city: str, http_pool=None):
+    """Start a background refresh for a location unless one is already running."""
+    if is_refresh_in_flight(state, city):
+        return
+    task = asyncio.ensure_future(refresh_city_prices(collection, state, city, http_pool=http_pool))
+    background_refreshes.add(task)
+    task.add_done_callback(background_refreshes.discard)
+
+
+async def fetch_and_cache_prices(
+    collection, state: str, city: str, http_pool=None, deadline: Optional[float] = None
+) -> Dict[str, float]:
     """
     Fetch median sale prices for the specified state and city, update the cache, and return the prices.
     If fresh data cannot be fetched, return cached data if available.
     Raises an HTTPException if no data can be found.
+    Locations Redfin recently had no data for are not scraped again until the
+    negative cache entry expires. While the upstream circuit breaker is open no
+    scrape is attempted; cached data is returned, or a 503 if there is none.
+    Concurrent calls for the same location share a single scrape and its outcome,
+    and across workers only the holder of the location's scrape lease scrapes it.
+    Scrapes lease their HTTP client from http_pool when one is given.
+    If deadline passes first, cached data is returned, or a 504 if there is none;
+    a scrape shared with other callers keeps running for them.
+    When the process is at its scrape capacity, cached data is returned, or a 503.
     """
-    prices = await get_median_sale_prices_data(state, city)
-    if prices:
-        await update_city_data(collection, state, city, prices)
-        return prices
+    flight = scrape_flights.run(
+        (state, city), lambda: _fetch_and_cache_prices(collection, state, city, http_pool, deadline)
+    )
+    if deadline is None:
+        return await flight
+    try:
+        return await asyncio.wait_for(flight, timeout=time_remaining(deadline))
+    except asyncio.TimeoutError:
+        return await _cached_prices_or_timeout(collection, state, city)
+
+
+async def _cached_prices_or_timeout(collection, state: str, city: str) -> Dict[str, float]:
+    """Return the stored prices for a location whose scrape ran out of time, or raise a 504."""
+    cached_data = await get_cached_data(collection, state, city)
+    if cached_data and "data" in cached_data:
+        return cached_data["data"]
+    raise HTTPException(status_code=504, detail=f"Timed out fetching data for {city}, {state}")
+
+
+async def _cached_prices_or_overloaded(
+    collection, state: str, city: str, error: ScrapeRejectedError, deadline: Optional[float] = None
+) -> Dict[str, float]:
+    """Return the stored prices for a location whose scrape was shed, or raise a 503."""
+    if deadline_expired(deadline):
+        return await _cached_prices_or_timeout(collection, state, city)
+    cached_data = await get_cached_data(collection, state, city)
+    if cached_data and "data" in cached_data:
+        return cached_data["data"]
+    raise HTTPException(
+        status_code=503,
+        detail="Too many lookups in progress, try again later",
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+def _upstream_unavailable(retry_after: float) -> HTTPException:
+    """The 503 for a location with no stored prices while Redfin's circuit breaker is open."""
+    return HTTPException(
+        status_code=503,
+        detail="Redfin is temporarily unavailable, try again later",
+        headers={"Retry-After": str(max(int(retry_after), 1))},
+    )
+
+
+async def _fetch_and_cache_prices(
+    collection, state: str, city: str, http_pool=None, deadline: Optional[float] = None
+) -> Dict[str, float]:
+    """Scrape, store and return prices for a location; see fetch_and_cache_prices."""
     cached_data = await get_cached_data(collection, state, city)
+    open_circuit = open_upstream_circuit()
+    # Locations Redfin recently had nothing for are not scraped again until the entry expires
+    scrape = not is_negatively_cached(cached_data)
+    if scrape and open_circuit is not None:
+        if not (cached_data and "data" in cached_data):
+            raise _upstream_unavailable(open_circuit.retry_after())
+    elif scrape:
+        # Take a scrape slot before the lease, so a busy worker never holds a city's
+        # lease while it queues, and give the slot back before waiting on another worker
+        try:
+            async with scrape_admission.admit(deadline):
+                acquired, prices = await _scrape_under_lease(collection, state, city, http_pool, deadline)
+        except ScrapeRejectedError as e:
+            return await _cached_prices_or_overloaded(collection, state, city, e, deadline)
+        except CircuitOpenError as e:
+            # The breaker opened during the scrape; that says nothing about the location
+            cached_data = await get_cached_data(collection, state, city)
+            if cached_data and "data" in cached_data:
+                return cached_data["data"]
+            raise _upstream_unavailable(e.retry_after)
+        if not acquired:
+            return await _prices_from_lease_holder(collection, state, city, cached_data, deadline)
+        if prices:
+            return prices
+        if deadline_expired(deadline):
+            return await _cached_prices_or_timeout(collection, state, city)
+        cached_data = await get_cached_data(collection, state, city)
     if cached_data and "data" in cached_data:
         return cached_data["data"]
-    raise HTTPException(status_code=404, detail=f"Could not find data for {city}, {state}")
\ No newline at end of file
+    raise HTTPException(status_code=404, detail=f"Could not find data for {city}, {state}")
+
+
+async def _scrape_under_lease(
+    collection, state: str, city: str, http_pool=None, deadline: Optional[float] = None
+) -> Tuple[bool, Optional[Dict[str, float]]]:
+    """
+    Scrape and store prices for a location while holding its scrape lease. Returns
+    whether the lease was acquired, and the prices if the scrape succeeded or
+    another worker stored fresh prices just before the lease was taken.
+    """
+    async with scrape_lease(collection, state, city) as leased:
+        if leased is None:
+            return False, None
+        if is_document_fresh(leased) and "data" in leased:
+            # The holder before us already refreshed the city; our earlier read was stale
+            leased = {key: value for key, value in leased.items() if key != "scrape_lease"}
+            city_cache.set((state, city), leased)
+            return True, leased["data"]
+        try:
+            prices = await get_median_sale_prices_data(state, city, http_pool=http_pool, deadline=deadline)
+        except LocationNotFoundError as e:
+            await remember_not_found(collection, state, city, e.reason)
+            return True, None
+        if prices:
+            await update_city_data(collection, state, city, prices)
+        return True, prices
+
+
+async def _prices_from_lease_holder(
+    collection, state: str, city: str, cached_data: Optional[dict], deadline: Optional[float] = None
+) -> Dict[str, float]:
+    """
+    Answer a request while another worker holds the scrape lease of the location:
+    serve the stored prices however old they are, or wait for the holder to store
+    new ones. Raises a 503 if it is still scraping when the wait is over.
+    """
+    if cached_data and "data" in cached_data:
+        return cached_data["data"]
+    cached_data = await wait_for_scrape_lease(collection, state, city, deadline)
+    if cached_data and ("data" in cached_data or is_negatively_cached(cached_data)):
+        city_cache.set((state, city), cached_data)
+    if is_negatively_cached(cached_data):
+        raise HTTPException(status_code=404, detail=f"Could not find data for {city}, {state}")
+    if cached_data and "data" in cached_data:
+        return cached_data["data"]
+    if deadline_expired(deadline):
+        raise HTTPException(status_code=504, detail=f"Timed out fetching data for {city}, {state}")
+    if lease_active(cached_data):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Data for {city}, {state} is being fetched, try again shortly",
+            headers={"Retry-After": str(max(int(SCRAPE_LEASE_POLL_SECONDS), 1))},
+        )
+    raise HTTPException(status_code=404, detail=f"Could not find data for {city}, {state}")
+
+
+def _batch_item(state: str, city: str, status: str, **fields) -> dict:
+    """Build one per-city result line for a batch lookup."""
+    return {"state": state, "city": city, "status": status, **fields}
+
+
+async def _scrape_batch_item(
+    collection, state: str, city: str, semaphore: asyncio.Semaphore, http_pool=None
+) -> dict:
+    """Scrape one city for a batch lookup, converting failures into an error item."""
+    async with semaphore:
+        try:
+            prices = await fetch_and_cache_prices(collection, state, city, http_pool=http_pool)
+            return _batch_item(state, city, "ok", source="scrape", data=prices)
+        except HTTPException as e:
+            return _batch_item(state, city, "error", status_code=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.exception("Batch scrape failed for %s, %s: %s", city, state, e)
+            return _batch_item(state, city, "error", status_code=500, error="Internal error")
+
+
+async def stream_batch_prices(
+    collection, locations: List[Tuple[str, str]], http_pool=None
+) -> AsyncIterator[dict]:
+    """
+    Yield a result for every location as soon as it is available.
+    Fresh cached cities are answered first from a single lookup; the rest are scraped
+    concurrently, at most BATCH_SCRAPE_CONCURRENCY at a time, in completion order.
+    """
+    locations = list(dict.fromkeys(locations))
+    cached = await get_cached_data_many(collection, locations)
+
+    misses = []
+    for state, city in locations:
+        cached_data = cached.get((state, city))
+        if is_document_fresh(cached_data) and "data" in cached_data:
+            CACHE_LOOKUPS.inc(result="hit")
+            yield _batch_item(state, city, "ok", source="cache", data=cached_data["data"])
+        elif cached_data and "data" in cached_data and STALE_WHILE_REVALIDATE:
+            CACHE_LOOKUPS.inc(result="stale")
+            schedule_background_refresh(collection, state, city, http_pool=http_pool)
+            yield _batch_item(state, city, "ok", source="stale", data=cached_data["data"])
+        else:
+            record_cache_miss(state, city, cached_data)
+            misses.append((state, city))
+
+    if not misses:
+        return
+
+    semaphore = asyncio.Semaphore(BATCH_SCRAPE_CONCURRENCY)
+    tasks = [
+        asyncio.ensure_future(_scrape_batch_item(collection, state, city, semaphore, http_pool))
+        for state, city in misses
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+EXPORT_CSV_COLUMNS = ["state", "city", "last_updated", "month", "median_sale_price"]
+
+
+def _csv_line(row: list) -> str:
+    """Format a single CSV row."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+async def stream_export(
+    collection,
+    export_format: str = "ndjson",
+    state: Optional[str] = None,
+    updated_since: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """
+    Stream every cached city as NDJSON (one document per line) or CSV (one row per
+    city and month) using a server-side cursor, so the dataset is never held in memory.
+    Filtering by state uses the (state, city) index.
+    """
+    query = {"data": {"$exists": True}}
+    if state:
+        query["state"] = state
+    if updated_since:
+        query["last_updated"] = {"$gte": updated_since}
+
+    cursor = collection.find(
+        query,
+        {"_id": 0, "state": 1, "city": 1, "last_updated": 1, "data": 1},
+        batch_size=batch_size,
+    )
+    if state:
+        cursor = cursor.hint([("state", 1), ("city", 1)])
+
+    if export_format == "csv":
+        yield _csv_line(EXPORT_CSV_COLUMNS)
+    async for document in cursor:
+        if export_format == "csv":
+            yield "".join(
+                _csv_line([document["state"], document["city"], document.get("last_updated"), month, price])
+                for month, price in document["data"].items()
+            )
+        else:
+            yield json.dumps(document) + "\n"
@@ -0,0 +1,46 @@
+"""
+In-process request coalescing for the Redfin Median Price API.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key so the underlying work runs once.
+
+    The first caller for a key starts the work in its own task; every caller that
+    arrives while it is still running awaits that same task and receives the same
+    result or the same exception. Cancelling one waiter does not cancel the work
+    for the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Return True if work for the given key is currently running."""
+        return key in self._tasks
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func() for key, or join the call already in flight for that key.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        """Drop a finished task and mark its exception as retrieved."""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self):
+        """Forget all in-flight keys without cancelling their tasks."""
+        self._tasks.clear()
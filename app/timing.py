@@ -0,0 +1,127 @@
+"""
+Per-request timing breakdown for the Redfin Median Price API.
+
+Stage timings recorded while serving a request are observed in the aggregate
+metrics and, for /median-prices, collected for that single request as well.
+They are returned in a Server-Timing header when enabled, and requests slower
+than SLOW_REQUEST_THRESHOLD_MS are written to the slow request log.
+"""
+
+import os
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from dotenv import load_dotenv
+
+from app.metrics import STAGE_SECONDS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Add a Server-Timing header to /median-prices responses
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+# Log /median-prices requests slower than this with their breakdown (0 disables)
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "5000"))
+
+TIMED_PATHS = ("/median-prices",)
+
+
+class RequestTimings:
+    """Time spent in each stage of one request, and the upstream retries it made."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.retries = 0
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing_header(self) -> str:
+        """Format the stages, in the order they ran, as a Server-Timing header value."""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        if self.retries:
+            entries.append(f'retries;desc="{self.retries}"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+# Timings of the request being handled; scrapes started by it inherit the same object
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Record the duration of a stage in the metrics and the current request's timings."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Record the duration of the block as a stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_retry():
+    """Count an upstream retry against the current request."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.retries += 1
+
+
+def log_slow_request(method: str, path: str, query: str, status_code: int, timings: RequestTimings):
+    """Write a request to the slow request log if it exceeded SLOW_REQUEST_THRESHOLD_MS."""
+    duration_ms = timings.elapsed() * 1000
+    if SLOW_REQUEST_THRESHOLD_MS <= 0 or duration_ms < SLOW_REQUEST_THRESHOLD_MS:
+        return
+    logger.warning(
+        "Slow request: %s %s took %.0f ms",
+        method,
+        path,
+        duration_ms,
+        extra={
+            "event": "slow_request",
+            "method": method,
+            "path": path,
+            "query": query,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 1),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.stages.items()},
+            "retries": timings.retries,
+        },
+    )
+
+
+def request_timing_enabled() -> bool:
+    """Whether the request timing middleware needs to be installed at all."""
+    return SERVER_TIMING_ENABLED or SLOW_REQUEST_THRESHOLD_MS > 0
+
+
+async def request_timing_middleware(request, call_next):
+    """Collect the stage timings of timed requests, then add Server-Timing and log slow ones."""
+    if request.url.path not in TIMED_PATHS:
+        return await call_next(request)
+
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        _request_timings.reset(token)
+
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = timings.server_timing_header()
+    log_slow_request(request.method, request.url.path, request.url.query, response.status_code, timings)
+    return response
@@ -1,15 +1,29 @@
 import asyncio
+import logging
 from datetime import datetime, timedelta
+import json
 import re
-from httpx import AsyncClient, Response
-from typing import Dict, List, Optional
-from urllib.parse import quote
+from httpx import AsyncClient, Limits, Response, TimeoutException
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
 import uuid
 import random
 import string
 
 from parsel import Selector
 
+from app.metrics import UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+from app.circuit_breaker import get_circuit_breaker, is_failure_status
+from app.deadline import deadline_expired, fits_before, time_remaining
+from app.logging_config import RETRY_LOGGER_NAME
+from app.rate_limit import get_rate_limiter
+from app.retry import RetryPolicy, default_retry_policy
+from app.timing import record_retry
+
+logger = logging.getLogger(__name__)
+# Retry messages repeat heavily during upstream trouble, so they go to a sampled logger
+retry_logger = logging.getLogger(RETRY_LOGGER_NAME)
+
 
 def generate_timestamps():
     """
@@ -151,10 +165,18 @@ def get_random_user_agent() -> str:
     return random.choice(USER_AGENTS)
 
 
-async def create_http_client() -> AsyncClient:
+# Timeout of a single HTTP attempt; shortened when a request deadline is closer
+HTTP_TIMEOUT_SECONDS = 30
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete", "head", "options")
+
+
+async def create_http_client(limits: Optional[Limits] = None) -> AsyncClient:
     """
     Create and return an instance of httpx.AsyncClient with custom headers and settings.
+    Each client gets its own identity: a random user agent and a freshly generated cookie.
     """
+    extra = {"limits": limits} if limits is not None else {}
     return AsyncClient(
         headers={
             "User-Agent": get_random_user_agent(),
@@ -166,44 +188,117 @@ async def create_http_client() -> AsyncClient:
         },
         follow_redirects=True,
         http2=True,
-        timeout=30,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        **extra,
     )
 
 
-async def make_request_with_retry(client: AsyncClient, method: str, url: str, **kwargs) -> Optional[Response]:
+async def make_request_with_retry(
+    client: AsyncClient,
+    method: str,
+    url: str,
+    deadline: Optional[float] = None,
+    policy: Optional[RetryPolicy] = None,
+    accept_statuses: Tuple[int, ...] = (),
+    **kwargs,
+) -> Optional[Response]:
     """
-    Make an HTTP request with retry functionality
+    Make an HTTP request, retrying transient failures according to the retry policy.
+    Only retryable statuses and errors are retried, waiting as long as a Retry-After
+    header asks, and only while the process-wide retry budget allows.
+    Every attempt first waits for the shared rate limiter of the target host, and
+    no attempt is made while the host's circuit breaker is open.
+    With a deadline, each attempt's timeout is capped at the time remaining, and
+    rate limiter waits and retries that cannot finish in time are skipped.
+    Responses with a status in accept_statuses are returned to the caller instead
+    of being treated as failures.
     """
-    MAX_RETRIES = 3
-    retry_count = 0
-    
-    while retry_count < MAX_RETRIES:
+    policy = policy or default_retry_policy
+    if method.lower() not in HTTP_METHODS:
+        logger.error("Unsupported HTTP method: %s", method)
+        return None
+    send = getattr(client, method.lower())
+    host = urlparse(url).netloc
+    rate_limiter = get_rate_limiter(host)
+    breaker = get_circuit_breaker(host)
+    policy.record_request()
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if deadline_expired(deadline):
+            retry_logger.warning("Deadline reached before requesting %s", url)
+            return None
+        if breaker is not None and breaker.is_open():
+            retry_logger.warning("Circuit breaker open for %s, not sending request", host)
+            return None
+        if not await rate_limiter.acquire(deadline=deadline):
+            retry_logger.warning("Rate limiter wait for %s would pass the deadline", host)
+            return None
+        if breaker is not None and not breaker.allow_request():
+            retry_logger.warning("Circuit breaker open for %s, not sending request", host)
+            return None
+
+        attempt_kwargs = kwargs
+        remaining = time_remaining(deadline)
+        cut_by_deadline = remaining is not None and remaining < HTTP_TIMEOUT_SECONDS
+        if cut_by_deadline:
+            attempt_kwargs = {**kwargs, "timeout": remaining}
+        response = None
         try:
-            if method.lower() == 'get':
-                response = await client.get(url, **kwargs)
-            elif method.lower() == 'post':
-                response = await client.post(url, **kwargs)
-            else:
-                print(f"Unsupported HTTP method: {method}")
-                return None
-                
-            if response.status_code in [200, 201, 202]:
+            response = await send(url, **attempt_kwargs)
+            UPSTREAM_RESPONSES.inc(status=response.status_code)
+            if breaker is not None:
+                if is_failure_status(response.status_code):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if 200 <= response.status_code < 300 or response.status_code in accept_statuses:
                 return response
-                
-            print(f"Request failed with status {response.status_code}, attempt {retry_count + 1}/{MAX_RETRIES}")
-            
+            if not policy.is_retryable_status(response.status_code):
+                logger.warning("Request to %s failed with status %s, not retrying", url, response.status_code)
+                return None
+
+            retry_logger.warning(
+                "Request failed with status %s, attempt %d/%d", response.status_code, attempt, policy.max_attempts
+            )
+            failure = response.status_code
+
         except Exception as e:
-            print(f"Request error on attempt {retry_count + 1}/{MAX_RETRIES}: {e}")
-        
-        retry_count += 1
-        if retry_count < MAX_RETRIES:
-            # Exponential backoff with jitter
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            print(f"Waiting {wait_time:.2f} seconds before retrying...")
-            await asyncio.sleep(wait_time)
-    
-    print(f"All {MAX_RETRIES} retry attempts failed")
-    return None
+            if cut_by_deadline and isinstance(e, TimeoutException):
+                # The caller's deadline cut the attempt short, which says nothing about Redfin
+                UPSTREAM_RESPONSES.inc(status="deadline")
+                if breaker is not None:
+                    breaker.record_abandoned()
+                retry_logger.warning("Request to %s did not finish before the deadline", url)
+                return None
+            UPSTREAM_RESPONSES.inc(status="error")
+            if breaker is not None:
+                breaker.record_failure()
+            if not policy.is_retryable_exception(e):
+                logger.error("Request to %s failed with %s, not retrying: %s", url, type(e).__name__, e)
+                return None
+            retry_logger.warning("Request error on attempt %d/%d: %s", attempt, policy.max_attempts, e)
+            failure = type(e).__name__
+
+        if attempt >= policy.max_attempts:
+            retry_logger.error("All %d attempts failed for %s", policy.max_attempts, url)
+            return None
+        wait_time = policy.backoff(attempt, response)
+        if wait_time is None:
+            retry_logger.warning("Not retrying %s, the server asked to wait too long", url)
+            return None
+        if not fits_before(deadline, wait_time):
+            retry_logger.warning("Not retrying %s, the deadline is too close", url)
+            return None
+        if not policy.try_spend_retry():
+            retry_logger.warning("Retry budget exhausted, not retrying %s", url)
+            return None
+
+        UPSTREAM_RETRIES.inc(reason=failure)
+        record_retry()
+        retry_logger.info("Waiting %.2f seconds before retrying", wait_time)
+        await asyncio.sleep(wait_time)
 
 
 def build_city_code_params(location: str) -> dict:
@@ -227,47 +322,154 @@ def build_city_code_params(location: str) -> dict:
     }
     
 
+SCRIPT_MARKER = "_tLAB.wait(function()"
+
+
+def find_marked_scripts(html: str, marker: str = SCRIPT_MARKER) -> List[str]:
+    """
+    Extract the contents of every <script> element containing marker by searching
+    the raw HTML for the marker and slicing out its enclosing script, without
+    parsing the rest of the page.
+    """
+    scripts = []
+    position = html.find(marker)
+    while position != -1:
+        script_start = html.rfind("<script", 0, position)
+        if script_start == -1 or html.rfind("</script", script_start, position) != -1:
+            # The marker is not inside a script element
+            position = html.find(marker, position + len(marker))
+            continue
+        body_start = html.find(">", script_start, position)
+        body_end = html.find("</script", position)
+        if body_start == -1 or body_end == -1:
+            break
+        scripts.append(html[body_start + 1:body_end])
+        position = html.find(marker, body_end)
+    return scripts
+
+
+def extract_scripts_with_parsel(html: str, marker: str = SCRIPT_MARKER) -> List[str]:
+    """
+    Extract all script contents containing marker by parsing the whole page with parsel.
+    """
+    selector = Selector(html)
+    return selector.xpath(f'//script[contains(text(), "{marker}")]/text()').getall()
+
+
 def extract_scripts_from_page(html: str) -> List[str]:
     """
     Extract all script contents from an HTML page that contain the specific substring "_tLAB.wait(function()".
+    Uses the fast raw-text search, falling back to a full parsel parse if it finds nothing.
     """
-    selector = Selector(html)
-    return selector.xpath('//script[contains(text(), "_tLAB.wait(function()")]/text()').getall()
+    return find_marked_scripts(html) or extract_scripts_with_parsel(html)
 
 
-def parse_median_prices(scripts: List[str]) -> Dict[str, int]:
+MEDIAN_SALE_LABEL = '{\\"label\\":\\"Median Sale Price\\"'
+AGGREGATE_DATA_KEY = '\\"aggregateData\\":['
+
+
+def parse_price_point(point) -> Optional[Tuple[str, int]]:
     """
-    Parse median sale prices by extracting and decoding JSON-like data embedded within script strings.
+    Convert one aggregateData point into a ("YYYY-MM", price) pair using string slicing.
+    Returns None if the point is malformed.
+    """
+    if not isinstance(point, dict):
+        return None
+    date = point.get("date")
+    value = point.get("value")
+    if not isinstance(date, str) or len(date) < 10 or date[4] != "-" or date[7] != "-":
+        return None
+    month = date[:7]
+    if not (month[:4].isdigit() and month[5:].isdigit()):
+        return None
+    try:
+        price = int(str(value).replace(",", "").split(".")[0])
+    except ValueError:
+        return None
+    return month, price
+
+
+def decode_median_prices(script: str) -> Optional[Dict[str, int]]:
+    """
+    Decode the Median Sale Price aggregateData array from a script by slicing it out
+    once and parsing it as JSON. Malformed points are reported and left out.
+    Returns None if the array cannot be located or decoded.
+    """
+    label = script.find(MEDIAN_SALE_LABEL)
+    if label == -1:
+        return None
+    key = script.find(AGGREGATE_DATA_KEY, label)
+    if key == -1:
+        return None
+    array_start = key + len(AGGREGATE_DATA_KEY) - 1
+    array_end = script.find("]", array_start)
+    if array_end == -1:
+        return None
+
+    try:
+        # The array is JSON escaped inside a JavaScript string literal
+        points = json.loads(json.loads(f'"{script[array_start:array_end + 1]}"'))
+    except ValueError:
+        return None
+
+    median_prices = {}
+    malformed = []
+    for point in points:
+        parsed = parse_price_point(point)
+        if parsed is None:
+            malformed.append(point)
+        else:
+            median_prices[parsed[0]] = parsed[1]
+    if malformed:
+        logger.warning("Skipped %d malformed aggregateData points, first: %r", len(malformed), malformed[0])
+    return median_prices
+
+
+def parse_median_prices_with_regex(script: str) -> Dict[str, int]:
+    """
+    Parse median sale prices from a script by un-escaping it and matching each data point with a regex.
     """
     median_prices = {}
     median_sale_pattern = r'\[\{\\\"label\\\":\\\"Median Sale Price\\\".*?\\\"aggregateData\\\":\[(.*?)\]'
 
-    for script in scripts:
-        median_match = re.search(median_sale_pattern, script)
-        if median_match:
-            try:
-                aggregate_data_str = median_match.group(1)
-                clean_data_str = aggregate_data_str.replace('\\\\', '\\').replace('\\"', '"')
-                data_objects = re.finditer(r'\{.*?"date":"(.*?)".*?"value":"(.*?)".*?\}', clean_data_str)
-
-                for match in data_objects:
-                    date = match.group(1)
-                    value = match.group(2).replace(',', '')
-                    date_str = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m')
-                    if '.' in value:
-                        value = value.split('.')[0]
-                    median_prices[date_str] = int(value)
-
-                if median_prices:
-                    break
-            except Exception as e:
-                print(f"Error processing aggregateData: {e}")
+    median_match = re.search(median_sale_pattern, script)
+    if median_match:
+        try:
+            aggregate_data_str = median_match.group(1)
+            clean_data_str = aggregate_data_str.replace('\\\\', '\\').replace('\\"', '"')
+            data_objects = re.finditer(r'\{.*?"date":"(.*?)".*?"value":"(.*?)".*?\}', clean_data_str)
+
+            for match in data_objects:
+                date = match.group(1)
+                value = match.group(2).replace(',', '')
+                date_str = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m')
+                if '.' in value:
+                    value = value.split('.')[0]
+                median_prices[date_str] = int(value)
+        except Exception as e:
+            logger.warning("Error processing aggregateData: %s", e)
     return median_prices
 
 
+def parse_median_prices(scripts: List[str]) -> Dict[str, int]:
+    """
+    Parse median sale prices by extracting and decoding JSON-like data embedded within script strings.
+    Uses the structured JSON decoder, falling back to the regex parser if it cannot decode a script.
+    """
+    for script in scripts:
+        median_prices = decode_median_prices(script)
+        if median_prices is None:
+            median_prices = parse_median_prices_with_regex(script)
+        if median_prices:
+            return median_prices
+    return {}
+
+
 def filter_last_3_years(data: Dict[str, int]) -> Dict[str, int]:
     """
     Filter a dictionary of date-string keys to keep only entries from the last 3 years.
     """
-    threshold = datetime(datetime.now().year - 3, datetime.now().month, 1)
-    return {k: v for k, v in data.items() if datetime.strptime(k, "%Y-%m") >= threshold}
\ No newline at end of file
+    now = datetime.now()
+    # "YYYY-MM" keys sort chronologically, so they can be compared as strings
+    threshold = f"{now.year - 3:04d}-{now.month:02d}"
+    return {k: v for k, v in data.items() if k >= threshold}
\ No newline at end of file
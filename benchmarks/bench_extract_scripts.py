@@ -0,0 +1,60 @@
+"""
+Compare the fast raw-text script extractor with the full parsel parse.
+
+Usage:
+    python -m benchmarks.bench_extract_scripts [saved_page.html ...]
+
+Without arguments, synthetic housing market pages of several sizes are used.
+Each page is checked to give identical results on both paths before timing.
+"""
+
+import sys
+import time
+import statistics
+from typing import Callable, Dict, List
+
+from app.utils import find_marked_scripts, extract_scripts_with_parsel
+from benchmarks.pages import build_housing_market_page, monthly_prices
+
+
+def time_call(func: Callable, argument, repeat: int = 20) -> float:
+    """Return the median wall time of func(argument) in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(argument)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def load_pages(paths: List[str]) -> Dict[str, str]:
+    """Load saved pages from disk, or build synthetic pages when no paths are given."""
+    if paths:
+        pages = {}
+        for path in paths:
+            with open(path, encoding="utf-8") as page_file:
+                pages[path] = page_file.read()
+        return pages
+    prices = monthly_prices()
+    return {
+        f"synthetic {size_kb} KB": build_housing_market_page(prices, filler_kb=size_kb)
+        for size_kb in (256, 1024, 4096)
+    }
+
+
+def main(paths: List[str]):
+    print(f"{'page':<28}{'size':>10}{'parsel ms':>12}{'fast ms':>10}{'speedup':>10}")
+    for name, html in load_pages(paths).items():
+        if find_marked_scripts(html) != extract_scripts_with_parsel(html):
+            print(f"{name}: fast path and parsel disagree, skipping")
+            continue
+        parsel_ms = time_call(extract_scripts_with_parsel, html)
+        fast_ms = time_call(find_marked_scripts, html)
+        print(
+            f"{name:<28}{len(html) // 1024:>8}KB{parsel_ms:>12.2f}{fast_ms:>10.3f}"
+            f"{parsel_ms / fast_ms:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
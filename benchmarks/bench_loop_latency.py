@@ -0,0 +1,84 @@
+"""
+Measure how much parsing housing market pages stalls the event loop.
+
+Usage:
+    python -m benchmarks.bench_loop_latency [pages]
+
+A ticker coroutine sleeps for 1 ms in a loop and records how late it wakes up
+while pages are parsed through each parse executor mode. Pages are parsed on the
+fast path, and again with upper-case script tags, which forces the parsel fallback.
+"""
+
+import sys
+import time
+import asyncio
+import statistics
+from typing import List
+
+from app.parse_executor import create_parse_executor
+from app.redfin_median_prices_scraper import parse_housing_market_page_timed
+from benchmarks.pages import build_housing_market_page, monthly_prices
+
+TICK_SECONDS = 0.001
+
+
+async def ticker(lags: List[float], stop: asyncio.Event):
+    """Record how late each 1 ms sleep wakes up, in milliseconds."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((loop.time() - started - TICK_SECONDS) * 1000)
+
+
+async def measure(kind: str, html: str, pages: int) -> dict:
+    """Parse the page repeatedly through one executor kind while the ticker runs."""
+    executor = create_parse_executor(kind, workers=2)
+    loop = asyncio.get_running_loop()
+    lags: List[float] = []
+    stop = asyncio.Event()
+    ticker_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    for _ in range(pages):
+        if executor is None:
+            parse_housing_market_page_timed(html)
+            await asyncio.sleep(0)
+        else:
+            await loop.run_in_executor(executor, parse_housing_market_page_timed, html)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker_task
+    if executor is not None:
+        executor.shutdown()
+    lags.sort()
+    return {
+        "kind": kind,
+        "pages_per_second": pages / elapsed,
+        "p99_lag_ms": lags[int(len(lags) * 0.99) - 1],
+        "max_lag_ms": lags[-1],
+        "median_lag_ms": statistics.median(lags),
+    }
+
+
+async def main(pages: int):
+    html = build_housing_market_page(monthly_prices(), filler_kb=1024)
+    variants = {
+        "fast path": html,
+        "parsel fallback": html.replace("<script>", "<SCRIPT>").replace("</script>", "</SCRIPT>"),
+    }
+    for name, page in variants.items():
+        print(f"{name} ({len(page) // 1024} KB page, {pages} pages)")
+        print(f"  {'executor':<10}{'pages/s':>10}{'median lag':>14}{'p99 lag':>12}{'max lag':>12}")
+        for kind in ("none", "thread", "process"):
+            result = await measure(kind, page, pages)
+            print(
+                f"  {kind:<10}{result['pages_per_second']:>10.0f}{result['median_lag_ms']:>12.2f}ms"
+                f"{result['p99_lag_ms']:>10.2f}ms{result['max_lag_ms']:>10.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,178 @@
+"""
+In-memory stand-ins used to benchmark the request path without MongoDB or Redfin.
+"""
+
+import copy
+from typing import Dict, List, Optional, Tuple
+
+from httpx import Response
+
+
+_MISSING = object()
+
+
+def _get(document: dict, path: str):
+    """Read a possibly dotted field path, returning _MISSING if it does not exist."""
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _evaluate(document: dict, expression):
+    """Evaluate the aggregation expressions the app uses in pipeline updates."""
+    if expression == "$$REMOVE":
+        return _MISSING
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(document, expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    if "$literal" in expression:
+        return expression["$literal"]
+    if "$cond" in expression:
+        condition, then, otherwise = expression["$cond"]
+        return _evaluate(document, then if _evaluate(document, condition) else otherwise)
+    if "$gt" in expression:
+        left, right = (_evaluate(document, operand) for operand in expression["$gt"])
+        return left is not _MISSING and left is not None and left > right
+    if "$eq" in expression:
+        left, right = (_evaluate(document, operand) for operand in expression["$eq"])
+        return left == right
+    if "$type" in expression:
+        return "missing" if _evaluate(document, expression["$type"]) is _MISSING else "present"
+    if "$max" in expression:
+        values = [_evaluate(document, operand) for operand in expression["$max"]]
+        return max(value for value in values if value is not _MISSING and value is not None)
+    return {key: _evaluate(document, value) for key, value in expression.items()}
+
+
+def _apply_pipeline(document: dict, stages: List[dict]):
+    """Apply a pipeline update made of $set stages, evaluating each against the document."""
+    for stage in stages:
+        values = {field: _evaluate(document, expression) for field, expression in stage["$set"].items()}
+        for field, value in values.items():
+            if value is _MISSING:
+                document.pop(field, None)
+            else:
+                document[field] = copy.deepcopy(value)
+
+
+def _matches(document: dict, query: dict) -> bool:
+    """Match the equality and $or queries the app issues against the city collection."""
+    for key, expected in query.items():
+        if key == "$or":
+            if not any(_matches(document, sub_query) for sub_query in expected):
+                return False
+        elif isinstance(expected, dict):
+            value = document.get(key)
+            if "$exists" in expected and (key in document) != expected["$exists"]:
+                return False
+            if "$gte" in expected and (value is None or value < expected["$gte"]):
+                return False
+            if "$lte" in expected and (value is None or value > expected["$lte"]):
+                return False
+        elif _get(document, key) != expected:
+            return False
+    return True
+
+
+class InMemoryCursor:
+    """Async iterator over a snapshot of matching documents."""
+
+    def __init__(self, documents: List[dict]):
+        self._documents = documents
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, *args, **kwargs):
+        return self
+
+    def hint(self, *args, **kwargs):
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self._documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class InMemoryCollection:
+    """A dict-backed stand-in for the Motor city collection, keyed by (state, city)."""
+
+    def __init__(self):
+        self.documents: Dict[Tuple[str, str], dict] = {}
+        self.reads = 0
+        self.writes = 0
+
+    async def find_one(self, query: dict, *args, **kwargs) -> Optional[dict]:
+        self.reads += 1
+        for document in self.documents.values():
+            if _matches(document, query):
+                return copy.deepcopy(document)
+        return None
+
+    def find(self, query: Optional[dict] = None, *args, **kwargs) -> InMemoryCursor:
+        self.reads += 1
+        return InMemoryCursor([
+            copy.deepcopy(document) for document in self.documents.values() if _matches(document, query or {})
+        ])
+
+    async def update_one(self, query: dict, update, upsert: bool = False, **kwargs):
+        self.writes += 1
+        key = (query["state"], query["city"])
+        document = self.documents.get(key)
+        if document is None or not _matches(document, query):
+            if not upsert or document is not None:
+                return
+            document = {"state": key[0], "city": key[1]}
+            self.documents[key] = document
+        if isinstance(update, list):
+            _apply_pipeline(document, update)
+            return
+        document.update(copy.deepcopy(update.get("$set", {})))
+        for field in update.get("$unset", {}):
+            document.pop(field, None)
+        for field, amount in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + amount
+
+    async def find_one_and_update(self, query: dict, update, upsert: bool = False, **kwargs) -> Optional[dict]:
+        """Apply an update document or a pipeline of $set stages and return the updated document."""
+        if not isinstance(update, list):
+            await self.update_one(query, update, upsert=upsert)
+            return await self.find_one(query)
+        self.writes += 1
+        key = (query["state"], query["city"])
+        document = self.documents.get(key)
+        if document is None:
+            if not upsert:
+                return None
+            document = {"state": key[0], "city": key[1]}
+            self.documents[key] = document
+        _apply_pipeline(document, update)
+        return copy.deepcopy(document)
+
+    async def bulk_write(self, operations, ordered: bool = True):
+        for operation in operations:
+            await self.update_one(operation._filter, operation._doc)
+
+
+class FixtureUpstream:
+    """Answers upstream requests with recorded fixtures and counts the calls made."""
+
+    def __init__(self, autocomplete_text: str, housing_market_html: str):
+        self.autocomplete_text = autocomplete_text
+        self.housing_market_html = housing_market_html
+        self.calls = 0
+
+    async def make_request_with_retry(self, client, method: str, url: str, **kwargs) -> Response:
+        self.calls += 1
+        text = self.housing_market_html if "/housing-market" in url else self.autocomplete_text
+        return Response(200, text=text)
@@ -0,0 +1,121 @@
+"""
+Load generator for the /median-prices endpoint.
+
+Usage:
+    python -m benchmarks.load_generator --base-url http://localhost:8000 \
+        --simulator-url http://localhost:9000 --requests 2000 --concurrency 50
+
+Requests a mix of hot cities (a small fixed set requested over and over) and
+cold cities (a new name every time), then reports throughput, latency
+percentiles, status codes, cache statuses and, when --simulator-url is given,
+how many upstream calls the run caused.
+"""
+
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+
+STATES = ["TX", "CA", "NY", "FL", "WA", "CO", "GA", "IL"]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def pick_city(hot_cities: int, hot_ratio: float) -> tuple:
+    """Pick a hot city with probability hot_ratio, otherwise a never-seen cold city."""
+    if random.random() < hot_ratio:
+        index = random.randrange(hot_cities)
+        return STATES[index % len(STATES)], f"Hotcity{index}"
+    return random.choice(STATES), f"Coldcity{uuid.uuid4().hex[:8]}"
+
+
+async def fetch_upstream_stats(client: httpx.AsyncClient, simulator_url: Optional[str]) -> Counter:
+    if not simulator_url:
+        return Counter()
+    response = await client.get(f"{simulator_url}/_stats")
+    return Counter(response.json())
+
+
+async def run_load(args) -> dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    cache_statuses: Counter = Counter()
+    remaining = args.requests
+
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        upstream_before = await fetch_upstream_stats(client, args.simulator_url)
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                state, city = pick_city(args.hot_cities, args.hot_ratio)
+                started = time.perf_counter()
+                try:
+                    response = await client.get(
+                        f"{args.base_url}/median-prices", params={"state": state, "city": city}
+                    )
+                    statuses[response.status_code] += 1
+                    cache_statuses[response.headers.get("X-Cache-Status", "none")] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        upstream_after = await fetch_upstream_stats(client, args.simulator_url)
+
+    latencies.sort()
+    upstream = upstream_after - upstream_before
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "mean_ms": statistics.mean(latencies) if latencies else 0.0,
+        "statuses": dict(statuses),
+        "cache_statuses": dict(cache_statuses),
+        "upstream_calls": dict(upstream),
+    }
+
+
+def print_report(result: dict):
+    print(f"requests      {result['requests']} in {result['seconds']:.1f}s")
+    print(f"throughput    {result['throughput']:.1f} req/s")
+    print(f"latency       p50 {result['p50_ms']:.1f} ms  p95 {result['p95_ms']:.1f} ms  "
+          f"p99 {result['p99_ms']:.1f} ms  mean {result['mean_ms']:.1f} ms")
+    print(f"status codes  {result['statuses']}")
+    print(f"cache status  {result['cache_statuses']}")
+    if result["upstream_calls"]:
+        print(f"upstream      {result['upstream_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--simulator-url", help="simulator base URL, to report upstream call counts")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--hot-cities", type=int, default=20, help="number of distinct hot cities")
+    parser.add_argument("--hot-ratio", type=float, default=0.9, help="fraction of requests for hot cities")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    print_report(asyncio.run(run_load(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Builders for Redfin-like housing market pages used by the benchmarks.
+
+The pages mimic the structure the scraper relies on: a large HTML document with
+many unrelated scripts and one "_tLAB.wait(function()" script whose escaped JSON
+payload carries the "Median Sale Price" aggregateData series.
+"""
+
+import json
+import random
+from datetime import date
+from typing import Dict, Optional
+
+
+def monthly_prices(
+    months: int = 120, start_price: int = 350_000, seed: int = 7, end: Optional[date] = None
+) -> Dict[str, int]:
+    """Generate a deterministic monthly median price series ending at end (default this month)."""
+    rng = random.Random(seed)
+    today = end or date.today()
+    prices = {}
+    price = start_price
+    for offset in range(months, 0, -1):
+        year, month = divmod(today.year * 12 + today.month - offset, 12)
+        price = int(price * rng.uniform(0.98, 1.025))
+        prices[f"{year}-{month + 1:02d}-01"] = price
+    return prices
+
+
+def build_aggregate_data(prices: Dict[str, int]) -> str:
+    """Build the escaped aggregateData payload as it appears inside the page script."""
+    points = [
+        {"date": day, "value": f"{price:,}", "formattedValue": f"${price // 1000}K"}
+        for day, price in prices.items()
+    ]
+    series = [
+        {"label": "Median Sale Price", "dataType": "price", "aggregateData": points},
+        {"label": "Homes Sold", "dataType": "count", "aggregateData": []},
+    ]
+    # The payload is a JSON document embedded in a JavaScript string literal
+    return json.dumps(json.dumps(series, separators=(",", ":")))[1:-1]
+
+
+def build_housing_market_page(prices: Dict[str, int], filler_kb: int = 1024) -> str:
+    """Build a housing market page of roughly filler_kb kilobytes around the price payload."""
+    filler_script = "<script>window.__analytics = {" + ",".join(
+        f'"k{index}": "{"x" * 40}"' for index in range(20)
+    ) + "};</script>\n"
+    filler_markup = (
+        '<div class="MarketInsights"><span class="label">Median days on market</span>'
+        '<span class="value">42</span><a href="/city/30818/TX/Austin">Austin</a></div>\n'
+    )
+    chunk = filler_script + filler_markup * 10
+    chunks = max(filler_kb * 1024 // len(chunk), 2)
+    head_filler = chunk * (chunks // 2)
+    body_filler = chunk * (chunks - chunks // 2)
+    payload_script = (
+        "<script>_tLAB.wait(function() { root.__reactServerState.InitialContext = "
+        '{"ReactServerAgent.cache":{"dataCache":{"/stingray/api/region/6/30818/trends":'
+        '{"res":{"text":"{}&&{\\"payload\\":{\\"series\\":'
+        + build_aggregate_data(prices)
+        + '}}"}}}}}; });</script>\n'
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Austin Housing Market</title>\n"
+        + head_filler
+        + payload_script
+        + "</head><body>\n"
+        + body_filler
+        + "</body></html>\n"
+    )
+
+
+def build_autocomplete_response(city_code: str, state: str, city: str) -> str:
+    """Build an autocomplete response, including the "{}&&" prefix Redfin sends."""
+    slug = city.replace(" ", "-")
+    payload = {
+        "version": 576,
+        "errorMessage": "Success",
+        "resultCode": 0,
+        "payload": {
+            "sections": [
+                {
+                    "rows": [
+                        {"id": f"2_{city_code}", "type": "2", "name": city,
+                         "subName": f"{city}, {state}, USA", "url": f"/city/{city_code}/{state}/{slug}"},
+                        {"id": "33_1", "type": "33", "name": f"{city} Metro", "url": "/metro/1"},
+                    ]
+                }
+            ]
+        },
+    }
+    return "{}&&" + json.dumps(payload)
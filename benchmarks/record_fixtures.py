@@ -0,0 +1,69 @@
+"""
+Record the upstream responses used by the benchmark suite.
+
+Usage:
+    python -m benchmarks.record_fixtures --synthetic
+    python -m benchmarks.record_fixtures --state TX --city Austin
+
+With --synthetic, deterministic Redfin-like fixtures are written. Otherwise the
+autocomplete response and housing market page for the given city are fetched
+from Redfin once, using CITY_URL and MEDIAN_PRICE_URL from the environment.
+"""
+
+import os
+import re
+import asyncio
+import argparse
+from datetime import date
+
+from app.utils import build_city_code_params, create_http_client
+from benchmarks.pages import build_autocomplete_response, build_housing_market_page, monthly_prices
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+AUTOCOMPLETE_FIXTURE = os.path.join(FIXTURES_DIR, "autocomplete.txt")
+HOUSING_MARKET_FIXTURE = os.path.join(FIXTURES_DIR, "housing_market.html")
+
+
+def write_fixture(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as fixture_file:
+        fixture_file.write(text)
+    print(f"Wrote {path} ({len(text) // 1024} KB)")
+
+
+def record_synthetic():
+    """Write deterministic fixtures shaped like Redfin's responses."""
+    prices = monthly_prices(end=date(2026, 1, 1))
+    write_fixture(AUTOCOMPLETE_FIXTURE, build_autocomplete_response("30818", "TX", "Austin"))
+    write_fixture(HOUSING_MARKET_FIXTURE, build_housing_market_page(prices, filler_kb=1024))
+
+
+async def record_live(state: str, city: str):
+    """Fetch and save the real responses for one city."""
+    client = await create_http_client()
+    try:
+        location = f"{city}, {state}"
+        response = await client.get(os.getenv("CITY_URL"), params=build_city_code_params(location))
+        response.raise_for_status()
+        write_fixture(AUTOCOMPLETE_FIXTURE, response.text)
+
+        match = re.search(r'/city/(\d+)/', response.text)
+        if not match:
+            raise SystemExit(f"No city code found for {location}")
+        url = os.getenv("MEDIAN_PRICE_URL").format(city_code=match.group(1), state=state, city=city)
+        response = await client.get(url)
+        response.raise_for_status()
+        write_fixture(HOUSING_MARKET_FIXTURE, response.text)
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", action="store_true", help="write synthetic fixtures instead of fetching")
+    parser.add_argument("--state", default="TX")
+    parser.add_argument("--city", default="Austin")
+    args = parser.parse_args()
+    if args.synthetic:
+        record_synthetic()
+    else:
+        asyncio.run(record_live(args.state, args.city))
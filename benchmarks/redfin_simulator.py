@@ -0,0 +1,139 @@
+"""
+Local stand-in for the Redfin endpoints the scraper calls, for load testing.
+
+Usage:
+    python -m benchmarks.redfin_simulator --port 9000 --latency-ms 200 --rate-429 0.02
+
+Point the API at it with:
+    CITY_URL=http://localhost:9000/stingray/do/location-autocomplete
+    MEDIAN_PRICE_URL=http://localhost:9000/city/{city_code}/{state}/{city}/housing-market
+
+Autocomplete responses use Redfin's "{}&&" prefixed format and housing market
+pages carry the "_tLAB.wait(function()" price script. Cities whose name starts
+with "Unknown" are not found. GET /_stats returns upstream call counts and
+POST /_stats/reset clears them.
+"""
+
+import asyncio
+import argparse
+import random
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+import uvicorn
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+from benchmarks.pages import build_autocomplete_response, build_housing_market_page, monthly_prices
+
+
+@dataclass
+class SimulatorConfig:
+    latency_ms: float = 100.0
+    latency_jitter_ms: float = 50.0
+    error_rate: float = 0.0
+    rate_403: float = 0.0
+    rate_429: float = 0.0
+    retry_after_seconds: int = 2
+    page_kb: int = 1024
+
+
+def city_code_for(state: str, city: str) -> str:
+    """Derive a stable city code from the location."""
+    return str(zlib.crc32(f"{state}|{city}".lower().encode()) % 90000 + 10000)
+
+
+@lru_cache(maxsize=256)
+def housing_market_page(city_code: str, page_kb: int) -> str:
+    return build_housing_market_page(monthly_prices(seed=int(city_code)), filler_kb=page_kb)
+
+
+def create_simulator(config: SimulatorConfig) -> FastAPI:
+    """Create the simulator app for the given configuration."""
+    app = FastAPI(title="Redfin upstream simulator")
+    app.state.config = config
+    app.state.stats = Counter()
+
+    async def simulate_upstream(request: Request, endpoint: str):
+        """Apply latency and injected failures; returns an error response or None."""
+        stats = app.state.stats
+        stats[f"{endpoint}_requests"] += 1
+        delay = config.latency_ms + random.uniform(-config.latency_jitter_ms, config.latency_jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+
+        roll = random.random()
+        if roll < config.rate_403:
+            stats[f"{endpoint}_403"] += 1
+            return PlainTextResponse("Forbidden", status_code=403)
+        roll -= config.rate_403
+        if roll < config.rate_429:
+            stats[f"{endpoint}_429"] += 1
+            return PlainTextResponse(
+                "Too Many Requests", status_code=429,
+                headers={"Retry-After": str(config.retry_after_seconds)},
+            )
+        roll -= config.rate_429
+        if roll < config.error_rate:
+            stats[f"{endpoint}_500"] += 1
+            return PlainTextResponse("Internal Server Error", status_code=500)
+        return None
+
+    @app.get("/stingray/do/location-autocomplete")
+    async def autocomplete(request: Request, location: str = Query("")):
+        error = await simulate_upstream(request, "autocomplete")
+        if error:
+            return error
+        city, _, state = location.partition(",")
+        city, state = city.strip(), state.strip()
+        if city.lower().startswith("unknown"):
+            return PlainTextResponse('{}&&{"payload":{"sections":[{"rows":[]}]}}')
+        return PlainTextResponse(build_autocomplete_response(city_code_for(state, city), state, city))
+
+    @app.get("/city/{city_code}/{state}/{city}/housing-market")
+    async def housing_market(request: Request, city_code: str, state: str, city: str):
+        error = await simulate_upstream(request, "housing_market")
+        if error:
+            return error
+        return HTMLResponse(housing_market_page(city_code, config.page_kb))
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(app.state.stats)
+
+    @app.post("/_stats/reset")
+    async def reset_stats():
+        app.state.stats.clear()
+        return {}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="mean response latency")
+    parser.add_argument("--latency-jitter-ms", type=float, default=50.0, help="uniform jitter around the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--rate-403", type=float, default=0.0, help="fraction of 403 responses")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--retry-after", type=int, default=2, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--page-kb", type=int, default=1024, help="approximate housing market page size")
+    args = parser.parse_args()
+
+    config = SimulatorConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        rate_403=args.rate_403,
+        rate_429=args.rate_429,
+        retry_after_seconds=args.retry_after,
+        page_kb=args.page_kb,
+    )
+    uvicorn.run(create_simulator(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
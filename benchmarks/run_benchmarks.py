@@ -0,0 +1,193 @@
+"""
+Benchmark suite for the scrape pipeline and the /median-prices request path.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--iterations N] [--output FILE] [--compare FILE]
+
+Uses the recorded upstream responses in benchmarks/fixtures (see
+benchmarks.record_fixtures) and an in-memory stand-in for the MongoDB collection,
+so no network or database is needed. Results are written to
+benchmarks/results/<commit>.json; pass an earlier results file with --compare to
+print the change for each benchmark.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app import services
+from app.http_pool import HTTPClientPool
+from app.routes import router
+from app.utils import (
+    extract_scripts_from_page,
+    filter_last_3_years,
+    generate_dynamic_cookie,
+    parse_median_prices,
+)
+from benchmarks.fakes import FixtureUpstream, InMemoryCollection
+from benchmarks.record_fixtures import AUTOCOMPLETE_FIXTURE, HOUSING_MARKET_FIXTURE
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def summarize(timings_ms: List[float]) -> dict:
+    """Summarize a list of timings in milliseconds."""
+    timings_ms = sorted(timings_ms)
+    return {
+        "iterations": len(timings_ms),
+        "median_ms": round(statistics.median(timings_ms), 4),
+        "p95_ms": round(timings_ms[max(int(len(timings_ms) * 0.95) - 1, 0)], 4),
+        "min_ms": round(timings_ms[0], 4),
+    }
+
+
+def bench_sync(func: Callable, iterations: int) -> dict:
+    """Time a synchronous call."""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+async def bench_async(func: Callable[[int], Awaitable], iterations: int) -> dict:
+    """Time an async call that receives the iteration number."""
+    timings = []
+    for iteration in range(iterations):
+        started = time.perf_counter()
+        await func(iteration)
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def load_fixtures() -> Dict[str, str]:
+    if not (os.path.exists(AUTOCOMPLETE_FIXTURE) and os.path.exists(HOUSING_MARKET_FIXTURE)):
+        raise SystemExit("Fixtures are missing; run python -m benchmarks.record_fixtures --synthetic")
+    with open(AUTOCOMPLETE_FIXTURE, encoding="utf-8") as autocomplete_file, \
+         open(HOUSING_MARKET_FIXTURE, encoding="utf-8") as page_file:
+        return {"autocomplete": autocomplete_file.read(), "housing_market": page_file.read()}
+
+
+def bench_pipeline(fixtures: Dict[str, str], iterations: int) -> Dict[str, dict]:
+    """Time each synchronous stage of the scrape pipeline."""
+    html = fixtures["housing_market"]
+    scripts = extract_scripts_from_page(html)
+    prices = parse_median_prices(scripts)
+    if not prices:
+        raise SystemExit("The housing market fixture contains no median prices")
+    return {
+        "extract_scripts_from_page": bench_sync(lambda: extract_scripts_from_page(html), iterations),
+        "parse_median_prices": bench_sync(lambda: parse_median_prices(scripts), iterations),
+        "filter_last_3_years": bench_sync(lambda: filter_last_3_years(prices), iterations),
+        "generate_dynamic_cookie": bench_sync(generate_dynamic_cookie, iterations),
+    }
+
+
+async def bench_request_path(fixtures: Dict[str, str], iterations: int) -> Dict[str, dict]:
+    """Time /median-prices for cold scrapes, MongoDB hits and L1 cache hits."""
+    collection = InMemoryCollection()
+    upstream = FixtureUpstream(fixtures["autocomplete"], fixtures["housing_market"])
+    http_pool = HTTPClientPool(size=1)
+    await http_pool.start()
+
+    app = FastAPI()
+    app.include_router(router)
+    app.state.mongo_collection = collection
+    app.state.http_pool = http_pool
+
+    await services.update_city_data(collection, "TX", "Austin", {"2025-01": 500000})
+    services.city_cache.clear()
+
+    results = {}
+    with patch("app.redfin_median_prices_scraper.make_request_with_retry", upstream.make_request_with_retry):
+        async with AsyncClient(app=app, base_url="http://benchmark") as client:
+            async def cold_scrape(iteration: int):
+                response = await client.get(f"/median-prices?state=TX&city=Cold{iteration}")
+                assert response.status_code == 200, response.text
+
+            async def mongo_hit(iteration: int):
+                services.city_cache.clear()
+                response = await client.get("/median-prices?state=TX&city=Austin")
+                assert response.headers["X-Cache-Status"] == "hit"
+
+            async def l1_hit(iteration: int):
+                response = await client.get("/median-prices?state=TX&city=Austin")
+                assert response.headers["X-Cache-Status"] == "hit"
+
+            results["request_cold_scrape"] = await bench_async(cold_scrape, iterations)
+            results["request_cold_scrape"]["upstream_calls"] = upstream.calls
+            results["request_mongo_hit"] = await bench_async(mongo_hit, iterations)
+            results["request_l1_hit"] = await bench_async(l1_hit, iterations)
+
+    await http_pool.close()
+    services.city_cache.clear()
+    return results
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: Dict[str, dict], baseline: Dict[str, dict]):
+    print(f"{'benchmark':<28}{'median ms':>12}{'p95 ms':>12}{'change':>10}")
+    for name, result in results.items():
+        change = ""
+        if name in baseline and baseline[name]["median_ms"]:
+            change = f"{(result['median_ms'] / baseline[name]['median_ms'] - 1) * 100:+.1f}%"
+        print(f"{name:<28}{result['median_ms']:>12.4f}{result['p95_ms']:>12.4f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    results = bench_pipeline(fixtures, args.iterations)
+    results.update(asyncio.run(bench_request_path(fixtures, args.iterations)))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    print_results(results, baseline)
+
+    commit = current_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(
+            {
+                "commit": commit,
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "results": results,
+            },
+            output_file,
+            indent=2,
+        )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
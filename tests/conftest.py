@@ -0,0 +1,69 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from app import services
+from app import redfin_median_prices_scraper as scraper
+from app import rate_limit
+from app import circuit_breaker
+from app.retry import default_retry_policy
+from app.metrics import reset_metrics
+from app.parse_executor import shutdown_parse_executor
+
+
+class AsyncCursor:
+    """Minimal stand-in for a Motor cursor supporting sort/limit/hint and async iteration."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, *args, **kwargs):
+        return self
+
+    def hint(self, *args, **kwargs):
+        return self
+
+    def __aiter__(self):
+        self._iter = iter(self.documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def grant_scrape_lease(collection, document=None):
+    """
+    Make a mock city collection hand the scrape lease to every worker that asks for
+    it, returning the given stored document fields along with the lease.
+    """
+    async def find_one_and_update(filter, update, **kwargs):
+        lease = update[0]["$set"]["scrape_lease"]["$cond"][2]["$literal"]
+        return {**filter, **(document or {}), "scrape_lease": lease}
+
+    collection.find_one_and_update = AsyncMock(side_effect=find_one_and_update)
+    return collection
+
+
+def _reset_in_process_state():
+    services.city_cache.clear()
+    services.scrape_flights.clear()
+    services.pending_request_counts.clear()
+    scraper.city_code_cache.clear()
+    rate_limit.rate_limiters.clear()
+    circuit_breaker.circuit_breakers.clear()
+    default_retry_policy.budget.clear()
+    shutdown_parse_executor()
+    reset_metrics()
+
+
+@pytest.fixture(autouse=True)
+def reset_in_process_state():
+    """Clear module-level caches so tests do not leak state into each other."""
+    _reset_in_process_state()
+    yield
+    _reset_in_process_state()
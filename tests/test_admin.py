@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import admin
+from app import profiling
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def admin_enabled():
+    with patch.object(admin, "ADMIN_TOKEN", "secret"), patch.object(profiling, "PROFILING_ENABLED", True):
+        yield
+
+
+def test_admin_routes_hidden_without_token(client):
+    response = client.post("/admin/profile/memory?seconds=0.01", headers={"X-Admin-Token": ""})
+
+    assert response.status_code == 404
+
+
+def test_admin_routes_require_matching_token(client, admin_enabled):
+    assert client.post("/admin/profile/memory?seconds=0.01").status_code == 403
+    assert client.post("/admin/profile/memory?seconds=0.01", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_profiling_disabled(client):
+    with patch.object(admin, "ADMIN_TOKEN", "secret"):
+        response = client.post("/admin/profile/cpu?seconds=0.01", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 404
+
+
+def test_profile_cpu_for_a_time_window(client, admin_enabled):
+    response = client.post("/admin/profile/cpu?seconds=0.01&sort=tottime", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.text.startswith("Profiled 0 requests")
+    assert "function calls" in response.text
+
+
+def test_profile_memory_reports_top_allocations(client, admin_enabled):
+    response = client.post("/admin/profile/memory?seconds=0.01&limit=5", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert len(response.json()["top_allocations"]) <= 5
+
+
+@pytest.mark.asyncio
+async def test_profile_cpu_stops_after_requests():
+    profile = asyncio.ensure_future(profiling.profile_cpu(2, seconds=10))
+    await asyncio.sleep(0)
+
+    # Only one profile may run at a time
+    with pytest.raises(profiling.ProfileInProgressError):
+        await profiling.profile_cpu(1, seconds=10)
+
+    profiling.active_cpu_profile.request_finished()
+    profiling.active_cpu_profile.request_finished()
+    report = await asyncio.wait_for(profile, timeout=1)
+
+    assert report.startswith("Profiled 2 requests")
+    assert profiling.active_cpu_profile is None
@@ -0,0 +1,157 @@
+import time
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import admin
+from app.admission import AdmissionController, ScrapeRejectedError
+from app.metrics import render_metrics
+from app.services import fetch_and_cache_prices
+from tests.conftest import grant_scrape_lease
+
+
+@pytest.mark.asyncio
+async def test_admission_limits_concurrency_in_order():
+    controller = AdmissionController(limit=1, max_queue=5, queue_timeout=1)
+    started = []
+    release = asyncio.Event()
+
+    async def scrape(name):
+        async with controller.admit():
+            started.append(name)
+            await release.wait()
+
+    tasks = [asyncio.ensure_future(scrape(name)) for name in ("a", "b", "c")]
+    await asyncio.sleep(0.01)
+    # One scrape runs while the others wait their turn
+    assert started == ["a"]
+    assert controller.queue_depth == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["a", "b", "c"]
+    assert controller.active == 0
+    assert controller.queue_depth == 0
+    assert 'redfin_scrape_admissions_total{result="admitted"} 3' in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_admission_rejects_when_queue_is_full():
+    controller = AdmissionController(limit=1, max_queue=0, queue_timeout=1)
+    await controller.acquire()
+
+    with pytest.raises(ScrapeRejectedError) as excinfo:
+        await controller.acquire()
+
+    assert excinfo.value.reason == "queue_full"
+    controller.release()
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_times_out_waiting():
+    controller = AdmissionController(limit=1, max_queue=5, queue_timeout=10)
+    await controller.acquire()
+
+    # The deadline shortens the wait below queue_timeout
+    with pytest.raises(ScrapeRejectedError) as excinfo:
+        await controller.acquire(deadline=time.monotonic() + 0.02)
+
+    assert excinfo.value.reason == "timeout"
+    assert controller.queue_depth == 0
+    # The slot is not handed to the scrape that gave up
+    controller.release()
+    assert controller.active == 0
+    assert "redfin_scrape_queue_wait_seconds_count 2" in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    controller = AdmissionController(limit=1, max_queue=5, queue_timeout=10)
+    await controller.acquire()
+    waiter = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0.01)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    controller.release()
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_disabled():
+    controller = AdmissionController(limit=0)
+
+    async with controller.admit():
+        assert controller.active == 0
+
+
+async def full_controller():
+    """A controller with its only slot taken and no room to queue."""
+    controller = AdmissionController(limit=1, max_queue=0, queue_timeout=1)
+    await controller.acquire()
+    return controller
+
+
+@pytest.mark.asyncio
+async def test_rejected_scrape_serves_stale_data_without_taking_the_lease():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value={
+        "state": "TX", "city": "Austin", "last_updated": "2020-01-01", "data": {"2023-01": 1},
+    })
+
+    with patch('app.services.scrape_admission', await full_controller()), \
+         patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock) as mock_scrape:
+        assert await fetch_and_cache_prices(collection, "TX", "Austin") == {"2023-01": 1}
+
+    mock_scrape.assert_not_called()
+    # The city's lease stays free for workers with capacity
+    collection.find_one_and_update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_rejected_scrape_without_data_returns_503():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
+
+    with patch('app.services.scrape_admission', await full_controller()), \
+         patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock):
+        with pytest.raises(HTTPException) as excinfo:
+            await fetch_and_cache_prices(collection, "TX", "Austin")
+
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "5"
+
+
+@pytest.mark.asyncio
+async def test_slot_is_released_before_waiting_on_the_lease_holder():
+    controller = AdmissionController(limit=1, max_queue=0, queue_timeout=1)
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(return_value={
+        "state": "TX", "city": "Austin", "last_updated": "2020-01-01", "data": {"2023-01": 1},
+    })
+    collection.find_one_and_update = AsyncMock(return_value={
+        "scrape_lease": {"owner": "other-worker", "expires_at": datetime.utcnow() + timedelta(seconds=60)},
+    })
+
+    with patch('app.services.scrape_admission', controller):
+        assert await fetch_and_cache_prices(collection, "TX", "Austin") == {"2023-01": 1}
+
+    assert controller.active == 0
+
+
+def test_admin_scrape_admission_endpoint():
+    app = FastAPI()
+    app.include_router(admin.router)
+
+    with patch.object(admin, "ADMIN_TOKEN", "secret"):
+        response = TestClient(app).get("/admin/scrape-admission", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.json()["active"] == 0
+    assert "queue_depth" in response.json()
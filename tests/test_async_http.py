@@ -93,7 +93,7 @@ async def test_make_request_with_retry_all_attempts_fail():
         # Check we got None as all attempts failed
         assert result is None
         
-        # Verify client.get was called 3 times (default MAX_RETRIES)
+        # Verify client.get was called 3 times (default RETRY_MAX_ATTEMPTS)
         assert mock_client.get.call_count == 3
 
 
@@ -103,7 +103,7 @@ async def test_make_request_with_retry_unsupported_method():
     mock_client = AsyncMock(spec=httpx.AsyncClient)
     
     # Call with unsupported method
-    result = await make_request_with_retry(mock_client, 'put', 'https://test.com')
+    result = await make_request_with_retry(mock_client, 'frobnicate', 'https://test.com')
     
     # Check we got None for unsupported method
     assert result is None
@@ -152,4 +152,30 @@ def test_generate_random_hash_randomness():
     # Now let's confirm it produces different values with different seeds
     random.seed(100)
     hash3 = generate_random_hash(length=20)
-    assert hash1 != hash3
\ No newline at end of file
+    assert hash1 != hash3
+
+@pytest.mark.asyncio
+async def test_create_http_client_with_limits():
+    limits = httpx.Limits(max_connections=3, max_keepalive_connections=1, keepalive_expiry=5)
+    client = await create_http_client(limits=limits)
+
+    assert isinstance(client, httpx.AsyncClient)
+
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_make_request_with_retry_acquires_host_rate_limiter():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_response = MagicMock(spec=httpx.Response)
+    mock_response.status_code = 200
+    mock_client.get = AsyncMock(return_value=mock_response)
+
+    limiter = MagicMock()
+    limiter.acquire = AsyncMock()
+
+    with patch('app.utils.get_rate_limiter', return_value=limiter) as mock_get_limiter:
+        await make_request_with_retry(mock_client, 'get', 'https://www.redfin.com/city/1/TX/Austin')
+
+        mock_get_limiter.assert_called_once_with("www.redfin.com")
+        limiter.acquire.assert_called_once()
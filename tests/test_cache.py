@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+from app.cache import TTLCache
+
+
+def test_ttl_cache_get_and_set():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+
+    cache.set(("TX", "Austin"), {"data": 1})
+
+    assert cache.get(("TX", "Austin")) == {"data": 1}
+    assert cache.get(("CA", "Fresno")) is None
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_size=2, ttl_seconds=10)
+
+    with patch('app.cache.time.monotonic', return_value=100.0):
+        cache.set("key", "value")
+
+    with patch('app.cache.time.monotonic', return_value=105.0):
+        assert cache.get("key") == "value"
+
+    with patch('app.cache.time.monotonic', return_value=111.0):
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Touch "a" so "b" becomes the least recently used entry
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_disabled():
+    cache = TTLCache(max_size=0, ttl_seconds=60)
+
+    cache.set("key", "value")
+
+    assert cache.enabled is False
+    assert cache.get("key") is None
+
+
+def test_ttl_cache_delete_and_clear():
+    cache = TTLCache(max_size=5, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.delete("a")
+    assert cache.get("a") is None
+
+    cache.clear()
+    assert len(cache) == 0
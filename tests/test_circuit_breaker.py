@@ -0,0 +1,183 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import admin
+from app import redfin_median_prices_scraper as scraper
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN, get_circuit_breaker
+from app.services import fetch_and_cache_prices
+from app.utils import make_request_with_retry
+from tests.conftest import grant_scrape_lease
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch("app.circuit_breaker.time.monotonic", fake):
+        yield fake
+
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.min_requests):
+        breaker.record_failure()
+
+
+def test_breaker_opens_on_error_rate(clock):
+    breaker = CircuitBreaker("redfin", min_requests=4, error_rate=0.5)
+
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+
+
+def test_breaker_ignores_outcomes_outside_the_window(clock):
+    breaker = CircuitBreaker("redfin", window_seconds=60, min_requests=2, error_rate=0.5)
+
+    breaker.record_failure()
+    clock.now += 61
+    breaker.record_success()
+
+    # The old failure has left the window, so one outcome is not enough to open
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["requests_in_window"] == 1
+
+
+def test_breaker_half_open_probe(clock):
+    breaker = CircuitBreaker("redfin", min_requests=2, open_seconds=30)
+    trip(breaker)
+
+    clock.now += 30
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow_request()
+    assert breaker.is_open()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_abandoned_probe_expires(clock):
+    breaker = CircuitBreaker("redfin", min_requests=2, open_seconds=30)
+    trip(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+
+    # The probe never reported back
+    clock.now += 30
+    assert breaker.allow_request()
+
+
+@pytest.mark.asyncio
+async def test_make_request_with_retry_fails_fast_when_open():
+    breaker = get_circuit_breaker("example.com")
+    trip(breaker)
+    client = MagicMock()
+    client.get = AsyncMock()
+
+    response = await make_request_with_retry(client, "get", "https://example.com/page")
+
+    assert response is None
+    client.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_make_request_with_retry_stops_retrying_once_open():
+    breaker = get_circuit_breaker("example.com")
+    for _ in range(breaker.min_requests - 1):
+        breaker.record_failure()
+    client = MagicMock()
+    client.get = AsyncMock(return_value=MagicMock(status_code=429))
+
+    with patch("app.utils.asyncio.sleep", new_callable=AsyncMock):
+        response = await make_request_with_retry(client, "get", "https://example.com/page")
+
+    # The first 429 opens the breaker, so the remaining attempts are skipped
+    assert response is None
+    assert client.get.call_count == 1
+    assert breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_skips_scrape_while_open():
+    with patch.object(scraper, "median_price_url", "https://www.redfin.com/city/{city_code}"):
+        trip(get_circuit_breaker("www.redfin.com"))
+        collection = AsyncMock()
+
+        with patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock) as mock_scrape:
+            # Cached data is served without scraping
+            collection.find_one = AsyncMock(return_value={"state": "TX", "city": "Austin", "data": {"2023-01": 1}})
+            assert await fetch_and_cache_prices(collection, "TX", "Austin") == {"2023-01": 1}
+
+            # Without cached data the caller is told to come back later
+            collection.find_one = AsyncMock(return_value=None)
+            with pytest.raises(HTTPException) as excinfo:
+                await fetch_and_cache_prices(collection, "TX", "Dallas")
+
+            mock_scrape.assert_not_called()
+
+    assert excinfo.value.status_code == 503
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_scrape_reports_a_breaker_that_opened_mid_scrape():
+    async def failing_request(client, method, url, **kwargs):
+        # Redfin fails the request and the breaker opens
+        trip(get_circuit_breaker("www.redfin.com"))
+        return None
+
+    scraper.remember_city_code("TX", "Austin", "30818")
+    with patch.object(scraper, "median_price_url", "https://www.redfin.com/city/{city_code}"), \
+         patch("app.redfin_median_prices_scraper.make_request_with_retry", side_effect=failing_request):
+        with pytest.raises(CircuitOpenError):
+            await scraper.scrape_median_sale_prices(MagicMock(), "TX", "Austin")
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_answers_503_when_the_breaker_opens_mid_scrape():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
+
+    with patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock,
+               side_effect=CircuitOpenError("www.redfin.com", 12)):
+        with pytest.raises(HTTPException) as excinfo:
+            await fetch_and_cache_prices(collection, "TX", "Austin")
+
+    # Not a 404: the city may well exist
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "12"
+
+
+def test_admin_circuit_breakers_endpoint():
+    trip(get_circuit_breaker("www.redfin.com"))
+    app = FastAPI()
+    app.include_router(admin.router)
+
+    with patch.object(admin, "ADMIN_TOKEN", "secret"):
+        response = TestClient(app).get("/admin/circuit-breakers", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.json()["www.redfin.com"]["state"] == "open"
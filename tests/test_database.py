@@ -1,8 +1,9 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo.errors import OperationFailure
 
-from app.database import connect_to_mongo, close_mongo_connection
+from app.database import connect_to_mongo, connect_jobs_collection, close_mongo_connection, ensure_city_index, migrate_city_index
 
 
 @pytest.mark.asyncio
@@ -26,8 +27,11 @@ async def test_connect_to_mongo_success():
         assert client == mock_client
         assert collection == mock_collection
         
-        # Verify create_index was called
-        mock_collection.create_index.assert_called_once()
+        # Verify the unique city index and the stub TTL index were created
+        unique_index, ttl_index = mock_collection.create_index.call_args_list
+        assert unique_index.kwargs["unique"] is True
+        assert ttl_index.args == ("stub_expires_at",)
+        assert ttl_index.kwargs["expireAfterSeconds"] == 0
 
 
 @pytest.mark.asyncio
@@ -51,4 +55,68 @@ async def test_close_mongo_connection():
     await close_mongo_connection(mock_client)
     
     # Verify close was called
-    mock_client.close.assert_called_once()
\ No newline at end of file
+    mock_client.close.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_connect_jobs_collection():
+    mock_client = MagicMock(spec=AsyncIOMotorClient)
+    mock_jobs = MagicMock(spec=AsyncIOMotorCollection)
+    mock_jobs.create_index = AsyncMock()
+    mock_client.__getitem__.return_value.__getitem__.return_value = mock_jobs
+
+    jobs = await connect_jobs_collection(mock_client)
+
+    assert jobs == mock_jobs
+    assert mock_jobs.create_index.call_count == 3
+
+    # No jobs collection without a MongoDB connection
+    assert await connect_jobs_collection(None) is None
+
+
+@pytest.mark.asyncio
+async def test_ensure_city_index_keeps_non_unique_index_at_startup():
+    collection = MagicMock(spec=AsyncIOMotorCollection)
+    collection.create_index = AsyncMock(side_effect=OperationFailure("conflict", code=85))
+    collection.drop_index = AsyncMock()
+
+    # Startup leaves the old index alone; the migration is a separate step
+    await ensure_city_index(collection)
+
+    collection.drop_index.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_migrate_city_index_replaces_non_unique_index():
+    collection = MagicMock(spec=AsyncIOMotorCollection)
+    collection.create_index = AsyncMock()
+    collection.drop_index = AsyncMock()
+
+    assert await migrate_city_index(collection) is True
+
+    collection.drop_index.assert_called_once()
+    assert collection.create_index.call_args.kwargs["unique"] is True
+
+
+@pytest.mark.asyncio
+async def test_migrate_city_index_tolerates_a_concurrent_run():
+    collection = MagicMock(spec=AsyncIOMotorCollection)
+    # The other run dropped the old index and created the unique one first
+    collection.drop_index = AsyncMock(side_effect=OperationFailure("index not found", code=27))
+    collection.create_index = AsyncMock(side_effect=OperationFailure("conflict", code=85))
+
+    assert await migrate_city_index(collection) is True
+
+
+@pytest.mark.asyncio
+async def test_migrate_city_index_keeps_non_unique_index_with_duplicates():
+    collection = MagicMock(spec=AsyncIOMotorCollection)
+    collection.create_index = AsyncMock(side_effect=[
+        OperationFailure("duplicate key", code=11000),
+        None,
+    ])
+    collection.drop_index = AsyncMock()
+
+    assert await migrate_city_index(collection) is False
+
+    # Falls back to the plain index rather than leaving the city without one
+    assert "unique" not in collection.create_index.call_args.kwargs
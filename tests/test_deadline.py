@@ -0,0 +1,152 @@
+import time
+import asyncio
+import pytest
+import httpx
+from unittest.mock import patch, AsyncMock, MagicMock
+from fastapi import HTTPException
+
+from app import deadline as deadline_module
+from app.circuit_breaker import CLOSED, get_circuit_breaker
+from app.metrics import UPSTREAM_RESPONSES
+from app.deadline import request_deadline, time_remaining, deadline_expired, fits_before
+from app.rate_limit import TokenBucket
+from app.services import fetch_and_cache_prices
+from app.utils import make_request_with_retry
+from tests.conftest import grant_scrape_lease
+
+
+def test_request_deadline_uses_config_and_header():
+    with patch.object(deadline_module, "REQUEST_TIMEOUT_SECONDS", 30), \
+         patch.object(deadline_module, "REQUEST_TIMEOUT_MAX_SECONDS", 60):
+        assert 29 < time_remaining(request_deadline()) <= 30
+        assert 4 < time_remaining(request_deadline(5)) <= 5
+        # Clients cannot ask for more than the maximum
+        assert time_remaining(request_deadline(600)) <= 60
+        # Nor for less than the minimum
+        assert time_remaining(request_deadline(0.01)) > 1
+
+    with patch.object(deadline_module, "REQUEST_TIMEOUT_SECONDS", 0):
+        assert request_deadline() is None
+
+
+def test_deadline_helpers_without_deadline():
+    assert time_remaining(None) is None
+    assert not deadline_expired(None)
+    assert fits_before(None, 3600)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_refuses_waits_past_the_deadline():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert await bucket.acquire()
+
+    # The next token is a second away, but only 0.1 seconds remain
+    assert not await bucket.acquire(deadline=time.monotonic() + 0.1)
+    # The refused token was handed back, so the wait has not grown
+    assert bucket.reserve() <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_make_request_with_retry_skips_expired_deadline():
+    client = MagicMock()
+    client.get = AsyncMock()
+
+    response = await make_request_with_retry(client, "get", "https://example.com", deadline=time.monotonic() - 1)
+
+    assert response is None
+    client.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_make_request_with_retry_caps_attempt_timeout_and_skips_late_retries():
+    client = MagicMock()
+    client.get = AsyncMock(return_value=MagicMock(status_code=500))
+
+    with patch("app.utils.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        response = await make_request_with_retry(
+            client, "get", "https://example.com", deadline=time.monotonic() + 1
+        )
+
+    # The 2s+ backoff cannot finish in time, so there is no second attempt
+    assert response is None
+    assert client.get.call_count == 1
+    mock_sleep.assert_not_called()
+    assert client.get.call_args.kwargs["timeout"] <= 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_timeouts_do_not_trip_the_circuit_breaker():
+    client = MagicMock()
+    client.get = AsyncMock(side_effect=httpx.ReadTimeout("timed out"))
+
+    for _ in range(20):
+        response = await make_request_with_retry(
+            client, "get", "https://example.com", deadline=time.monotonic() + 0.01
+        )
+        assert response is None
+
+    # Timeouts the caller's own deadline caused are not upstream failures
+    breaker = get_circuit_breaker("example.com")
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["failures_in_window"] == 0
+    assert UPSTREAM_RESPONSES.value(status="error") == 0
+    assert UPSTREAM_RESPONSES.value(status="deadline") >= 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_times_out_with_stale_fallback():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value={"state": "TX", "city": "Austin", "data": {"2023-01": 1}})
+
+    release = asyncio.Event()
+
+    async def slow_scrape(state, city, http_pool=None, deadline=None):
+        await release.wait()
+        return {"2023-01": 2}
+
+    with patch('app.services.get_median_sale_prices_data', side_effect=slow_scrape), \
+         patch('app.services.update_city_data', new_callable=AsyncMock) as mock_update:
+        result = await fetch_and_cache_prices(collection, "TX", "Austin", deadline=time.monotonic() + 0.05)
+
+        assert result == {"2023-01": 1}
+
+        # The scrape is not cancelled and still stores its result
+        release.set()
+        await asyncio.sleep(0.01)
+        mock_update.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_times_out_with_504():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
+
+    release = asyncio.Event()
+
+    async def slow_scrape(state, city, http_pool=None, deadline=None):
+        await release.wait()
+
+    with patch('app.services.get_median_sale_prices_data', side_effect=slow_scrape):
+        with pytest.raises(HTTPException) as excinfo:
+            await fetch_and_cache_prices(collection, "TX", "Austin", deadline=time.monotonic() + 0.05)
+        release.set()
+        await asyncio.sleep(0.01)
+
+    assert excinfo.value.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_gives_up_when_scrape_ran_out_of_time():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
+
+    async def expired_scrape(state, city, http_pool=None, deadline=None):
+        # The pipeline skipped its remaining attempts because the deadline passed
+        await asyncio.sleep(0.02)
+        return None
+
+    with patch('app.services.get_median_sale_prices_data', side_effect=expired_scrape):
+        with pytest.raises(HTTPException) as excinfo:
+            await fetch_and_cache_prices(collection, "TX", "Austin", deadline=time.monotonic() + 0.01)
+
+    assert excinfo.value.status_code == 504
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.http_pool import HTTPClientPool
+
+
+def make_client():
+    client = MagicMock()
+    client.aclose = AsyncMock()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_http_pool_leases_round_robin():
+    clients = [make_client() for _ in range(2)]
+
+    with patch('app.http_pool.create_http_client', new_callable=AsyncMock, side_effect=clients) as mock_create:
+        pool = HTTPClientPool(size=2, rotate_seconds=0)
+        await pool.start()
+
+        leased = []
+        for _ in range(4):
+            async with pool.lease() as client:
+                leased.append(client)
+
+        # Clients are reused instead of being created per scrape
+        assert leased == [clients[0], clients[1], clients[0], clients[1]]
+        assert mock_create.call_count == 2
+        limits = mock_create.call_args.kwargs["limits"]
+        assert limits.max_connections == pool.limits.max_connections
+
+        await pool.close()
+        for client in clients:
+            client.aclose.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_http_pool_rotates_old_identities():
+    old_client, new_client = make_client(), make_client()
+
+    with patch('app.http_pool.create_http_client', new_callable=AsyncMock,
+               side_effect=[old_client, new_client]), \
+         patch('app.http_pool.time.monotonic', return_value=0.0):
+        pool = HTTPClientPool(size=1, rotate_seconds=60)
+        await pool.start()
+
+    with patch('app.http_pool.time.monotonic', return_value=10.0):
+        async with pool.lease() as client:
+            assert client is old_client
+
+    with patch('app.http_pool.create_http_client', new_callable=AsyncMock, return_value=new_client), \
+         patch('app.http_pool.time.monotonic', return_value=61.0):
+        async with pool.lease() as client:
+            # The expired identity is replaced and closed
+            assert client is new_client
+            old_client.aclose.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_http_pool_closes_retired_client_after_last_lease():
+    old_client, new_client = make_client(), make_client()
+
+    with patch('app.http_pool.create_http_client', new_callable=AsyncMock, return_value=old_client), \
+         patch('app.http_pool.time.monotonic', return_value=0.0):
+        pool = HTTPClientPool(size=1, rotate_seconds=60)
+        await pool.start()
+
+    with patch('app.http_pool.create_http_client', new_callable=AsyncMock, return_value=new_client):
+        with patch('app.http_pool.time.monotonic', return_value=0.0):
+            lease = pool.lease()
+            client = await lease.__aenter__()
+            assert client is old_client
+
+        with patch('app.http_pool.time.monotonic', return_value=61.0):
+            async with pool.lease() as client:
+                assert client is new_client
+                # Still in use by the first scrape
+                old_client.aclose.assert_not_called()
+
+        await lease.__aexit__(None, None, None)
+        old_client.aclose.assert_called_once()
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi import HTTPException
+
+from app import jobs as jobs_module
+from app.jobs import (
+    enqueue_scrape_job,
+    claim_next_job,
+    run_job,
+    job_worker,
+    job_response,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JOB_FAILED,
+)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_scrape_job_reuses_pending_job():
+    jobs = AsyncMock()
+    job = {"_id": "abc", "state": "TX", "city": "Austin", "status": JOB_QUEUED}
+    jobs.find_one_and_update = AsyncMock(return_value=job)
+
+    result = await enqueue_scrape_job(jobs, "TX", "Austin")
+
+    assert result == job
+    query, update = jobs.find_one_and_update.call_args[0]
+    # Only one pending job per location
+    assert query["status"] == {"$in": [JOB_QUEUED, JOB_RUNNING]}
+    assert update["$setOnInsert"]["status"] == JOB_QUEUED
+    assert jobs.find_one_and_update.call_args.kwargs["upsert"] is True
+
+
+@pytest.mark.asyncio
+async def test_claim_next_job_reclaims_expired_leases():
+    jobs = AsyncMock()
+    jobs.find_one_and_update = AsyncMock(return_value=None)
+
+    assert await claim_next_job(jobs, "worker-1") is None
+
+    query, update = jobs.find_one_and_update.call_args[0]
+    assert any(condition["status"] == JOB_QUEUED for condition in query["$or"])
+    assert any("lease_expires_at" in condition for condition in query["$or"])
+    assert update["$set"]["worker_id"] == "worker-1"
+    assert update["$inc"] == {"attempts": 1}
+
+
+@pytest.mark.asyncio
+async def test_run_job_success():
+    jobs = AsyncMock()
+    collection = AsyncMock()
+    job = {"_id": "abc", "state": "TX", "city": "Austin", "attempts": 1}
+
+    with patch('app.jobs.fetch_and_cache_prices', new_callable=AsyncMock,
+               return_value={"2023-01": 500000}):
+        await run_job(jobs, collection, job)
+
+    update = jobs.update_one.call_args[0][1]
+    assert update["$set"]["status"] == JOB_SUCCEEDED
+    assert update["$set"]["data"] == {"2023-01": 500000}
+
+
+@pytest.mark.asyncio
+async def test_run_job_not_found():
+    jobs = AsyncMock()
+    collection = AsyncMock()
+    job = {"_id": "abc", "state": "XX", "city": "Nowhere", "attempts": 1}
+
+    with patch('app.jobs.fetch_and_cache_prices', new_callable=AsyncMock,
+               side_effect=HTTPException(status_code=404, detail="Could not find data")):
+        await run_job(jobs, collection, job)
+
+    update = jobs.update_one.call_args[0][1]
+    assert update["$set"]["status"] == JOB_FAILED
+    assert update["$set"]["status_code"] == 404
+
+
+@pytest.mark.asyncio
+async def test_run_job_requeues_overload_until_max_attempts():
+    jobs = AsyncMock()
+    collection = AsyncMock()
+    job = {"_id": "abc", "state": "TX", "city": "Austin", "attempts": 1}
+    overloaded = HTTPException(status_code=503, detail="Busy", headers={"Retry-After": "5"})
+
+    with patch('app.jobs.fetch_and_cache_prices', new_callable=AsyncMock, side_effect=overloaded):
+        await run_job(jobs, collection, job)
+
+        # Requeued, and not claimable again until Retry-After has passed
+        update = jobs.update_one.call_args[0][1]
+        assert update["$set"]["status"] == JOB_QUEUED
+        assert (update["$set"]["available_at"] - update["$set"]["updated_at"]).total_seconds() == 5
+
+        # Out of attempts, the job fails with the last status
+        await run_job(jobs, collection, {**job, "attempts": jobs_module.JOB_MAX_ATTEMPTS})
+
+    update = jobs.update_one.call_args[0][1]
+    assert update["$set"]["status"] == JOB_FAILED
+    assert update["$set"]["status_code"] == 503
+
+
+@pytest.mark.asyncio
+async def test_run_job_requeues_unexpected_errors():
+    jobs = AsyncMock()
+    collection = AsyncMock()
+    job = {"_id": "abc", "state": "TX", "city": "Austin", "attempts": 1}
+
+    with patch('app.jobs.fetch_and_cache_prices', new_callable=AsyncMock,
+               side_effect=RuntimeError("boom")):
+        await run_job(jobs, collection, job)
+
+    update = jobs.update_one.call_args[0][1]
+    assert update["$set"]["status"] == JOB_QUEUED
+    assert update["$set"]["last_error"] == "boom"
+
+
+@pytest.mark.asyncio
+async def test_job_worker_survives_errors_recording_results():
+    jobs = AsyncMock()
+    job = {"_id": "abc", "state": "TX", "city": "Austin", "attempts": 1}
+    claims = iter([job, job])
+    jobs.find_one_and_update = AsyncMock(side_effect=lambda *args, **kwargs: next(claims, None))
+    # Recording the outcome fails, so run_job itself raises
+    jobs.update_one = AsyncMock(side_effect=Exception("mongo blip"))
+
+    with patch('app.jobs.fetch_and_cache_prices', new_callable=AsyncMock, side_effect=Exception("scrape failed")), \
+         patch.object(jobs_module, "JOB_POLL_INTERVAL_SECONDS", 0.01):
+        worker = asyncio.ensure_future(job_worker(jobs, AsyncMock(), "worker-1"))
+        await asyncio.sleep(0.05)
+
+        # The worker kept claiming jobs after the first one failed
+        assert not worker.done()
+        assert jobs.find_one_and_update.call_count >= 3
+        worker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await worker
+
+
+def test_job_response():
+    job = {
+        "_id": "abc",
+        "state": "TX",
+        "city": "Austin",
+        "status": JOB_SUCCEEDED,
+        "data": {"2023-01": 500000},
+        "worker_id": "host:1:0",
+    }
+
+    assert job_response(job) == {
+        "job_id": "abc",
+        "status": JOB_SUCCEEDED,
+        "state": "TX",
+        "city": "Austin",
+        "data": {"2023-01": 500000},
+    }
@@ -0,0 +1,108 @@
+import io
+import json
+import logging
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import logging_config
+from app.logging_config import (
+    JSONFormatter,
+    RequestIdFilter,
+    SamplingFilter,
+    parse_log_levels,
+    request_id_middleware,
+    request_id_var,
+    setup_logging,
+    shutdown_logging,
+)
+
+
+def make_record(msg="Request failed with status %s", args=(429,), **extra):
+    record = logging.LogRecord("app.upstream_retries", logging.WARNING, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = make_record(request_id="abc123", status_code=429)
+
+    entry = json.loads(JSONFormatter().format(record))
+
+    assert entry["message"] == "Request failed with status 429"
+    assert entry["level"] == "WARNING"
+    assert entry["logger"] == "app.upstream_retries"
+    assert entry["request_id"] == "abc123"
+    assert entry["status_code"] == 429
+
+
+def test_request_id_filter_reads_context():
+    token = request_id_var.set("req-1")
+    try:
+        record = make_record()
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    assert record.request_id == "req-1"
+
+
+def test_sampling_filter_limits_repeats_per_interval():
+    sampling = SamplingFilter(burst=2, interval_seconds=60)
+
+    with patch("app.logging_config.time.monotonic", return_value=100.0):
+        allowed = [sampling.filter(make_record(args=(status,))) for status in (429, 403, 429, 500)]
+    # A different message template has its own allowance
+    assert sampling.filter(make_record(msg="Request error on attempt %d", args=(1,)))
+
+    assert allowed == [True, True, False, False]
+
+    # The next window reports how many records were dropped
+    with patch("app.logging_config.time.monotonic", return_value=161.0):
+        record = make_record()
+        assert sampling.filter(record)
+    assert record.suppressed == 2
+
+
+def test_parse_log_levels():
+    assert parse_log_levels("app.utils=warning, app.jobs=DEBUG,,bad") == {
+        "app.utils": "WARNING",
+        "app.jobs": "DEBUG",
+    }
+
+
+def test_setup_logging_writes_json_lines_from_the_listener_thread():
+    stream = io.StringIO()
+    with patch("app.logging_config.sys.stdout", stream), \
+         patch.object(logging_config, "LOG_LEVELS", "app.test_module=ERROR"):
+        setup_logging()
+        try:
+            logging.getLogger("app.test_logging").info("Scraped %s, %s", "Austin", "TX")
+            logging.getLogger("app.test_module").warning("Filtered out by the module level")
+        finally:
+            shutdown_logging()
+            logging.getLogger("app.test_module").setLevel(logging.NOTSET)
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["message"] == "Scraped Austin, TX"
+
+
+def test_request_id_middleware():
+    app = FastAPI()
+    app.middleware("http")(request_id_middleware)
+
+    @app.get("/request-id")
+    async def current_request_id():
+        return {"request_id": request_id_var.get()}
+
+    client = TestClient(app)
+
+    # A caller-supplied ID is kept and echoed back
+    response = client.get("/request-id", headers={"X-Request-ID": "given-id"})
+    assert response.json() == {"request_id": "given-id"}
+    assert response.headers["X-Request-ID"] == "given-id"
+
+    generated = client.get("/request-id")
+    assert generated.json()["request_id"] == generated.headers["X-Request-ID"]
@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.metrics import Counter, Gauge, Histogram, REGISTRY, render_metrics, STAGE_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+from app.utils import make_request_with_retry
+
+
+@pytest.fixture
+def registered():
+    """Remove metrics created by a test from the registry afterwards."""
+    before = list(REGISTRY)
+    yield
+    REGISTRY[:] = before
+
+
+def test_counter_renders_labelled_samples(registered):
+    counter = Counter("test_requests_total", "Requests.", ["result"])
+    counter.inc(result="hit")
+    counter.inc(2, result="hit")
+    counter.inc(result="miss")
+
+    rendered = counter.render()
+    assert "# TYPE test_requests_total counter" in rendered
+    assert 'test_requests_total{result="hit"} 3' in rendered
+    assert 'test_requests_total{result="miss"} 1' in rendered
+
+
+def test_gauge_tracks_in_progress(registered):
+    gauge = Gauge("test_in_flight", "In flight.")
+    assert "test_in_flight 0" in gauge.render()
+    with gauge.track_in_progress():
+        assert gauge.value() == 1
+    assert gauge.value() == 0
+
+
+def test_histogram_buckets_are_cumulative(registered):
+    histogram = Histogram("test_seconds", "Durations.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="parse")
+    histogram.observe(0.5, stage="parse")
+    histogram.observe(5, stage="parse")
+
+    rendered = histogram.render()
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in rendered
+    assert 'test_seconds_bucket{stage="parse",le="1"} 2' in rendered
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 3' in rendered
+    assert 'test_seconds_count{stage="parse"} 3' in rendered
+    assert 'test_seconds_sum{stage="parse"} 5.55' in rendered
+
+
+def test_histogram_time_observes_duration(registered):
+    histogram = Histogram("test_timed_seconds", "Durations.")
+    with histogram.time():
+        pass
+    assert histogram.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_make_request_with_retry_counts_responses_and_retries():
+    failed = MagicMock(status_code=503)
+    succeeded = MagicMock(status_code=200)
+    client = MagicMock()
+    client.get = AsyncMock(side_effect=[failed, succeeded])
+
+    with patch("app.utils.asyncio.sleep", new_callable=AsyncMock):
+        response = await make_request_with_retry(client, "get", "https://example.com")
+
+    assert response is succeeded
+    assert UPSTREAM_RESPONSES.value(status=503) == 1
+    assert UPSTREAM_RESPONSES.value(status=200) == 1
+    assert UPSTREAM_RETRIES.value(reason=503) == 1
+
+
+def test_render_metrics_includes_pipeline_metrics():
+    STAGE_SECONDS.observe(0.01, stage="mongo_read")
+
+    rendered = render_metrics()
+    assert 'redfin_stage_duration_seconds_count{stage="mongo_read"} 1' in rendered
+    assert "# TYPE redfin_cache_lookups_total counter" in rendered
+    assert "redfin_scrapes_in_flight 0" in rendered
@@ -0,0 +1,38 @@
+import pytest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import patch
+
+from app import parse_executor
+from app.parse_executor import create_parse_executor, run_in_parse_executor, shutdown_parse_executor
+from app.redfin_median_prices_scraper import parse_housing_market_page_timed
+
+
+PAGE = r'''
+<html><head>
+<script>_tLAB.wait(function() { x = [{\"label\":\"Median Sale Price\",\"aggregateData\":[{\"date\":\"2023-01-01\",\"value\":\"500,000\"}]}]; });</script>
+</head></html>
+'''
+
+
+def test_create_parse_executor_kinds():
+    thread_executor = create_parse_executor("thread", 1)
+    process_executor = create_parse_executor("process", 1)
+
+    assert isinstance(thread_executor, ThreadPoolExecutor)
+    assert isinstance(process_executor, ProcessPoolExecutor)
+    assert create_parse_executor("none", 1) is None
+
+    thread_executor.shutdown()
+    process_executor.shutdown()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", ["none", "thread", "process"])
+async def test_run_in_parse_executor(kind):
+    with patch('app.parse_executor.create_parse_executor',
+               side_effect=lambda: create_parse_executor(kind, 1)):
+        prices, _, _ = await run_in_parse_executor(parse_housing_market_page_timed, PAGE)
+
+    shutdown_parse_executor()
+    assert prices == {"2023-01": 500000}
+    assert parse_executor._executor is None
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from app.rate_limit import TokenBucket, get_rate_limiter
+
+
+def test_token_bucket_allows_burst_immediately():
+    with patch('app.rate_limit.time.monotonic', return_value=0.0):
+        bucket = TokenBucket(rate=1, burst=2, jitter=0)
+
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        # The third request has to wait for a token to be refilled
+        assert bucket.reserve() == pytest.approx(1.0)
+        # Waiting callers queue up behind each other
+        assert bucket.reserve() == pytest.approx(2.0)
+
+
+def test_token_bucket_refills_over_time():
+    with patch('app.rate_limit.time.monotonic', return_value=0.0):
+        bucket = TokenBucket(rate=2, burst=1, jitter=0)
+        assert bucket.reserve() == 0
+
+    with patch('app.rate_limit.time.monotonic', return_value=0.5):
+        assert bucket.reserve() == 0
+
+
+def test_token_bucket_adds_jitter_only_when_waiting():
+    with patch('app.rate_limit.time.monotonic', return_value=0.0), \
+         patch('app.rate_limit.random.uniform', return_value=0.25):
+        bucket = TokenBucket(rate=1, burst=1, jitter=0.5)
+
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(1.25)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_acquire_sleeps_when_empty():
+    with patch('app.rate_limit.time.monotonic', return_value=0.0), \
+         patch('app.rate_limit.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        bucket = TokenBucket(rate=4, burst=1, jitter=0)
+
+        await bucket.acquire()
+        mock_sleep.assert_not_called()
+
+        await bucket.acquire()
+        mock_sleep.assert_called_once_with(pytest.approx(0.25))
+
+
+def test_get_rate_limiter_shared_per_host():
+    assert get_rate_limiter("www.redfin.com") is get_rate_limiter("www.redfin.com")
+    assert get_rate_limiter("www.redfin.com") is not get_rate_limiter("example.com")
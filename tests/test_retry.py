@@ -0,0 +1,148 @@
+import pytest
+import httpx
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.retry import RetryBudget, RetryPolicy, parse_retry_after, parse_statuses
+from app.utils import make_request_with_retry
+
+
+def make_response(status_code, headers=None):
+    response = MagicMock(spec=httpx.Response)
+    response.status_code = status_code
+    response.headers = httpx.Headers(headers or {})
+    return response
+
+
+def test_parse_statuses():
+    assert parse_statuses("429, 503,") == frozenset({429, 503})
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    assert parse_retry_after("7") == 7.0
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 30
+    # Dates in the past mean retry now, and garbage is ignored
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_prefers_retry_after_within_limit():
+    policy = RetryPolicy(backoff_base=2, backoff_max=30, jitter=0, retry_after_max=60)
+    assert policy.backoff(1) == 2
+    assert policy.backoff(3) == 8
+    assert policy.backoff(10) == 30
+    assert policy.backoff(1, make_response(429, {"Retry-After": "12"})) == 12
+    # Asking for longer than retry_after_max gives up instead of waiting
+    assert policy.backoff(1, make_response(429, {"Retry-After": "120"})) is None
+
+
+def test_retry_budget_limits_retries_to_a_share_of_requests():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, window_seconds=10)
+    for _ in range(4):
+        budget.record_request()
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+
+def test_retry_budget_forgets_old_requests_without_retries():
+    budget = RetryBudget(ratio=0.2, min_per_second=0, window_seconds=10)
+    with patch("app.retry.time.monotonic", side_effect=[float(second) for second in range(100)]):
+        for _ in range(100):
+            budget.record_request()
+
+    # Only the requests within the window are kept, even though nothing was retried
+    assert len(budget._requests) <= 11
+
+
+@pytest.mark.asyncio
+async def test_retry_waits_for_retry_after():
+    # Create mock client that is rate limited once
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    success_response = make_response(200)
+    mock_client.get = AsyncMock(side_effect=[make_response(429, {"Retry-After": "9"}), success_response])
+
+    with patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        result = await make_request_with_retry(mock_client, 'get', 'https://test.com')
+
+    assert result == success_response
+    # The wait asked for by the server replaces the exponential backoff
+    waits = [call.args[0] for call in mock_sleep.await_args_list]
+    assert 9 in waits
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_status_is_not_retried():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.get = AsyncMock(return_value=make_response(404))
+
+    with patch('asyncio.sleep', new_callable=AsyncMock):
+        result = await make_request_with_retry(mock_client, 'get', 'https://test.com')
+
+    assert result is None
+    assert mock_client.get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_exception_is_not_retried():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.get = AsyncMock(side_effect=ValueError("bad request"))
+
+    with patch('asyncio.sleep', new_callable=AsyncMock):
+        result = await make_request_with_retry(mock_client, 'get', 'https://test.com')
+
+    assert result is None
+    assert mock_client.get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_stops_retries():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.get = AsyncMock(return_value=make_response(503))
+    policy = RetryPolicy(max_attempts=5, budget=RetryBudget(ratio=0, min_per_second=0))
+
+    with patch('asyncio.sleep', new_callable=AsyncMock):
+        result = await make_request_with_retry(mock_client, 'get', 'https://test.com', policy=policy)
+
+    assert result is None
+    assert mock_client.get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_too_long_gives_up():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.get = AsyncMock(return_value=make_response(503, {"Retry-After": "3600"}))
+
+    with patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        result = await make_request_with_retry(mock_client, 'get', 'https://test.com')
+
+    assert result is None
+    assert mock_client.get.call_count == 1
+    mock_sleep.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_other_http_methods_are_supported():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    success_response = make_response(204)
+    mock_client.put = AsyncMock(return_value=success_response)
+
+    result = await make_request_with_retry(mock_client, 'PUT', 'https://test.com', json={"a": 1})
+
+    assert result == success_response
+    mock_client.put.assert_called_once_with('https://test.com', json={"a": 1})
+
+
+@pytest.mark.asyncio
+async def test_accepted_statuses_are_returned():
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    not_found = make_response(404)
+    mock_client.get = AsyncMock(return_value=not_found)
+
+    result = await make_request_with_retry(mock_client, 'get', 'https://test.com', accept_statuses=(404,))
+
+    assert result == not_found
+    assert mock_client.get.call_count == 1
@@ -1,10 +1,13 @@
 import pytest
+import json
+from datetime import datetime, timedelta
 from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 
 from app.routes import router
 from app.models import APIInfo
+from app.metrics import CACHE_LOOKUPS
 
 
 @pytest.fixture
@@ -83,4 +86,173 @@ def test_get_median_prices_validation(client):
     
     # Test with invalid state (too long)
     response = client.get("/median-prices?state=Texas&city=Austin")
-    assert response.status_code == 422 
\ No newline at end of file
+    assert response.status_code == 422 
+
+def test_get_median_prices_stale_while_revalidate(client):
+    stale_doc = {
+        "state": "TX",
+        "city": "Austin",
+        "last_updated": "2023-01-01",
+        "data": {"2023-01": 500000},
+    }
+
+    with patch('app.services.STALE_WHILE_REVALIDATE', True), \
+         patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value=None), \
+         patch('app.routes.get_stale_cached_data', new_callable=AsyncMock, return_value=stale_doc), \
+         patch('app.routes.refresh_city_prices', new_callable=AsyncMock) as mock_refresh, \
+         patch('app.routes.fetch_and_cache_prices', new_callable=AsyncMock) as mock_fetch:
+
+        response = client.get("/median-prices?state=TX&city=Austin")
+
+        # Stale data is served immediately with a staleness indicator
+        assert response.status_code == 200
+        assert response.json() == stale_doc["data"]
+        assert response.headers["X-Cache-Status"] == "stale"
+        assert response.headers["X-Last-Updated"] == "2023-01-01"
+
+        # The refresh is scheduled in the background instead of blocking the caller
+        mock_refresh.assert_called_once()
+        mock_fetch.assert_not_called()
+
+
+def test_get_median_prices_stale_while_revalidate_disabled(client):
+    test_prices = {"2023-01": 510000}
+
+    with patch('app.services.STALE_WHILE_REVALIDATE', False), \
+         patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value=None), \
+         patch('app.routes.get_stale_cached_data', new_callable=AsyncMock) as mock_stale, \
+         patch('app.routes.fetch_and_cache_prices', new_callable=AsyncMock, return_value=test_prices):
+
+        response = client.get("/median-prices?state=TX&city=Austin")
+
+        assert response.status_code == 200
+        assert response.json() == test_prices
+        assert response.headers["X-Cache-Status"] == "miss"
+        mock_stale.assert_not_called()
+
+
+def test_get_median_prices_batch_streams_ndjson(client):
+    async def fake_stream(collection, locations, http_pool=None):
+        for state, city in locations:
+            yield {"state": state, "city": city, "status": "ok", "source": "cache", "data": {"2023-01": 1}}
+
+    with patch('app.routes.stream_batch_prices', side_effect=fake_stream):
+        response = client.post(
+            "/median-prices/batch",
+            json={"cities": [{"state": "tx", "city": "austin"}, {"state": "CA", "city": "fresno"}]}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        # Locations are standardized before lookup
+        assert [(line["state"], line["city"]) for line in lines] == [("TX", "Austin"), ("CA", "Fresno")]
+
+
+def test_get_median_prices_batch_validation(client):
+    response = client.post("/median-prices/batch", json={"cities": []})
+    assert response.status_code == 422
+
+    with patch('app.services.BATCH_MAX_CITIES', 1):
+        response = client.post(
+            "/median-prices/batch",
+            json={"cities": [{"state": "TX", "city": "Austin"}, {"state": "CA", "city": "Fresno"}]}
+        )
+        assert response.status_code == 422
+
+
+def test_get_median_prices_respond_async(test_app, client):
+    test_app.state.jobs_collection = AsyncMock()
+    job = {"_id": "abc123", "state": "TX", "city": "Austin", "status": "queued"}
+
+    with patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value=None), \
+         patch('app.routes.enqueue_scrape_job', new_callable=AsyncMock, return_value=job), \
+         patch('app.routes.fetch_and_cache_prices', new_callable=AsyncMock) as mock_fetch:
+
+        response = client.get(
+            "/median-prices?state=TX&city=Austin", headers={"Prefer": "respond-async"}
+        )
+
+        # The scrape is queued instead of holding the connection open
+        assert response.status_code == 202
+        assert response.headers["Location"] == "/jobs/abc123"
+        assert response.json()["job_id"] == "abc123"
+        assert response.json()["status"] == "queued"
+        mock_fetch.assert_not_called()
+
+
+def test_get_scrape_job(test_app, client):
+    test_app.state.jobs_collection = AsyncMock()
+    job = {"_id": "abc123", "state": "TX", "city": "Austin", "status": "succeeded", "data": {"2023-01": 500000}}
+
+    with patch('app.routes.get_job', new_callable=AsyncMock, return_value=job):
+        response = client.get("/jobs/abc123")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "job_id": "abc123",
+            "status": "succeeded",
+            "state": "TX",
+            "city": "Austin",
+            "data": {"2023-01": 500000},
+        }
+
+    with patch('app.routes.get_job', new_callable=AsyncMock, return_value=None):
+        response = client.get("/jobs/missing")
+        assert response.status_code == 404
+
+
+def test_export_prices(client):
+    async def fake_export(collection, export_format, state, updated_since, batch_size):
+        yield "state,city,last_updated,month,median_sale_price\r\n"
+        yield f"{state},Austin,2024-01-01,2023-01,500000\r\n"
+
+    with patch('app.routes.stream_export', side_effect=fake_export) as mock_export:
+        response = client.get("/export?format=csv&state=tx&updated_since=2024-01-01")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.text.splitlines()[1] == "TX,Austin,2024-01-01,2023-01,500000"
+        assert mock_export.call_args.kwargs["updated_since"] == "2024-01-01"
+
+
+def test_export_prices_validation(client):
+    assert client.get("/export?format=xml").status_code == 422
+    assert client.get("/export?updated_since=yesterday").status_code == 422
+
+
+def test_metrics_endpoint(client):
+    test_prices = {"2023-01": 500000}
+
+    with patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value=test_prices):
+        client.get("/median-prices?state=TX&city=Austin")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'redfin_cache_lookups_total{result="hit"} 1' in response.text
+
+
+def test_negative_lookup_is_counted_once(client, test_app):
+    test_app.state.mongo_collection.find_one = AsyncMock(return_value={
+        "state": "TX", "city": "Nowhere", "not_found_until": datetime.utcnow() + timedelta(hours=1),
+    })
+
+    response = client.get("/median-prices?state=TX&city=Nowhere")
+
+    assert response.status_code == 404
+    assert CACHE_LOOKUPS.value(result="negative") == 1
+    assert CACHE_LOOKUPS.value(result="miss") == 0
+
+
+def test_get_median_prices_request_timeout_header(client):
+    with patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value=None), \
+         patch('app.routes.fetch_and_cache_prices', new_callable=AsyncMock, return_value={"2023-01": 1}) as mock_fetch:
+        response = client.get("/median-prices?state=TX&city=Austin", headers={"X-Request-Timeout": "5"})
+
+        assert response.status_code == 200
+        # The scrape is given the request's deadline
+        assert mock_fetch.call_args.kwargs["deadline"] is not None
+
+        assert client.get("/median-prices?state=TX&city=Austin", headers={"X-Request-Timeout": "0"}).status_code == 422
@@ -0,0 +1,62 @@
+import pytest
+from datetime import datetime
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from app.scheduler import refresh_cutoff_date, find_refresh_candidates, run_refresh_cycle
+from tests.conftest import AsyncCursor
+
+
+def test_refresh_cutoff_date():
+    now = datetime(2024, 1, 10)
+
+    with patch('app.scheduler.CACHE_MAX_AGE_DAYS', 7), \
+         patch('app.scheduler.REFRESH_AHEAD_WINDOW_DAYS', 1):
+        # Data last updated 6 days ago is one day away from going stale
+        assert refresh_cutoff_date(now) == "2024-01-04"
+
+
+@pytest.mark.asyncio
+async def test_find_refresh_candidates_ranks_by_request_count():
+    collection = MagicMock()
+    cursor = AsyncCursor([{"state": "TX", "city": "Austin"}, {"state": "CA", "city": "Fresno"}])
+    cursor.sort = MagicMock(return_value=cursor)
+    collection.find = MagicMock(return_value=cursor)
+
+    candidates = await find_refresh_candidates(collection, limit=5)
+
+    assert candidates == [("TX", "Austin"), ("CA", "Fresno")]
+    query = collection.find.call_args[0][0]
+    assert "$lte" in query["last_updated"]
+    cursor.sort.assert_called_once_with("request_count", -1)
+
+
+@pytest.mark.asyncio
+async def test_run_refresh_cycle_refreshes_candidates():
+    collection = MagicMock()
+
+    with patch('app.scheduler.flush_request_counts', new_callable=AsyncMock) as mock_flush, \
+         patch('app.scheduler.find_refresh_candidates', new_callable=AsyncMock,
+               return_value=[("TX", "Austin"), ("CA", "Fresno")]), \
+         patch('app.scheduler.refresh_city_prices', new_callable=AsyncMock) as mock_refresh, \
+         patch('app.scheduler.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+
+        refreshed = await run_refresh_cycle(collection, interval_seconds=10)
+
+        assert refreshed == 2
+        mock_flush.assert_called_once_with(collection)
+        mock_refresh.assert_any_call(collection, "TX", "Austin", http_pool=None)
+        mock_refresh.assert_any_call(collection, "CA", "Fresno", http_pool=None)
+        # The refreshes are spread evenly over the interval
+        mock_sleep.assert_called_with(5)
+
+
+@pytest.mark.asyncio
+async def test_run_refresh_cycle_nothing_due():
+    collection = MagicMock()
+
+    with patch('app.scheduler.flush_request_counts', new_callable=AsyncMock), \
+         patch('app.scheduler.find_refresh_candidates', new_callable=AsyncMock, return_value=[]), \
+         patch('app.scheduler.refresh_city_prices', new_callable=AsyncMock) as mock_refresh:
+
+        assert await run_refresh_cycle(collection, interval_seconds=10) == 0
+        mock_refresh.assert_not_called()
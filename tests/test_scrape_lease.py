@@ -0,0 +1,179 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from app import scrape_lease as lease_module
+from app.metrics import render_metrics
+from app.scrape_lease import (
+    acquire_scrape_lease,
+    lease_active,
+    release_scrape_lease,
+    scrape_lease,
+    wait_for_scrape_lease,
+)
+from app.services import city_cache, fetch_and_cache_prices
+from tests.conftest import grant_scrape_lease
+
+
+def held_lease(seconds=60):
+    return {"owner": "other-worker", "expires_at": datetime.utcnow() + timedelta(seconds=seconds)}
+
+
+def test_lease_active():
+    assert lease_active({"scrape_lease": held_lease()})
+    # An expired lease no longer blocks other workers
+    assert not lease_active({"scrape_lease": held_lease(-1)})
+    assert not lease_active({"state": "TX", "city": "Austin"})
+    assert not lease_active(None)
+
+
+@pytest.mark.asyncio
+async def test_acquire_scrape_lease():
+    collection = grant_scrape_lease(AsyncMock())
+
+    document = await acquire_scrape_lease(collection, "TX", "Austin")
+
+    assert document["scrape_lease"]["owner"].startswith(lease_module.WORKER_ID)
+    filter, update = collection.find_one_and_update.call_args[0]
+    assert filter == {"state": "TX", "city": "Austin"}
+    # Documents for new cities are created with the lease
+    assert collection.find_one_and_update.call_args.kwargs["upsert"] is True
+    assert 'redfin_scrape_leases_total{result="acquired"} 1' in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_acquire_scrape_lease_held_by_another_worker():
+    collection = AsyncMock()
+    collection.find_one_and_update = AsyncMock(
+        return_value={"state": "TX", "city": "Austin", "scrape_lease": held_lease()}
+    )
+
+    assert await acquire_scrape_lease(collection, "TX", "Austin") is None
+    assert 'redfin_scrape_leases_total{result="held"} 1' in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_acquire_scrape_lease_lost_insert_race():
+    # Another worker created the document for the new city first
+    collection = AsyncMock()
+    collection.find_one_and_update = AsyncMock(side_effect=DuplicateKeyError("E11000 duplicate key"))
+
+    assert await acquire_scrape_lease(collection, "TX", "Austin") is None
+    assert 'redfin_scrape_leases_total{result="held"} 1' in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_release_only_removes_own_lease():
+    collection = AsyncMock()
+
+    await release_scrape_lease(collection, "TX", "Austin", "me")
+
+    filter, update = collection.update_one.call_args[0]
+    assert filter["scrape_lease.owner"] == "me"
+    assert update == {"$unset": {"scrape_lease": ""}}
+
+
+@pytest.mark.asyncio
+async def test_scrape_lease_releases_on_error():
+    collection = grant_scrape_lease(AsyncMock())
+
+    with pytest.raises(RuntimeError):
+        async with scrape_lease(collection, "TX", "Austin") as acquired:
+            assert acquired
+            raise RuntimeError("scrape failed")
+
+    collection.update_one.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_scrape_lease_disabled():
+    collection = AsyncMock()
+
+    with patch.object(lease_module, "SCRAPE_LEASE_ENABLED", False):
+        async with scrape_lease(collection, "TX", "Austin") as acquired:
+            assert acquired
+
+    collection.find_one_and_update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_wait_for_scrape_lease_returns_when_released():
+    collection = AsyncMock()
+    stored = {"state": "TX", "city": "Austin", "data": {"2023-01": 500000}}
+    collection.find_one = AsyncMock(side_effect=[
+        {"state": "TX", "city": "Austin", "scrape_lease": held_lease()},
+        stored,
+    ])
+
+    with patch.object(lease_module, "SCRAPE_LEASE_POLL_SECONDS", 0.01):
+        assert await wait_for_scrape_lease(collection, "TX", "Austin") == stored
+
+    assert collection.find_one.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_lease_on_freshly_refreshed_city_skips_the_scrape():
+    # This worker read the city before another worker refreshed it and released the lease
+    collection = grant_scrape_lease(AsyncMock(), document={
+        "last_updated": datetime.now().strftime("%Y-%m-%d"), "data": {"2023-01": 2},
+    })
+    collection.find_one = AsyncMock(return_value={
+        "state": "TX", "city": "Austin", "last_updated": "2020-01-01", "data": {"2023-01": 1},
+    })
+
+    with patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock) as mock_scrape:
+        assert await fetch_and_cache_prices(collection, "TX", "Austin") == {"2023-01": 2}
+
+    mock_scrape.assert_not_called()
+    # The lease is given back, and the fresh document replaces the stale L1 entry
+    collection.update_one.assert_called_once()
+    assert city_cache.get(("TX", "Austin"))["data"] == {"2023-01": 2}
+    assert "scrape_lease" not in city_cache.get(("TX", "Austin"))
+
+
+@pytest.mark.asyncio
+async def test_held_lease_serves_stale_data_without_scraping():
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(return_value={
+        "state": "TX", "city": "Austin", "last_updated": "2020-01-01", "data": {"2023-01": 1},
+    })
+    collection.find_one_and_update = AsyncMock(return_value={"scrape_lease": held_lease()})
+
+    with patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock) as mock_scrape:
+        assert await fetch_and_cache_prices(collection, "TX", "Austin") == {"2023-01": 1}
+
+    mock_scrape.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_held_lease_waits_for_the_holders_result():
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(side_effect=[
+        None,
+        {"state": "TX", "city": "Austin", "scrape_lease": held_lease()},
+        {"state": "TX", "city": "Austin", "last_updated": "2024-01-01", "data": {"2023-01": 2}},
+    ])
+    collection.find_one_and_update = AsyncMock(return_value={"scrape_lease": held_lease()})
+
+    with patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock) as mock_scrape, \
+         patch.object(lease_module, "SCRAPE_LEASE_POLL_SECONDS", 0.01):
+        assert await fetch_and_cache_prices(collection, "TX", "Austin") == {"2023-01": 2}
+
+    mock_scrape.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_held_lease_still_scraping_returns_503():
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(return_value={"state": "TX", "city": "Austin", "scrape_lease": held_lease()})
+    collection.find_one_and_update = AsyncMock(return_value={"scrape_lease": held_lease()})
+
+    with patch.object(lease_module, "SCRAPE_LEASE_WAIT_SECONDS", 0.02), \
+         patch.object(lease_module, "SCRAPE_LEASE_POLL_SECONDS", 0.01):
+        with pytest.raises(HTTPException) as excinfo:
+            await fetch_and_cache_prices(collection, "TX", "Austin")
+
+    assert excinfo.value.status_code == 503
+    assert "Retry-After" in excinfo.value.headers
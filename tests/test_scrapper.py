@@ -5,8 +5,13 @@ from httpx import Response
 
 from app.redfin_median_prices_scraper import (
     get_city_code,
-    get_median_sale_prices_data
+    get_median_sale_prices_data,
+    remember_city_code,
+    get_known_city_code,
+    CityNotFoundError,
+    MedianDataNotFoundError,
 )
+from app.metrics import SCRAPES_IN_FLIGHT, STAGE_SECONDS
 
 
 @pytest.mark.asyncio
@@ -41,10 +46,9 @@ async def test_get_city_code_no_match():
     with patch('app.redfin_median_prices_scraper.make_request_with_retry', 
                new_callable=AsyncMock, return_value=mock_response):
         
-        city_code = await get_city_code(mock_client, "XX", "Nonexistent")
-        
-        # Check we got None as there's no matching city
-        assert city_code is None
+        # Redfin answered but has no such city
+        with pytest.raises(CityNotFoundError):
+            await get_city_code(mock_client, "XX", "Nonexistent")
 
 
 @pytest.mark.asyncio
@@ -117,6 +121,7 @@ async def test_get_median_sale_prices_data_no_price_data():
             # Mock HTML response with no price data
             mock_html = "<html><body>No price data here</body></html>"
             mock_response = MagicMock(spec=Response)
+            mock_response.status_code = 200
             mock_response.text = mock_html
             
             # Mock the make_request_with_retry function
@@ -127,7 +132,113 @@ async def test_get_median_sale_prices_data_no_price_data():
                 with patch('app.redfin_median_prices_scraper.parse_median_prices', 
                            return_value={}):
                     
-                    prices = await get_median_sale_prices_data("CA", "Los Angeles")
-                    
-                    # Check we got None as no price data was found
-                    assert prices is None
\ No newline at end of file
+                    # The page was fetched but has no price data
+                    with pytest.raises(MedianDataNotFoundError):
+                        await get_median_sale_prices_data("CA", "Los Angeles")
+
+@pytest.mark.asyncio
+async def test_get_median_sale_prices_data_uses_known_city_code():
+    mock_client = AsyncMock()
+    remember_city_code("CA", "Los Angeles", "12345")
+
+    mock_response = MagicMock(spec=Response)
+    mock_response.status_code = 200
+    mock_response.text = "<html></html>"
+
+    with patch('app.redfin_median_prices_scraper.create_http_client',
+               new_callable=AsyncMock, return_value=mock_client), \
+         patch('app.redfin_median_prices_scraper.get_city_code',
+               new_callable=AsyncMock) as mock_get_city_code, \
+         patch('app.redfin_median_prices_scraper.make_request_with_retry',
+               new_callable=AsyncMock, return_value=mock_response) as mock_request, \
+         patch('app.redfin_median_prices_scraper.parse_median_prices',
+               return_value={"2099-01": 500000}), \
+         patch('asyncio.sleep', new_callable=AsyncMock):
+
+        prices = await get_median_sale_prices_data("CA", "Los Angeles")
+
+        # The autocomplete lookup is skipped entirely
+        assert prices == {"2099-01": 500000}
+        mock_get_city_code.assert_not_called()
+        assert "/city/12345/" in mock_request.call_args[0][2]
+        # Every scrape stage after the skipped lookup is timed
+        assert STAGE_SECONDS.count(stage="page_fetch") == 1
+        assert STAGE_SECONDS.count(stage="extract") == 1
+        assert STAGE_SECONDS.count(stage="parse") == 1
+        assert STAGE_SECONDS.count(stage="autocomplete") == 0
+        assert SCRAPES_IN_FLIGHT.value() == 0
+
+
+@pytest.mark.asyncio
+async def test_get_median_sale_prices_data_keeps_city_code_after_failed_fetch():
+    mock_client = AsyncMock()
+
+    with patch('app.redfin_median_prices_scraper.create_http_client',
+               new_callable=AsyncMock, return_value=mock_client), \
+         patch('app.redfin_median_prices_scraper.get_city_code',
+               new_callable=AsyncMock, return_value="12345"), \
+         patch('app.redfin_median_prices_scraper.make_request_with_retry',
+               new_callable=AsyncMock, return_value=None), \
+         patch('asyncio.sleep', new_callable=AsyncMock):
+
+        prices = await get_median_sale_prices_data("CA", "Los Angeles")
+
+        # A failed page fetch says nothing about the code, so it is kept
+        assert prices is None
+        assert get_known_city_code("CA", "Los Angeles") == "12345"
+
+    remember_city_code("CA", "Fresno", "999")
+    assert get_known_city_code("CA", "Fresno") == "999"
+
+
+@pytest.mark.asyncio
+async def test_get_median_sale_prices_data_resolves_outdated_city_code_again():
+    mock_client = AsyncMock()
+    remember_city_code("CA", "Los Angeles", "11111")
+
+    not_found = MagicMock(spec=Response)
+    not_found.status_code = 404
+    found = MagicMock(spec=Response)
+    found.status_code = 200
+    found.text = "<html></html>"
+
+    with patch('app.redfin_median_prices_scraper.create_http_client',
+               new_callable=AsyncMock, return_value=mock_client), \
+         patch('app.redfin_median_prices_scraper.get_city_code',
+               new_callable=AsyncMock, return_value="12345") as mock_get_city_code, \
+         patch('app.redfin_median_prices_scraper.make_request_with_retry',
+               new_callable=AsyncMock, side_effect=[not_found, found]) as mock_request, \
+         patch('app.redfin_median_prices_scraper.parse_median_prices',
+               return_value={"2099-01": 500000}):
+
+        prices = await get_median_sale_prices_data("CA", "Los Angeles")
+
+    # Only a 404 for the page replaces the stored code
+    assert prices == {"2099-01": 500000}
+    mock_get_city_code.assert_called_once()
+    assert "/city/12345/" in mock_request.call_args[0][2]
+    assert mock_request.call_args.kwargs["accept_statuses"] == (404,)
+    assert get_known_city_code("CA", "Los Angeles") == "12345"
+
+
+@pytest.mark.asyncio
+async def test_get_median_sale_prices_data_leases_pooled_client():
+    mock_client = AsyncMock()
+    lease = MagicMock()
+    lease.__aenter__ = AsyncMock(return_value=mock_client)
+    lease.__aexit__ = AsyncMock(return_value=False)
+    http_pool = MagicMock()
+    http_pool.lease = MagicMock(return_value=lease)
+
+    with patch('app.redfin_median_prices_scraper.create_http_client',
+               new_callable=AsyncMock) as mock_create, \
+         patch('app.redfin_median_prices_scraper.get_city_code',
+               new_callable=AsyncMock, return_value=None) as mock_get_city_code:
+
+        prices = await get_median_sale_prices_data("XX", "Nonexistent", http_pool=http_pool)
+
+        # The pooled client is used and left open for the next scrape
+        assert prices is None
+        mock_create.assert_not_called()
+        mock_get_city_code.assert_called_once_with(mock_client, "XX", "Nonexistent", deadline=None)
+        mock_client.aclose.assert_not_called()
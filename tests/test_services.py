@@ -1,14 +1,30 @@
 import pytest
+import asyncio
+import json
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock, AsyncMock
 
+from app import services
 from app.services import (
     standardize_location,
-    is_cache_fresh, 
+    is_cache_fresh,
+    get_cached_data,
+    update_city_data,
+    get_stale_cached_data,
+    refresh_city_prices,
+    record_city_request,
+    flush_request_counts,
+    get_cached_data_many,
+    stream_batch_prices,
+    load_city_codes,
+    stream_export,
     get_fresh_cached_data,
-    fetch_and_cache_prices
+    fetch_and_cache_prices,
+    is_negatively_cached,
 )
 from fastapi import HTTPException
+from app.redfin_median_prices_scraper import remember_city_code, get_known_city_code, CityNotFoundError
+from tests.conftest import AsyncCursor, grant_scrape_lease
 
 
 def test_standardize_location():
@@ -89,7 +105,8 @@ async def test_get_fresh_cached_data_with_no_data():
 
 @pytest.mark.asyncio
 async def test_fetch_and_cache_prices_success():
-    collection = AsyncMock()
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
     
     test_prices = {"2023-01": 500000}
     
@@ -109,11 +126,11 @@ async def test_fetch_and_cache_prices_success():
 
 @pytest.mark.asyncio
 async def test_fetch_and_cache_prices_no_fresh_data_but_cached():
-    collection = AsyncMock()
+    collection = grant_scrape_lease(AsyncMock())
     
     # No fresh data from API
     with patch('app.services.get_median_sale_prices_data', 
-               new_callable=AsyncMock, return_value=None):
+               new_callable=AsyncMock, return_value=None) as mock_scrape:
         # But we have cached data
         cached_data = {
             "state": "TX", 
@@ -127,15 +144,17 @@ async def test_fetch_and_cache_prices_no_fresh_data_but_cached():
         
         # Check result matches our cached data
         assert result == cached_data["data"]
+        # The stale data was only served after a scrape attempt
+        mock_scrape.assert_awaited_once()
 
 
 @pytest.mark.asyncio
 async def test_fetch_and_cache_prices_no_data_at_all():
-    collection = AsyncMock()
+    collection = grant_scrape_lease(AsyncMock())
     
     # No fresh data from API
     with patch('app.services.get_median_sale_prices_data', 
-               new_callable=AsyncMock, return_value=None):
+               new_callable=AsyncMock, return_value=None) as mock_scrape:
         # And no cached data
         collection.find_one = AsyncMock(return_value=None)
         
@@ -145,4 +164,288 @@ async def test_fetch_and_cache_prices_no_data_at_all():
         
         # Check exception details
         assert excinfo.value.status_code == 404
-        assert "Could not find data for Austin, TX" in str(excinfo.value.detail)
\ No newline at end of file
+        assert "Could not find data for Austin, TX" in str(excinfo.value.detail)
+        mock_scrape.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_coalesces_concurrent_scrapes():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
+    test_prices = {"2023-01": 500000}
+
+    async def slow_scrape(state, city, http_pool=None, deadline=None):
+        await asyncio.sleep(0.01)
+        return test_prices
+
+    with patch('app.services.get_median_sale_prices_data',
+               new_callable=AsyncMock, side_effect=slow_scrape) as mock_scrape:
+        with patch('app.services.update_city_data', new_callable=AsyncMock) as mock_update:
+            results = await asyncio.gather(
+                *(fetch_and_cache_prices(collection, "TX", "Austin") for _ in range(5))
+            )
+
+            # Only one scrape and one write for all concurrent callers
+            assert all(result == test_prices for result in results)
+            mock_scrape.assert_called_once_with("TX", "Austin", http_pool=None, deadline=None)
+            mock_update.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_cached_data_served_from_l1_cache():
+    collection = AsyncMock()
+    fresh_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    test_data = {"state": "TX", "city": "Austin", "last_updated": fresh_date, "data": {"2023-01": 500000}}
+    collection.find_one = AsyncMock(return_value=test_data)
+
+    first = await get_cached_data(collection, "TX", "Austin")
+    second = await get_cached_data(collection, "TX", "Austin")
+
+    # Only the first lookup should reach MongoDB
+    assert first == second == test_data
+    collection.find_one.assert_called_once_with({"state": "TX", "city": "Austin"})
+
+
+@pytest.mark.asyncio
+async def test_update_city_data_fills_l1_cache():
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(return_value=None)
+
+    await update_city_data(collection, "TX", "Austin", {"2023-01": 500000})
+    result = await get_fresh_cached_data(collection, "TX", "Austin")
+
+    assert result == {"2023-01": 500000}
+    collection.update_one.assert_called_once()
+    collection.find_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_stale_cached_data_ignores_age():
+    collection = AsyncMock()
+    stale_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+    test_data = {"state": "TX", "city": "Austin", "last_updated": stale_date, "data": {"2023-01": 500000}}
+    collection.find_one = AsyncMock(return_value=test_data)
+
+    result = await get_stale_cached_data(collection, "TX", "Austin")
+
+    assert result == test_data
+
+
+@pytest.mark.asyncio
+async def test_refresh_city_prices_swallows_not_found():
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(return_value=None)
+
+    with patch('app.services.get_median_sale_prices_data',
+               new_callable=AsyncMock, return_value=None):
+        # Must not raise even though no data can be found
+        await refresh_city_prices(collection, "TX", "Austin")
+
+
+@pytest.mark.asyncio
+async def test_flush_request_counts():
+    collection = AsyncMock()
+
+    with patch.object(services, "REFRESH_AHEAD_ENABLED", True):
+        record_city_request("TX", "Austin")
+        record_city_request("TX", "Austin")
+        record_city_request("CA", "Fresno")
+
+    flushed = await flush_request_counts(collection)
+
+    assert flushed == 2
+    operations = collection.bulk_write.call_args[0][0]
+    assert {op._doc["$inc"]["request_count"] for op in operations} == {1, 2}
+
+    # Nothing left to flush afterwards
+    assert await flush_request_counts(collection) == 0
+    collection.bulk_write.assert_called_once()
+
+
+def test_record_city_request_only_while_scheduler_runs():
+    # Without the scheduler nothing would ever flush the counts
+    with patch.object(services, "REFRESH_AHEAD_ENABLED", False):
+        record_city_request("TX", "Austin")
+    assert not services.pending_request_counts
+
+
+def test_record_city_request_buffer_is_bounded():
+    with patch.object(services, "REFRESH_AHEAD_ENABLED", True), \
+         patch.object(services, "REQUEST_COUNT_BUFFER_MAX_SIZE", 2):
+        for city in ["Austin", "Dallas", "Junk1", "Junk2", "Austin"]:
+            record_city_request("TX", city)
+
+    # Cities already buffered are still counted once the buffer is full
+    assert services.pending_request_counts == {("TX", "Austin"): 2, ("TX", "Dallas"): 1}
+
+
+@pytest.mark.asyncio
+async def test_get_cached_data_many_single_query():
+    collection = MagicMock()
+    docs = [
+        {"state": "TX", "city": "Austin", "last_updated": "2023-01-01", "data": {"2023-01": 500000}},
+        {"state": "CA", "city": "Fresno", "last_updated": "2023-01-01", "data": {"2023-01": 300000}},
+    ]
+    collection.find = MagicMock(return_value=AsyncCursor(docs))
+
+    found = await get_cached_data_many(collection, [("TX", "Austin"), ("CA", "Fresno"), ("NY", "Albany")])
+
+    assert set(found) == {("TX", "Austin"), ("CA", "Fresno")}
+    collection.find.assert_called_once()
+    assert len(collection.find.call_args[0][0]["$or"]) == 3
+
+    # A second lookup is served from the L1 cache without querying MongoDB
+    collection.find = MagicMock(return_value=AsyncCursor([]))
+    found = await get_cached_data_many(collection, [("TX", "Austin")])
+    assert ("TX", "Austin") in found
+    collection.find.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stream_batch_prices_mixes_cache_hits_and_scrapes():
+    collection = MagicMock()
+    fresh_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    docs = [{"state": "TX", "city": "Austin", "last_updated": fresh_date, "data": {"2023-01": 500000}}]
+    collection.find = MagicMock(return_value=AsyncCursor(docs))
+
+    async def fake_fetch(collection, state, city, http_pool=None):
+        if city == "Nowhere":
+            raise HTTPException(status_code=404, detail="Could not find data for Nowhere, XX")
+        return {"2023-01": 300000}
+
+    with patch('app.services.fetch_and_cache_prices', new_callable=AsyncMock, side_effect=fake_fetch):
+        items = [
+            item async for item in stream_batch_prices(
+                collection, [("TX", "Austin"), ("CA", "Fresno"), ("XX", "Nowhere"), ("TX", "Austin")]
+            )
+        ]
+
+    by_city = {item["city"]: item for item in items}
+    # Duplicates are answered once
+    assert len(items) == 3
+    assert by_city["Austin"]["status"] == "ok"
+    assert by_city["Austin"]["source"] == "cache"
+    assert by_city["Fresno"]["source"] == "scrape"
+    assert by_city["Fresno"]["data"] == {"2023-01": 300000}
+    assert by_city["Nowhere"]["status"] == "error"
+    assert by_city["Nowhere"]["status_code"] == 404
+
+
+@pytest.mark.asyncio
+async def test_update_city_data_stores_known_city_code():
+    collection = AsyncMock()
+    remember_city_code("TX", "Austin", "30818")
+
+    await update_city_data(collection, "TX", "Austin", {"2023-01": 500000})
+
+    document = collection.update_one.call_args[0][1]["$set"]
+    assert document["city_code"] == "30818"
+
+
+@pytest.mark.asyncio
+async def test_load_city_codes():
+    collection = MagicMock()
+    collection.find = MagicMock(return_value=AsyncCursor([
+        {"state": "TX", "city": "Austin", "city_code": "30818"},
+        {"state": "CA", "city": "Fresno", "city_code": "6904"},
+    ]))
+
+    loaded = await load_city_codes(collection)
+
+    assert loaded == 2
+    assert get_known_city_code("TX", "Austin") == "30818"
+    assert get_known_city_code("CA", "Fresno") == "6904"
+
+
+@pytest.mark.asyncio
+async def test_stream_export_ndjson():
+    collection = MagicMock()
+    docs = [
+        {"state": "TX", "city": "Austin", "last_updated": "2024-01-01", "data": {"2023-01": 500000}},
+        {"state": "TX", "city": "Dallas", "last_updated": "2024-01-02", "data": {"2023-01": 400000}},
+    ]
+    collection.find = MagicMock(return_value=AsyncCursor(docs))
+
+    lines = [line async for line in stream_export(collection, state="TX", updated_since="2024-01-01", batch_size=50)]
+
+    assert [json.loads(line) for line in lines] == docs
+    query, projection = collection.find.call_args[0]
+    assert query["state"] == "TX"
+    assert query["last_updated"] == {"$gte": "2024-01-01"}
+    assert projection["_id"] == 0
+    assert collection.find.call_args.kwargs["batch_size"] == 50
+
+
+@pytest.mark.asyncio
+async def test_stream_export_csv():
+    collection = MagicMock()
+    docs = [{"state": "TX", "city": "Austin", "last_updated": "2024-01-01", "data": {"2023-01": 500000, "2023-02": 510000}}]
+    collection.find = MagicMock(return_value=AsyncCursor(docs))
+
+    output = "".join([line async for line in stream_export(collection, export_format="csv")])
+
+    assert output.splitlines() == [
+        "state,city,last_updated,month,median_sale_price",
+        "TX,Austin,2024-01-01,2023-01,500000",
+        "TX,Austin,2024-01-01,2023-02,510000",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_caches_not_found():
+    collection = grant_scrape_lease(AsyncMock())
+    collection.find_one = AsyncMock(return_value=None)
+
+    with patch('app.services.get_median_sale_prices_data',
+               new_callable=AsyncMock, side_effect=CityNotFoundError("Could not find city code")) as mock_scrape:
+        for _ in range(3):
+            with pytest.raises(HTTPException) as excinfo:
+                await fetch_and_cache_prices(collection, "TX", "Austn")
+            assert excinfo.value.status_code == 404
+
+        # Only the first request reaches Redfin; the outcome is stored in MongoDB
+        mock_scrape.assert_called_once()
+        # The lease release is the other update
+        stores = [call for call in collection.update_one.call_args_list if isinstance(call[0][1], list)]
+        assert len(stores) == 1
+        stored = stores[0][0][1][0]["$set"]
+        assert stored["not_found_reason"] == "city_not_found"
+        assert stored["not_found_until"] > datetime.utcnow()
+        # A document without prices is removed by the TTL index once the entry expires
+        assert stored["stub_expires_at"]["$cond"][1]["$max"][1] == stored["not_found_until"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_and_cache_prices_negative_entry_from_mongo():
+    collection = AsyncMock()
+    collection.find_one = AsyncMock(return_value={
+        "state": "TX",
+        "city": "Austin",
+        "last_updated": "2023-01-01",
+        "data": {"2023-01": 500000},
+        "not_found_reason": "no_median_data",
+        "not_found_until": datetime.utcnow() + timedelta(minutes=5),
+    })
+
+    with patch('app.services.get_median_sale_prices_data', new_callable=AsyncMock) as mock_scrape:
+        result = await fetch_and_cache_prices(collection, "TX", "Austin")
+
+    # Previously stored prices are still served, without scraping
+    assert result == {"2023-01": 500000}
+    mock_scrape.assert_not_called()
+
+
+def test_is_negatively_cached_expires():
+    assert is_negatively_cached({"not_found_until": datetime.utcnow() + timedelta(seconds=60)})
+    assert not is_negatively_cached({"not_found_until": datetime.utcnow() - timedelta(seconds=1)})
+    assert not is_negatively_cached({"data": {}})
+    assert not is_negatively_cached(None)
+
+
+@pytest.mark.asyncio
+async def test_update_city_data_clears_negative_entry():
+    collection = AsyncMock()
+
+    await update_city_data(collection, "TX", "Austin", {"2023-01": 500000})
+
+    update = collection.update_one.call_args[0][1]
+    assert update["$unset"] == {"not_found_reason": "", "not_found_until": "", "stub_expires_at": ""}
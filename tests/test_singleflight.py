@@ -0,0 +1,73 @@
+import pytest
+import asyncio
+
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"2023-01": 500000}
+
+    results = await asyncio.gather(*(flights.run(("TX", "Austin"), work) for _ in range(10)))
+
+    # Only one call should have done the work, and everyone shares its result
+    assert calls == 1
+    assert all(result == {"2023-01": 500000} for result in results)
+    assert not flights.in_flight(("TX", "Austin"))
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_exceptions():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("scrape failed")
+
+    results = await asyncio.gather(
+        *(flights.run("key", work) for _ in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+    # The key is released so the next call runs the work again
+    assert not flights.in_flight("key")
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelled_waiter_does_not_cancel_work():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.ensure_future(flights.run("key", work))
+    second = asyncio.ensure_future(flights.run("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_single_flight_different_keys_run_separately():
+    flights = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        return key
+
+    results = await asyncio.gather(
+        flights.run("a", lambda: work("a")), flights.run("b", lambda: work("b"))
+    )
+
+    assert results == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
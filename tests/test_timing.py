@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import timing
+from app.metrics import STAGE_SECONDS
+from app.routes import router
+from app.timing import RequestTimings, record_stage, stage_timer
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.middleware("http")(timing.request_timing_middleware)
+    app.include_router(router)
+    app.state.mongo_client = MagicMock()
+    app.state.mongo_collection = AsyncMock()
+    return TestClient(app)
+
+
+def test_record_stage_outside_a_request_only_updates_metrics():
+    record_stage("parse", 0.01)
+
+    assert STAGE_SECONDS.count(stage="parse") == 1
+
+
+def test_server_timing_header_lists_stages_in_order():
+    timings = RequestTimings()
+    timings.add("cache_lookup", 0.002)
+    timings.add("page_fetch", 0.25)
+    timings.add("page_fetch", 0.25)
+    timings.retries = 2
+
+    header = timings.server_timing_header()
+
+    assert header.startswith('cache_lookup;dur=2.0, page_fetch;dur=500.0, retries;desc="2", total;dur=')
+
+
+def test_median_prices_server_timing_header(client):
+    async def fetch(*args, **kwargs):
+        with stage_timer("page_fetch"):
+            pass
+        with stage_timer("mongo_upsert"):
+            pass
+        return {"2023-01": 500000}
+
+    with patch.object(timing, "SERVER_TIMING_ENABLED", True), \
+         patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value=None), \
+         patch('app.routes.fetch_and_cache_prices', side_effect=fetch):
+        response = client.get("/median-prices?state=TX&city=Austin")
+
+    assert response.status_code == 200
+    stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert stages == ["cache_lookup", "page_fetch", "mongo_upsert", "total"]
+
+
+def test_server_timing_header_disabled(client):
+    with patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value={"2023-01": 1}):
+        response = client.get("/median-prices?state=TX&city=Austin")
+
+    assert "Server-Timing" not in response.headers
+
+
+def test_slow_request_log(client, caplog):
+    with patch.object(timing, "SLOW_REQUEST_THRESHOLD_MS", 0.000001), \
+         patch('app.routes.get_fresh_cached_data', new_callable=AsyncMock, return_value={"2023-01": 1}):
+        client.get("/median-prices?state=TX&city=Austin")
+
+    # Requests over the threshold are logged with their breakdown
+    entry = next(record for record in caplog.records if getattr(record, "event", None) == "slow_request")
+    assert entry.path == "/median-prices"
+    assert entry.status_code == 200
+    assert "cache_lookup" in entry.stages_ms
+    assert entry.retries == 0
@@ -1,7 +1,5 @@
-import pytest
 import re
 from datetime import datetime
-from unittest.mock import patch, MagicMock
 
 from app.utils import (
     generate_timestamps,
@@ -13,7 +11,11 @@ from app.utils import (
     get_random_user_agent,
     build_city_code_params,
     extract_scripts_from_page,
+    find_marked_scripts,
+    extract_scripts_with_parsel,
     parse_median_prices,
+    decode_median_prices,
+    parse_median_prices_with_regex,
     filter_last_3_years
 )
 
@@ -218,3 +220,76 @@ def test_filter_last_3_years():
     
     # Check values are preserved
     assert filtered[f"{current_year}-01"] == 440000
+
+
+def test_find_marked_scripts_matches_parsel():
+    html = """
+    <html>
+    <head>
+        <script type="text/javascript">some script</script>
+        <p>_tLAB.wait(function() outside of a script</p>
+        <script async>_tLAB.wait(function() { var a = "<b>"; });</script>
+        <script>another script</script>
+        <script>
+            var x = 1; _tLAB.wait(function() { first(); }); _tLAB.wait(function() { second(); });
+        </script>
+    </head>
+    <body>content</body>
+    </html>
+    """
+
+    scripts = find_marked_scripts(html)
+
+    assert scripts == extract_scripts_with_parsel(html)
+    assert len(scripts) == 2
+    assert scripts[0] == '_tLAB.wait(function() { var a = "<b>"; });'
+
+
+def test_extract_scripts_from_page_falls_back_to_parsel():
+    # Upper-case tags are not handled by the fast path
+    html = "<html><head><SCRIPT>_tLAB.wait(function() { run(); });</SCRIPT></head></html>"
+
+    assert find_marked_scripts(html) == []
+    assert extract_scripts_from_page(html) == ["_tLAB.wait(function() { run(); });"]
+
+
+def test_find_marked_scripts_no_match():
+    assert find_marked_scripts("<html><script>nothing here</script></html>") == []
+
+
+def test_decode_median_prices_matches_regex_parser():
+    script = r'''
+    _tLAB.wait(function() {
+        something: [{\"label\":\"Median Sale Price\",\"dataType\":\"price\",\"aggregateData\":[{\"date\":\"2023-01-01\",\"value\":\"500,000\",\"formattedValue\":\"$500K\"},{\"date\":\"2023-02-01\",\"value\":\"510,000.50\"}]},{\"label\":\"Homes Sold\",\"aggregateData\":[]}]
+    });
+    '''
+
+    decoded = decode_median_prices(script)
+
+    assert decoded == {"2023-01": 500000, "2023-02": 510000}
+    assert decoded == parse_median_prices_with_regex(script)
+
+
+def test_decode_median_prices_reports_malformed_points(caplog):
+    script = r'''
+    [{\"label\":\"Median Sale Price\",\"aggregateData\":[{\"date\":\"2023-01-01\",\"value\":\"500,000\"},{\"date\":\"Jan 2023\",\"value\":\"1\"},{\"date\":\"2023-03-01\",\"value\":\"n/a\"}]}]
+    '''
+
+    decoded = decode_median_prices(script)
+
+    assert decoded == {"2023-01": 500000}
+    assert "Skipped 2 malformed aggregateData points" in caplog.text
+
+
+def test_decode_median_prices_not_found():
+    assert decode_median_prices("_tLAB.wait(function() { nothing(); });") is None
+
+
+def test_parse_median_prices_falls_back_to_regex():
+    # "\x" is a valid JavaScript escape but not valid JSON, so the decoder gives up
+    script = r'''
+    [{\"label\":\"Median Sale Price\",\"aggregateData\":[{\"date\":\"2023-01-01\",\"value\":\"500,000\",\"note\":\"\x41\"}]}]
+    '''
+
+    assert decode_median_prices(script) is None
+    assert parse_median_prices([script]) == {"2023-01": 500000}